@@ -0,0 +1,138 @@
+import copy
+import uuid
+import hashlib
+from threading import Lock
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+from utils.cache import TTLCache
+from utils.metrics import registry
+
+token_cache_lookups = registry.counter(
+    'auth_token_cache_lookups_total',
+    'Token lookups by the cache tier that answered them, or miss.', ('result',))
+
+
+class TokenCache:
+    """
+    Two-tier token -> (user, token) cache. The first tier lives in process,
+    the second is an optional Django cache alias shared between workers.
+
+    With a shared tier every token also has a version there, which
+    invalidate() replaces from whichever worker handles the change. Entries
+    carry the version they were loaded at and are only served while it is
+    still current, so a revoked token stops authenticating in every worker
+    at once. Without a shared tier other workers keep serving a revoked
+    token until their copy expires, see AUTH_TOKEN_CACHE_TTL.
+    """
+
+    prefix = 'auth-token:'
+
+    def __init__(self, maxsize=4096, ttl=300, shared_alias=None):
+        self.ttl = ttl
+        self.shared_alias = shared_alias
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = Lock()
+        self.counters = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+
+    @property
+    def shared(self):
+        if self.shared_alias is None:
+            return None
+        return caches[self.shared_alias]
+
+    def _shared_key(self, key):
+        return self.prefix + hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def _version_key(self, key):
+        return self._shared_key(key) + ':version'
+
+    def _count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+        token_cache_lookups.inc((counter,))
+
+    def get(self, key):
+        """
+        The cached entry of `key`, or None, and the version to pass to set()
+        after loading it.
+        """
+        cached = self.local.get(key)
+        shared = self.shared
+        if shared is None:
+            if cached is not None:
+                self._count('local_hits')
+                return cached[1], None
+            self._count('misses')
+            return None, None
+
+        if cached is not None:
+            version = shared.get(self._version_key(key))
+            if cached[0] == version:
+                self._count('local_hits')
+                return cached[1], version
+            self.local.delete(key)
+
+        values = shared.get_many([self._shared_key(key), self._version_key(key)])
+        version = values.get(self._version_key(key))
+        cached = values.get(self._shared_key(key))
+        if cached is not None and cached[0] == version:
+            self.local.set(key, cached)
+            self._count('shared_hits')
+            return cached[1], version
+
+        self._count('misses')
+        return None, version
+
+    def set(self, key, entry, version=None):
+        self.local.set(key, (version, entry))
+        shared = self.shared
+        if shared is not None:
+            shared.set(self._shared_key(key), (version, entry), self.ttl)
+
+    def invalidate(self, key):
+        self.local.delete(key)
+        shared = self.shared
+        if shared is not None:
+            shared.delete(self._shared_key(key))
+            # Outlives every entry loaded at the previous version, an entry
+            # loaded before any version existed expires first as well.
+            shared.set(self._version_key(key), uuid.uuid4().hex, self.ttl)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        lookups = sum(counters.values())
+        counters['hit_ratio'] = (
+            (counters['local_hits'] + counters['shared_hits']) / lookups
+            if lookups else 0.0)
+        return counters
+
+    def reset(self):
+        self.local.clear()
+        with self._lock:
+            for counter in self.counters:
+                self.counters[counter] = 0
+
+
+token_cache = TokenCache(
+    maxsize=getattr(settings, 'AUTH_TOKEN_CACHE_SIZE', 4096),
+    ttl=getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 300),
+    shared_alias=getattr(settings, 'AUTH_TOKEN_CACHE', None),
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement for TokenAuthentication that resolves the token
+    through `token_cache` and only hits the database on a miss.
+    """
+
+    def authenticate_credentials(self, key):
+        entry, version = token_cache.get(key)
+        if entry is None:
+            entry = super().authenticate_credentials(key)
+            token_cache.set(key, entry, version)
+        user, token = entry
+        # Hand every request its own instance so nothing leaks across threads.
+        return (copy.copy(user), token)
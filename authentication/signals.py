@@ -0,0 +1,18 @@
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from django.contrib.auth import get_user_model
+from rest_framework.authtoken.models import Token
+from .authentication import token_cache
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(pre_delete, sender=get_user_model())
+def invalidate_user_tokens(sender, instance, **kwargs):
+    for key in Token.objects.filter(user_id=instance.pk).values_list('key', flat=True):
+        token_cache.invalidate(key)
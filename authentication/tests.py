@@ -1,3 +1,187 @@
-from django.test import TestCase
+import time
+import datetime
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.auth import crypt, jwt
+from django.test import SimpleTestCase, TestCase
+from django.contrib.auth import get_user_model
+from rest_framework.exceptions import AuthenticationFailed
+from django.core.cache import caches
+from utils import metrics
+from .authentication import (
+    CachedTokenAuthentication, TokenCache, token_cache, token_cache_lookups)
+from .utils import IdTokenVerifier, LocalTokenSigner, StaticCertSource, GoogleCertSource
+from .views import create_auth_token
 
 # Create your tests here.
+
+PROJECT_ID = 'evader-test'
+
+
+def make_key_pair(kid):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, kid)])
+    now = datetime.datetime.utcnow()
+    cert = (x509.CertificateBuilder()
+            .subject_name(name).issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=1))
+            .sign(key, hashes.SHA256()))
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption())
+    cert_pem = cert.public_bytes(serialization.Encoding.PEM).decode()
+    return crypt.RSASigner.from_string(private_pem, kid), cert_pem
+
+
+def make_token(signer, uid='user-1', **overrides):
+    now = int(time.time())
+    payload = {
+        'iss': f'https://securetoken.google.com/{PROJECT_ID}',
+        'aud': PROJECT_ID,
+        'sub': uid,
+        'iat': now,
+        'exp': now + 3600,
+        'email': f'{uid}@example.com',
+    }
+    payload.update(overrides)
+    return jwt.encode(signer, payload).decode()
+
+
+class CountingCertSource(StaticCertSource):
+    def __init__(self, certs, max_age=3600):
+        super().__init__(certs, max_age)
+        self.fetches = 0
+
+    def fetch(self):
+        self.fetches += 1
+        return super().fetch()
+
+
+class IdTokenVerifierTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.signer, cls.cert = make_key_pair('key-1')
+        cls.rotated_signer, cls.rotated_cert = make_key_pair('key-2')
+
+    def test_verifies_and_caches_token(self):
+        source = CountingCertSource({'key-1': self.cert})
+        verifier = IdTokenVerifier(PROJECT_ID, cert_source=source)
+        token = make_token(self.signer)
+
+        claims = verifier.verify(token)
+        self.assertEqual(claims['uid'], 'user-1')
+        self.assertEqual(len(verifier.verified), 1)
+        self.assertEqual(verifier.verify(token)['uid'], 'user-1')
+        self.assertEqual(source.fetches, 1)
+
+    def test_rejects_wrong_audience_and_issuer(self):
+        verifier = IdTokenVerifier(
+            PROJECT_ID, cert_source=StaticCertSource({'key-1': self.cert}))
+        with self.assertRaises(ValueError):
+            verifier.verify(make_token(self.signer, aud='other-project'))
+        with self.assertRaises(ValueError):
+            verifier.verify(make_token(self.signer, iss='https://evil.example'))
+        self.assertEqual(len(verifier.verified), 0)
+
+    def test_expired_cached_token_is_dropped(self):
+        now = [time.time()]
+        verifier = IdTokenVerifier(
+            PROJECT_ID, cert_source=StaticCertSource({'key-1': self.cert}),
+            clock=lambda: now[0])
+        verifier.verify(make_token(self.signer))
+        now[0] += 7200
+        self.assertEqual(len(verifier.verified), 1)
+        self.assertIsNone(verifier.verified.get(
+            verifier.token_hash(make_token(self.signer))))
+
+    def test_unknown_kid_triggers_refresh(self):
+        now = [time.time()]
+        source = CountingCertSource({'key-1': self.cert})
+        verifier = IdTokenVerifier(
+            PROJECT_ID, cert_source=source, clock=lambda: now[0])
+        verifier.verify(make_token(self.signer))
+
+        source.certs['key-2'] = self.rotated_cert
+        now[0] += 120
+        claims = verifier.verify(make_token(self.rotated_signer, uid='user-2'))
+        self.assertEqual(claims['uid'], 'user-2')
+        self.assertEqual(source.fetches, 2)
+
+    def test_parse_max_age(self):
+        self.assertEqual(GoogleCertSource.parse_max_age(
+            'public, max-age=19842, must-revalidate, no-transform'), 19842)
+        self.assertEqual(GoogleCertSource.parse_max_age('no-cache'), 3600)
+
+    def test_local_signer(self):
+        signer = LocalTokenSigner(PROJECT_ID)
+        claims = signer.verifier().verify(signer.sign('user-3', email='user-3@example.com'))
+        self.assertEqual(claims['uid'], 'user-3')
+        self.assertEqual(claims['email'], 'user-3@example.com')
+        with self.assertRaises(ValueError):
+            signer.verifier().verify(make_token(self.signer))
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        token_cache.reset()
+        self.user = get_user_model().objects.create(
+            uid='uid-1', username='uid-1', email='one@example.com', name='One')
+        self.key = create_auth_token(self.user)
+        self.backend = CachedTokenAuthentication()
+
+    def test_second_lookup_skips_database(self):
+        with self.assertNumQueries(1):
+            user, _ = self.backend.authenticate_credentials(self.key)
+        with self.assertNumQueries(0):
+            cached, _ = self.backend.authenticate_credentials(self.key)
+        self.assertEqual(cached.pk, user.pk)
+        self.assertIsNot(cached, user)
+        stats = token_cache.stats()
+        self.assertEqual((stats['misses'], stats['local_hits']), (1, 1))
+
+    def test_user_change_invalidates(self):
+        self.backend.authenticate_credentials(self.key)
+        self.user.name = 'Renamed'
+        self.user.save()
+        user, _ = self.backend.authenticate_credentials(self.key)
+        self.assertEqual(user.name, 'Renamed')
+
+    def test_deleted_user_is_rejected(self):
+        self.backend.authenticate_credentials(self.key)
+        self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.backend.authenticate_credentials(self.key)
+
+    def test_invalidation_reaches_other_workers(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        worker, other = TokenCache(shared_alias='default'), TokenCache(shared_alias='default')
+        entry, version = worker.get(self.key)
+        self.assertIsNone(entry)
+        worker.set(self.key, 'entry', version)
+        self.assertEqual(other.get(self.key), ('entry', None))
+        self.assertEqual(other.get(self.key), ('entry', None))
+
+        worker.invalidate(self.key)
+        entry, version = other.get(self.key)
+        self.assertIsNone(entry)
+        other.set(self.key, 'reloaded', version)
+        self.assertEqual(worker.get(self.key)[0], 'reloaded')
+        self.assertEqual(other.stats()['local_hits'], 1)
+        self.assertEqual(worker.stats()['shared_hits'], 1)
+        self.assertEqual(other.stats()['misses'], 1)
+
+    def test_lookups_are_exported(self):
+        token_cache_lookups.reset()
+        self.backend.authenticate_credentials(self.key)
+        self.backend.authenticate_credentials(self.key)
+        body = metrics.registry.render()
+        self.assertIn('auth_token_cache_lookups_total{result="local_hits"} 1\n', body)
+        self.assertIn('auth_token_cache_lookups_total{result="misses"} 1\n', body)
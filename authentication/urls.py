@@ -1,7 +1,9 @@
 from django.urls import path
 from .views import LoginView, ProfileView
 
+app_name = 'authentication'
+
 urlpatterns = [
-    path('login/', view=LoginView.as_view()),
-    path('profile/', view=ProfileView.as_view()),
+    path('login/', view=LoginView.as_view(), name='login'),
+    path('profile/', view=ProfileView.as_view(), name='profile'),
 ]
@@ -1,9 +1,17 @@
 import os
+import re
+import time
+import json
+import hashlib
+import threading
+import urllib.request
 import firebase_admin
+from google.auth import jwt as google_jwt
 from firebase_admin import auth, credentials
 from rest_framework.status import HTTP_422_UNPROCESSABLE_ENTITY, HTTP_400_BAD_REQUEST
 from rest_framework.exceptions import ValidationError
 from dotenv import load_dotenv
+from utils.cache import TTLCache
 
 load_dotenv()
 
@@ -23,12 +31,207 @@ serviceAccountKey = {
 cred = credentials.Certificate(serviceAccountKey)
 firebase_admin.initialize_app(cred)
 
+GOOGLE_CERTS_URL = (
+    'https://www.googleapis.com/robot/v1/metadata/x509/'
+    'securetoken@system.gserviceaccount.com')
+ID_TOKEN_ISSUER = 'https://securetoken.google.com/'
+
+
+class GoogleCertSource:
+    """
+    Fetches the public certificates Firebase signs ID tokens with. Returns the
+    kid -> PEM mapping and the number of seconds it may be cached for.
+    """
+
+    def __init__(self, url=GOOGLE_CERTS_URL, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def fetch(self):
+        with urllib.request.urlopen(self.url, timeout=self.timeout) as response:
+            certs = json.loads(response.read().decode('utf-8'))
+            max_age = self.parse_max_age(response.headers.get('Cache-Control', ''))
+        return certs, max_age
+
+    @staticmethod
+    def parse_max_age(cache_control, default=3600):
+        match = re.search(r'max-age=(\d+)', cache_control or '')
+        return int(match.group(1)) if match else default
+
+
+class StaticCertSource:
+    """
+    Serves a fixed key set, used by tests and local setups in place of Google.
+    """
+
+    def __init__(self, certs, max_age=3600):
+        self.certs = dict(certs)
+        self.max_age = max_age
+
+    def fetch(self):
+        return dict(self.certs), self.max_age
+
+
+class CertCache:
+    """
+    Keeps the signing certificates in process. Certificates are refreshed in a
+    background thread once they enter the last `refresh_margin` fraction of
+    their max-age, and synchronously only when they are missing or expired.
+    """
+
+    def __init__(self, source, refresh_margin=0.1, min_refresh_interval=60,
+                 clock=time.time):
+        self.source = source
+        self.refresh_margin = refresh_margin
+        self.min_refresh_interval = min_refresh_interval
+        self.clock = clock
+        self._certs = {}
+        self._fetched_at = 0
+        self._expires_at = 0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def refresh(self):
+        certs, max_age = self.source.fetch()
+        with self._lock:
+            self._certs = certs
+            self._fetched_at = self.clock()
+            self._expires_at = self._fetched_at + max_age
+        return certs
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception:
+            # Keep serving the current certificates, the next call retries.
+            pass
+        finally:
+            self._refreshing = False
+
+    def get(self):
+        now = self.clock()
+        if not self._certs or now >= self._expires_at:
+            return self.refresh()
+
+        refresh_at = self._expires_at - (
+            self._expires_at - self._fetched_at) * self.refresh_margin
+        if now >= refresh_at and not self._refreshing:
+            with self._lock:
+                if self._refreshing:
+                    return self._certs
+                self._refreshing = True
+            threading.Thread(
+                target=self._refresh_in_background, daemon=True).start()
+        return self._certs
+
+    def get_for_kid(self, kid):
+        """
+        Returns the certificates, forcing one refresh if `kid` is unknown so a
+        key rotation is picked up before its advertised max-age runs out.
+        """
+        certs = self.get()
+        if kid in certs:
+            return certs
+        if self.clock() - self._fetched_at >= self.min_refresh_interval:
+            certs = self.refresh()
+        return certs
+
+
+class IdTokenVerifier:
+    """
+    Verifies Firebase ID tokens locally against cached Google certificates and
+    remembers already verified tokens (by hash) until they expire.
+    """
+
+    def __init__(self, project_id, cert_source=None, max_tokens=1024,
+                 clock=time.time):
+        self.project_id = project_id
+        self.certs = CertCache(cert_source or GoogleCertSource(), clock=clock)
+        self.verified = TTLCache(maxsize=max_tokens, clock=clock)
+
+    @staticmethod
+    def token_hash(id_token):
+        return hashlib.sha256(id_token.encode('utf-8')).hexdigest()
+
+    def verify(self, id_token):
+        if not isinstance(id_token, str) or not id_token:
+            raise ValueError('ID token must be a non-empty string.')
+
+        key = self.token_hash(id_token)
+        claims = self.verified.get(key)
+        if claims is not None:
+            return dict(claims)
+
+        header = google_jwt.decode_header(id_token)
+        if header.get('alg') != 'RS256' or not header.get('kid'):
+            raise ValueError('ID token has an invalid header.')
+
+        certs = self.certs.get_for_kid(header['kid'])
+        if header['kid'] not in certs:
+            raise ValueError('ID token is signed by an unknown key.')
+
+        claims = google_jwt.decode(
+            id_token, certs=certs, audience=self.project_id)
+        if claims.get('iss') != ID_TOKEN_ISSUER + self.project_id:
+            raise ValueError('ID token has an incorrect issuer.')
+        subject = claims.get('sub')
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise ValueError('ID token has an invalid subject.')
+
+        claims['uid'] = subject
+        self.verified.set(key, claims, expires_at=claims['exp'])
+        return dict(claims)
+
+
+class LocalTokenSigner:
+    """
+    Signs Firebase-style ID tokens with a key generated in process, for
+    benchmarks and local setups that cannot reach Firebase. `verifier()`
+    returns an IdTokenVerifier that trusts this key only.
+    """
+
+    def __init__(self, project_id, kid='local'):
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        from google.auth import crypt
+
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        private_pem = key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption())
+        self.project_id = project_id
+        self.kid = kid
+        self.public_pem = key.public_key().public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+        self.signer = crypt.RSASigner.from_string(private_pem, kid)
+
+    def sign(self, uid, lifetime=3600, **claims):
+        now = int(time.time())
+        payload = {
+            'iss': ID_TOKEN_ISSUER + self.project_id,
+            'aud': self.project_id,
+            'sub': uid,
+            'iat': now,
+            'exp': now + lifetime,
+        }
+        payload.update(claims)
+        return google_jwt.encode(self.signer, payload).decode()
+
+    def verifier(self, **kwargs):
+        return IdTokenVerifier(
+            self.project_id, StaticCertSource({self.kid: self.public_pem}), **kwargs)
+
+
+id_token_verifier = IdTokenVerifier(serviceAccountKey['project_id'])
+
 
 class FirebaseAPI:
     @classmethod
     def verify_id_token(cls, id_token):
         try:
-            decoded_token = auth.verify_id_token(id_token)
+            decoded_token = id_token_verifier.verify(id_token)
             return decoded_token
         except:
             raise ValidationError(
@@ -3,6 +3,18 @@ ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The Procfile serves the project over WSGI (``gunicorn core.wsgi``). The ASGI
+mode runs the same project on uvicorn workers managed by gunicorn:
+
+    EVENT_ASYNC_VIEWS=1 gunicorn core.asgi:application \
+        -k uvicorn.workers.UvicornWorker --workers 4
+
+or ``scripts/runasgi.sh``. With EVENT_ASYNC_VIEWS set, the read endpoints
+are served by the coroutine views in event/async_views.py, while waiting on
+the database they no longer hold on to a worker. All other views stay
+synchronous and run in Django's thread pool. ``/event/stream/`` is only
+available in this mode. Compare both modes with scripts/loadtest.sh.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 """
@@ -13,4 +25,11 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up, it depends on the app registry.
+from event.stream import EventStream  # noqa: E402
+
+# Serves the /event/stream/ Server-Sent Events endpoint, everything else is
+# handled by Django.
+application = EventStream(django_application)
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 import django_heroku
+from django.core.exceptions import ImproperlyConfigured
+from utils.db import database_config, replica_config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -50,12 +53,14 @@ INSTALLED_APPS = [
 CORS_ORIGIN_ALLOW_ALL = True
 
 MIDDLEWARE = [
+    'utils.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'utils.db.router.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -84,14 +89,65 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# Configured from DATABASE_URL, DATABASE_CONN_MAX_AGE, DATABASE_POOL_SIZE and
+# friends, falls back to a SQLite file, in WAL mode when SQLITE_WAL is set.
+# See utils/db/__init__.py.
 DATABASES = {
+    'default': database_config(BASE_DIR),
+}
+
+# Optional read replica (DATABASE_REPLICA_URL or SQLITE_REPLICA_PATH). Views
+# with utils.db.router.ReplicaReadsMixin read from it, users are pinned to
+# the primary for DATABASE_REPLICA_PIN_SECONDS after their data changed.
+replica = replica_config()
+if replica:
+    DATABASES['replica'] = replica
+
+DATABASE_ROUTERS = ['utils.db.router.ReplicaRouter']
+# Cache alias holding the pins. They only protect reads served by a worker
+# that can see them, so with DATABASE_REPLICA_URL set it must be shared by
+# all workers (e.g. Redis or Memcached), see the check below CACHES.
+DATABASE_REPLICA_PIN_CACHE = os.environ.get('DATABASE_REPLICA_PIN_CACHE', 'default')
+DATABASE_REPLICA_PIN_SECONDS = int(os.environ.get('DATABASE_REPLICA_PIN_SECONDS', 10))
+
+AUTH_USER_MODEL = 'authentication.User'
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
-AUTH_USER_MODEL = 'authentication.User'
+if os.environ.get('DATABASE_REPLICA_URL') and CACHES[DATABASE_REPLICA_PIN_CACHE]['BACKEND'] in (
+        'django.core.cache.backends.locmem.LocMemCache',
+        'django.core.cache.backends.dummy.DummyCache'):
+    raise ImproperlyConfigured(
+        'DATABASE_REPLICA_PIN_CACHE must name a cache shared by all workers when '
+        'DATABASE_REPLICA_URL is set, otherwise reads after a write can hit a '
+        'lagging replica.')
+
+# Per-user cache of the event read endpoints. Point it at a shared backend
+# (e.g. Redis or Memcached) when running more than one worker, otherwise
+# invalidations only reach the worker that handled the write.
+EVENT_RESPONSE_CACHE = 'default'
+EVENT_RESPONSE_CACHE_TTL = 300
+
+# Stream unpaginated list responses (event lists, guests, expenditures) from
+# a server-side cursor instead of building them in memory. Streamed
+# responses bypass the response cache. WSGI only, see event/streaming.py.
+EVENT_STREAMING_RESPONSES = os.environ.get('EVENT_STREAMING_RESPONSES', '').lower() in ('1', 'true', 'yes')
+EVENT_STREAMING_CHUNK_SIZE = 500
+
+# Broker behind the /event/stream/ push endpoint (ASGI only). The in-process
+# broker only reaches clients connected to the same process.
+EVENT_STREAM_BROKER = 'event.pubsub.InProcessBroker'
+
+# Days of event.Change entries kept by the prune_changes command. Sync and
+# RSVP change cursors older than that get a 410.
+EVENT_SYNC_RETENTION_DAYS = 30
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -113,9 +169,114 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'authentication.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES': [
+        'utils.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'EXCEPTION_HANDLER': 'utils.exception_handler.custom_exception_handler',
+}
+
+# Errors raised in API views are logged as JSON lines to the evader.errors
+# logger from a background thread, see utils/errorlog.py. Each endpoint,
+# status and error type logs its first ERROR_LOG_RATE_LIMIT errors every
+# ERROR_LOG_RATE_WINDOW seconds, then one in ERROR_LOG_SAMPLE_RATE.
+ERROR_LOG_RATE_LIMIT = 10
+ERROR_LOG_RATE_WINDOW = 60
+ERROR_LOG_SAMPLE_RATE = 100
+
+# Records below ERROR_LOG_LEVEL are not logged (the test suite raises it to
+# ERROR with override_settings). At most ERROR_LOG_QUEUE_SIZE records wait
+# for the logging thread, further ones are dropped and counted in
+# error_log_dropped_total on /metrics.
+ERROR_LOG_LEVEL = os.environ.get('ERROR_LOG_LEVEL', 'INFO')
+ERROR_LOG_QUEUE_SIZE = 10000
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'utils.errorlog.JSONFormatter'},
+    },
+    'filters': {
+        'already_logged': {'()': 'utils.errorlog.AlreadyLogged'},
+    },
+    'handlers': {
+        'errors': {'class': 'logging.StreamHandler', 'formatter': 'json'},
+    },
+    'loggers': {
+        'evader.errors': {
+            'handlers': ['errors'],
+            'level': ERROR_LOG_LEVEL,
+            'propagate': False,
+        },
+        # Unhandled API exceptions are already on evader.errors.
+        'django.request': {
+            'filters': ['already_logged'],
+        },
+    },
+}
+
+# Token -> user cache used by CachedTokenAuthentication. Set AUTH_TOKEN_CACHE
+# to a CACHES alias to share the second tier between workers, which also
+# makes a revoked token or deleted user stop authenticating in all of them
+# at once. Without it, workers other than the one handling the change keep
+# authenticating them for up to AUTH_TOKEN_CACHE_TTL seconds.
+AUTH_TOKEN_CACHE = None
+AUTH_TOKEN_CACHE_SIZE = 4096
+AUTH_TOKEN_CACHE_TTL = 60
+
+# Maintain the denormalized event.Usage counters on every event and
+# invitation write and serve UsageView from them instead of counting rows on
+# every call. Run `manage.py reconcile_usage` after turning this on, the
+# counters are not kept while it is off.
+EVENT_USAGE_COUNTERS = False
+
+# Route the read endpoints (event list, invited list, guests, usage) to the
+# coroutine wrappers in event/async_views.py, for comparing WSGI and ASGI
+# with scripts/loadtest.sh. On Django 4.0 they run the sync views on a
+# thread and are no faster than them under ASGI.
+EVENT_ASYNC_VIEWS = os.environ.get('EVENT_ASYNC_VIEWS', '').lower() in ('1', 'true', 'yes')
+
+# Per-request metrics of the routes in METRICS_NAMESPACES, served in the
+# Prometheus text format at /metrics/. Set METRICS_TOKEN to require
+# "Authorization: Bearer <token>" there. /health/ only shows the database
+# details to callers sending that token.
+METRICS_NAMESPACES = ('event', 'authentication')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Most queries an endpoint may run, keyed by URL name. Requests over budget
+# are counted and logged, or fail with QueryBudgetExceeded when
+# METRICS_QUERY_BUDGET_ACTION is 'raise' (the test suite does).
+METRICS_QUERY_BUDGET_ACTION = os.environ.get('METRICS_QUERY_BUDGET_ACTION', 'log')
+METRICS_QUERY_BUDGETS = {
+    'event:create': 9,
+    'event:fetch-events': 3,
+    'event:fetch-invited-events': 3,
+    'event:fetch-event': 2,
+    'event:fetch-invited-event': 2,
+    'event:delete-event': 11,
+    'event:update-event': 6,
+    'event:guests': 4,
+    'event:invite': 9,
+    'event:invite-bulk': 11,
+    'event:invitation-status': 6,
+    'event:invitation-status-batch': 8,
+    'event:invitation-changes': 3,
+    'event:invitation-remove': 7,
+    'event:expenditure': 6,
+    'event:expenditure-batch': 6,
+    'event:expenditure-summary': 3,
+    'event:export-guests': 3,
+    'event:export-expenditures': 3,
+    'event:export-event-guests': 3,
+    'event:export-event-expenditures': 3,
+    'event:sync': 7,
+    'event:usage': 2,
+    'authentication:login': 6,
+    'authentication:profile': 3,
 }
 
 SPECTACULAR_SETTINGS = {
@@ -150,4 +311,5 @@ STATIC_URL = '/static/'
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
-django_heroku.settings(locals())
+# DATABASES and LOGGING are configured above, django_heroku would replace them.
+django_heroku.settings(locals(), databases=False, logging=False)
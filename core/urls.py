@@ -16,11 +16,14 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
+from .views import HealthView, MetricsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('auth/', include('authentication.urls')),
     path('event/', include('event.urls')),
+    path('health/', HealthView.as_view(), name='health'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('',
          SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
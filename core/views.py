@@ -0,0 +1,51 @@
+import hmac
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from utils.db.health import database_status
+from utils.metrics import registry
+
+
+def has_metrics_token(request):
+    token = settings.METRICS_TOKEN
+    return bool(token) and hmac.compare_digest(
+        request.headers.get('Authorization', ''), f'Bearer {token}')
+
+
+class HealthView(APIView):
+    """
+    get:
+        Reports whether every configured database answers, 503 when one is
+        unreachable. Callers sending "Authorization: Bearer <METRICS_TOKEN>"
+        also get each database's status, errors and connection pool usage.
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        databases = {alias: database_status(alias) for alias in settings.DATABASES}
+        healthy = all(database['ok'] for database in databases.values())
+        data = {'ok': healthy}
+        if has_metrics_token(request):
+            data['databases'] = databases
+        return Response(
+            data=data,
+            status=status.HTTP_200_OK if healthy else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+class MetricsView(APIView):
+    """
+    get:
+        Request metrics of this worker in the Prometheus text format. Requires
+        "Authorization: Bearer <METRICS_TOKEN>" when METRICS_TOKEN is set.
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        if settings.METRICS_TOKEN and not has_metrics_token(request):
+            return Response(status=status.HTTP_401_UNAUTHORIZED)
+        return HttpResponse(
+            registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,50 @@
+from django.db.models import Exists, OuterRef
+from .models import Event, People
+
+CREATOR = 'creator'
+INVITEE = 'invitee'
+
+
+class EventAccess:
+    def __init__(self, event, role):
+        self.event = event
+        self.role = role
+
+    @property
+    def is_creator(self):
+        return self.role == CREATOR
+
+    @property
+    def is_invitee(self):
+        return self.role == INVITEE
+
+
+def get_event_access(request, id):
+    """
+    Loads the event with its creator joined and the requesting user's role in
+    a single query. The result is cached on the request, so validate() and
+    fetch()/save() of the same request share one lookup. Returns None when
+    the event does not exist.
+    """
+    cache = getattr(request, '_event_access', None)
+    if cache is None:
+        cache = request._event_access = {}
+    id = int(id)
+    if id in cache:
+        return cache[id]
+
+    user = request.user
+    event = Event.objects.select_related('creator').annotate(
+        is_invited=Exists(People.objects.filter(event=OuterRef('pk'), user=user))
+    ).filter(id=id).first()
+
+    access = None
+    if event is not None:
+        role = None
+        if event.creator_id == user.pk:
+            role = CREATOR
+        elif event.is_invited:
+            role = INVITEE
+        access = EventAccess(event, role)
+    cache[id] = access
+    return access
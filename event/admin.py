@@ -1,7 +1,9 @@
 from django.contrib import admin
-from .models import Event, People, Expenditure
+from .models import Change, Event, People, Expenditure, Usage
 
 # Register your models here.
 admin.site.register(Event)
 admin.site.register(People)
 admin.site.register(Expenditure)
+admin.site.register(Usage)
+admin.site.register(Change)
@@ -0,0 +1,40 @@
+from asgiref.sync import sync_to_async
+from .views import FetchEventsView, FetchGuestsView, FetchInvitedEventsView, UsageView
+
+
+class AsyncAPIViewMixin:
+    """
+    Serves a sync DRF view as a coroutine function, for comparing the WSGI
+    and ASGI deployments (scripts/loadtest.sh). Django 4.0 has no async ORM
+    and runs the thread-sensitive calls of a request on one thread, so the
+    whole view runs in a single sync_to_async call: it is no faster than
+    Django adapting the sync view itself, and shares all of its code.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = sync_to_async(super().as_view(**initkwargs))
+
+        async def async_view(request, *args, **kwargs):
+            return await view(request, *args, **kwargs)
+
+        async_view.cls = cls
+        async_view.initkwargs = initkwargs
+        async_view.csrf_exempt = True
+        return async_view
+
+
+class AsyncFetchEventsView(AsyncAPIViewMixin, FetchEventsView):
+    pass
+
+
+class AsyncFetchInvitedEventsView(AsyncAPIViewMixin, FetchInvitedEventsView):
+    pass
+
+
+class AsyncFetchGuestsView(AsyncAPIViewMixin, FetchGuestsView):
+    pass
+
+
+class AsyncUsageView(AsyncAPIViewMixin, UsageView):
+    pass
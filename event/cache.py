@@ -0,0 +1,95 @@
+import time
+import hashlib
+from functools import wraps
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+from utils.db.router import pin_users
+
+CACHED_HEADERS = ('ETag', 'Last-Modified')
+
+
+def get_cache():
+    return caches[settings.EVENT_RESPONSE_CACHE]
+
+
+def generation_key(user_id):
+    return f'event-response-generation:{user_id}'
+
+
+def get_generation(cache, user_id):
+    key = generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def response_key(request, endpoint):
+    cache = get_cache()
+    query = '&'.join(sorted(
+        f'{key}={value}' for key, values in request.query_params.lists()
+        for value in values))
+    digest = hashlib.sha1(query.encode('utf-8')).hexdigest()
+    generation = get_generation(cache, request.user.pk)
+    return f'event-response:{request.user.pk}:{generation}:{endpoint}:{digest}'
+
+
+def invalidate_users(user_ids):
+    """
+    Drops every cached response of the given users by moving them to a new
+    generation, old entries are never read again and simply expire. The
+    users are pinned to the primary database as well, a lagging replica
+    would otherwise refill the cache with the old data.
+    """
+    pin_users(user_ids)
+    generation = time.time_ns()
+    get_cache().set_many(
+        {generation_key(user_id): generation for user_id in set(user_ids)}, None)
+
+
+def cached_response(request, cached):
+    data, headers = cached
+    not_modified = get_conditional_response(
+        request, etag=headers.get('ETag'),
+        last_modified=parse_http_date_safe(headers.get('Last-Modified')))
+    response = not_modified or Response(data=data, status=status.HTTP_200_OK)
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+def cache_entry(response):
+    headers = {
+        header: response[header]
+        for header in CACHED_HEADERS if response.has_header(header)
+    }
+    return (response.data, headers)
+
+
+def cache_response(endpoint):
+    """
+    Caches successful responses of a view's get() per user and query string,
+    streamed responses are not cached.
+    Cached ETag/Last-Modified headers are replayed and still answer
+    conditional requests with 304.
+    """
+    def decorator(get):
+        @wraps(get)
+        def wrapper(view, request, *args, **kwargs):
+            cache = get_cache()
+            key = response_key(request, endpoint)
+            cached = cache.get(key)
+            if cached is not None:
+                return cached_response(request, cached)
+
+            response = get(view, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK and not response.streaming:
+                cache.set(key, cache_entry(response), settings.EVENT_RESPONSE_CACHE_TTL)
+            return response
+        return wrapper
+    return decorator
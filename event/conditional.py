@@ -0,0 +1,66 @@
+import hashlib
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+class Version:
+    """
+    Validator of a read response, derived from the newest `updatedAt` and the
+    row count of the rows it is built from. The count catches deletes, which
+    leave no newer timestamp behind.
+
+    Only `dated` versions send Last-Modified and honour If-Modified-Since.
+    A list can lose rows, or change twice within the one second resolution
+    of the header, without its newest timestamp moving, so lists are
+    validated by their ETag alone.
+    """
+
+    def __init__(self, request, last_modified, count=1, dated=True):
+        self.request = request
+        self.last_modified = last_modified
+        self.dated = dated
+        query = '&'.join(sorted(
+            f'{key}={value}' for key, values in request.query_params.lists()
+            for value in values))
+        key = (f'{request.path}?{query}:{request.user.pk}:'
+               f'{last_modified.isoformat() if last_modified else ""}:{count}')
+        self.etag = f'W/"{hashlib.sha1(key.encode("utf-8")).hexdigest()}"'
+
+    @classmethod
+    def of(cls, request, queryset, field='updatedAt', since=None):
+        """
+        Computes the undated version of the list `queryset` with one
+        aggregate query. `since` folds in a timestamp already loaded
+        elsewhere, e.g. the parent event.
+        """
+        version = queryset.order_by().aggregate(
+            last_modified=Max(field), count=Count('pk'))
+        last_modified = version['last_modified']
+        if since is not None and (last_modified is None or since > last_modified):
+            last_modified = since
+        return cls(request, last_modified, version['count'], dated=False)
+
+    @property
+    def timestamp(self):
+        if self.last_modified is None or not self.dated:
+            return None
+        return int(self.last_modified.timestamp())
+
+    def not_modified(self):
+        """
+        Returns a 304 response when the client's If-None-Match or, for dated
+        versions without one, If-Modified-Since validator still matches,
+        otherwise None.
+        """
+        response = get_conditional_response(
+            self.request, etag=self.etag, last_modified=self.timestamp)
+        if response is not None:
+            self.apply(response)
+        return response
+
+    def apply(self, response):
+        response['ETag'] = self.etag
+        if self.timestamp is not None:
+            response['Last-Modified'] = http_date(self.timestamp)
+        return response
@@ -0,0 +1,450 @@
+import os
+import json
+import time
+import random
+import tempfile
+import threading
+import subprocess
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from authentication import utils as auth_utils
+from utils import metrics
+from utils.db import router as db_router
+from event.management.stats import summarize
+from event.models import Event, People, Expenditure
+
+PROJECT_ID = 'evader-benchmark'
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+# (URL name, method), reads first. The RSVP change feed follows the status
+# updates that fill it, routes that delete rows run last and on rows seeded
+# for them.
+ROUTES = (
+    ('authentication:login', 'POST'),
+    ('authentication:profile', 'GET'),
+    ('event:fetch-events', 'GET'),
+    ('event:fetch-invited-events', 'GET'),
+    ('event:fetch-event', 'GET'),
+    ('event:fetch-invited-event', 'GET'),
+    ('event:guests', 'GET'),
+    ('event:expenditure', 'GET'),
+    ('event:expenditure-summary', 'GET'),
+    ('event:export-guests', 'GET'),
+    ('event:export-event-guests', 'GET'),
+    ('event:export-expenditures', 'GET'),
+    ('event:export-event-expenditures', 'GET'),
+    ('event:usage', 'GET'),
+    ('event:create', 'POST'),
+    ('event:update-event', 'PUT'),
+    ('event:invite', 'POST'),
+    ('event:invite-bulk', 'POST'),
+    ('event:invitation-status', 'POST'),
+    ('event:invitation-status-batch', 'POST'),
+    ('event:invitation-changes', 'GET'),
+    ('event:sync', 'GET'),
+    ('event:expenditure', 'POST'),
+    ('event:expenditure-batch', 'POST'),
+    ('event:invitation-remove', 'DELETE'),
+    ('event:expenditure', 'DELETE'),
+    ('event:expenditure-batch', 'DELETE'),
+    ('event:delete-event', 'DELETE'),
+)
+
+
+class Dataset:
+    """
+    Seeds users with API tokens, events, invitations and expenditures, and
+    builds the requests of each route as (user, path, body) triples. Rows a
+    request deletes or must not find (invitations) are set aside for it.
+    """
+
+    def __init__(self, rng, signer, users, events_per_user, guests_per_event,
+                 expenditures_per_event):
+        self.rng = rng
+        self.signer = signer
+        self.counts = {}
+        self.seed(users, events_per_user, guests_per_event, expenditures_per_event)
+
+    def seed(self, users, events_per_user, guests_per_event, expenditures_per_event):
+        User = get_user_model()
+        rng = self.rng
+        self.users = [f'bench-{index}' for index in range(users)]
+        self.emails = {uid: f'{uid}@example.com' for uid in self.users}
+        User.objects.bulk_create([
+            User(uid=uid, username=uid, email=self.emails[uid], name=f'Bench {uid[6:]}')
+            for uid in self.users
+        ], batch_size=1000)
+        self.tokens = {uid: Token.generate_key() for uid in self.users}
+        Token.objects.bulk_create([
+            Token(key=key, user_id=uid) for uid, key in self.tokens.items()
+        ], batch_size=1000)
+
+        # One event in four is over, the rest can still be changed.
+        now = timezone.now()
+        Event.objects.bulk_create([
+            Event(name=f'Event {index}', description='', venue='Venue',
+                  time=now + timedelta(hours=rng.randint(-5000, -1) if index % 4 == 3
+                                       else rng.randint(1, 5000)),
+                  duration=3600, creator_id=uid)
+            for uid in self.users
+            for index in range(events_per_user)
+        ], batch_size=1000)
+        self.events = list(Event.objects.filter(time__gt=now).values_list('id', 'creator_id'))
+        self.creators = dict(self.events)
+
+        guests = {}
+        invitations = []
+        for event_id, creator_id in Event.objects.values_list('id', 'creator_id'):
+            for uid in rng.sample(self.users, min(guests_per_event, len(self.users))):
+                if uid != creator_id:
+                    guests.setdefault(event_id, []).append(uid)
+                    invitations.append(People(
+                        user_id=uid, event_id=event_id, status=rng.randint(0, 2)))
+        People.objects.bulk_create(invitations, batch_size=1000)
+        self.guests = guests
+        self.invitations = [
+            (event_id, uid)
+            for event_id, _ in self.events for uid in guests.get(event_id, ())]
+
+        Expenditure.objects.bulk_create([
+            Expenditure(event_id=event_id, name=f'Item {index}', organization='Shop',
+                        quantity=rng.randint(1, 10), unitPrice=rng.randint(1, 1000))
+            for event_id, _ in self.events
+            for index in range(expenditures_per_event)
+        ], batch_size=1000)
+        self.counts = {
+            'users': len(self.users),
+            'events': Event.objects.count(),
+            'invitations': len(invitations),
+            'expenditures': Expenditure.objects.count(),
+        }
+
+    def event(self):
+        return self.rng.choice(self.events)
+
+    def invitation(self):
+        return self.rng.choice(self.invitations)
+
+    def uninvited(self, event_id, count):
+        """
+        `count` users neither invited to nor creating `event_id`, who are
+        then counted as invited.
+        """
+        taken = self.guests.setdefault(event_id, [])
+        excluded = set(taken) | {self.creators[event_id]}
+        chosen = []
+        while len(chosen) < count and len(excluded) < len(self.users):
+            uid = self.rng.choice(self.users)
+            if uid not in excluded:
+                excluded.add(uid)
+                chosen.append(uid)
+        taken.extend(chosen)
+        return chosen
+
+    def spare_expenditures(self, event_id, count):
+        """
+        Seeds `count` expenditures on `event_id` for a request to delete.
+        """
+        return [
+            Expenditure.objects.create(
+                event_id=event_id, name=f'Spare {index}', organization='Shop',
+                quantity=1, unitPrice=1).id
+            for index in range(count)
+        ]
+
+    def requests(self, name, method, count):
+        builder = getattr(self, name.split(':')[1].replace('-', '_') + '_' + method.lower())
+        return [builder(number) for number in range(count)]
+
+    def login_post(self, number):
+        uid = self.rng.choice(self.users)
+        return None, '/auth/login/', {'id_token': self.signer.sign(
+            uid, email=self.emails[uid], name=f'Bench {uid[6:]}')}
+
+    def profile_get(self, number):
+        return self.rng.choice(self.users), '/auth/profile/', None
+
+    def fetch_events_get(self, number):
+        return self.event()[1], '/event/fetch/', None
+
+    def fetch_invited_events_get(self, number):
+        return self.invitation()[1], '/event/fetch/invited', None
+
+    def fetch_event_get(self, number):
+        event_id, creator_id = self.event()
+        return creator_id, f'/event/fetch/{event_id}/', None
+
+    def fetch_invited_event_get(self, number):
+        event_id, uid = self.invitation()
+        return uid, f'/event/fetch/invited/{event_id}/', None
+
+    def guests_get(self, number):
+        event_id, creator_id = self.event()
+        return creator_id, f'/event/fetch/{event_id}/guests/', None
+
+    def expenditure_get(self, number):
+        event_id, creator_id = self.event()
+        return creator_id, f'/event/expenditure/{event_id}/', None
+
+    def expenditure_summary_get(self, number):
+        event_id, creator_id = self.event()
+        return creator_id, f'/event/expenditure/{event_id}/summary/', None
+
+    def export_guests_get(self, number):
+        return self.rng.choice(self.users), '/event/export/guests.ndjson', None
+
+    def export_event_guests_get(self, number):
+        event_id, creator_id = self.event()
+        return creator_id, f'/event/export/{event_id}/guests.csv', None
+
+    def export_expenditures_get(self, number):
+        return self.rng.choice(self.users), '/event/export/expenditures.ndjson', None
+
+    def export_event_expenditures_get(self, number):
+        event_id, creator_id = self.event()
+        return creator_id, f'/event/export/{event_id}/expenditures.ndjson', None
+
+    def usage_get(self, number):
+        return self.rng.choice(self.users), '/event/usage/', None
+
+    def create_post(self, number):
+        time = timezone.now() + timedelta(days=self.rng.randint(1, 100))
+        return self.rng.choice(self.users), '/event/create/', {
+            'name': f'New event {number}', 'description': '', 'venue': 'Venue',
+            'time': time.strftime(TIME_FORMAT), 'fireId': f'fire-{number}', 'duration': 3600}
+
+    def update_event_put(self, number):
+        event_id, creator_id = self.event()
+        time = timezone.now() + timedelta(days=self.rng.randint(1, 100))
+        return creator_id, f'/event/update/{event_id}/', {
+            'name': f'Updated {number}', 'description': '', 'venue': 'Venue',
+            'time': time.strftime(TIME_FORMAT)}
+
+    def invite_post(self, number):
+        event_id, creator_id = self.event()
+        invitee = self.uninvited(event_id, 1)
+        return creator_id, f'/event/invite/{event_id}/', {
+            'email': self.emails[invitee[0]] if invitee else 'nobody@example.com'}
+
+    def invite_bulk_post(self, number):
+        event_id, creator_id = self.event()
+        return creator_id, f'/event/invite/{event_id}/bulk/', {
+            'emails': [self.emails[uid] for uid in self.uninvited(event_id, 10)]
+            + [f'unknown-{number}@example.com']}
+
+    def invitation_status_post(self, number):
+        event_id, uid = self.invitation()
+        return uid, f'/event/invitation/status/{event_id}/', {'status': self.rng.randint(0, 2)}
+
+    def invitation_status_batch_post(self, number):
+        uid = self.invitation()[1]
+        invited = [
+            event_id for event_id, _ in self.events if uid in self.guests.get(event_id, ())]
+        return uid, '/event/invitation/status/batch/', {'updates': [
+            {'event': event_id, 'status': self.rng.randint(0, 2)} for event_id in invited]}
+
+    def invitation_changes_get(self, number):
+        return self.invitation()[1], '/event/invitation/changes/', None
+
+    def sync_get(self, number):
+        # Half full snapshots, half deltas over the whole change log.
+        return self.rng.choice(self.users), f'/event/sync/?since={number % 2}', None
+
+    def expenditure_post(self, number):
+        event_id, creator_id = self.event()
+        return creator_id, f'/event/expenditure/{event_id}/', {
+            'name': f'Item {number}', 'organization': 'Shop',
+            'quantity': self.rng.randint(1, 10), 'unitPrice': self.rng.randint(1, 1000)}
+
+    def expenditure_batch_post(self, number):
+        event_id, creator_id = self.event()
+        return creator_id, f'/event/expenditure/{event_id}/batch/', [
+            {'name': f'Item {number}.{index}', 'organization': 'Shop',
+             'quantity': self.rng.randint(1, 10), 'unitPrice': self.rng.randint(1, 1000)}
+            for index in range(10)
+        ]
+
+    def invitation_remove_delete(self, number):
+        event_id, creator_id = self.event()
+        invitee = self.uninvited(event_id, 1)
+        invitation = People.objects.create(user_id=invitee[0], event_id=event_id)
+        return creator_id, f'/event/invitation/remove/{invitation.id}/', None
+
+    def expenditure_delete(self, number):
+        event_id, creator_id = self.event()
+        expenditure_id = self.spare_expenditures(event_id, 1)[0]
+        return creator_id, f'/event/expenditure/{expenditure_id}/', None
+
+    def expenditure_batch_delete(self, number):
+        event_id, creator_id = self.event()
+        return creator_id, f'/event/expenditure/{event_id}/batch/', {
+            'ids': self.spare_expenditures(event_id, 10)}
+
+    def delete_event_delete(self, number):
+        creator_id = self.rng.choice(self.users)
+        event = Event.objects.create(
+            name=f'Doomed {number}', description='', venue='Venue',
+            time=timezone.now() + timedelta(days=1), duration=3600, creator_id=creator_id)
+        People.objects.bulk_create([
+            People(user_id=uid, event_id=event.id)
+            for uid in self.rng.sample(self.users, min(10, len(self.users)))
+            if uid != creator_id
+        ])
+        return creator_id, f'/event/delete/{event.id}/', None
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a throwaway database with users, events, invitations and '
+        'expenditures, then drives every event and authentication route '
+        'in process through the full middleware stack at the given '
+        'concurrency. Reports throughput, latency percentiles and queries '
+        'per request of each route. ID tokens are signed and verified '
+        'locally, Firebase is never called.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--events-per-user', type=int, default=3)
+        parser.add_argument('--guests-per-event', type=int, default=10)
+        parser.add_argument('--expenditures-per-event', type=int, default=5)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Requests sent to each route.')
+        parser.add_argument('--route', action='append', dest='routes',
+                            help='URL name to benchmark, e.g. event:fetch-events. '
+                                 'May be repeated, defaults to every route.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true',
+                            help='Print the report as JSON.')
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        routes = [
+            route for route in ROUTES
+            if not options['routes'] or route[0] in options['routes']]
+        if not routes:
+            raise CommandError(f'No route matches {options["routes"]}')
+        if options['users'] < 20:
+            raise CommandError('--users must be at least 20')
+
+        signer = auth_utils.LocalTokenSigner(PROJECT_ID)
+        test_settings = connection.settings_dict['TEST']
+        test_name = test_settings.get('NAME')
+        with tempfile.TemporaryDirectory() as directory:
+            if connection.vendor == 'sqlite':
+                # A file, unlike the default in-memory database, can be
+                # written from several threads.
+                test_settings['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+            old_name = connection.creation.create_test_db(
+                verbosity=0, autoclobber=True, serialize=False)
+            try:
+                # Reads stay on the throwaway database.
+                with mock.patch.object(auth_utils, 'id_token_verifier', signer.verifier()), \
+                        mock.patch.object(db_router, 'replica_alias', return_value=None):
+                    report = self.run(routes, signer, options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                test_settings['NAME'] = test_name
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+        if options['json']:
+            self.stdout.write(json.dumps(report))
+            return
+        self.stdout.write(
+            f'commit {report["commit"]}, {report["database"]}, '
+            f'concurrency {report["concurrency"]}, dataset {report["dataset"]}')
+        for result in report['routes']:
+            self.stdout.write(
+                f'{result["method"]:6} {result["route"]:32} '
+                f'{result["throughput_rps"] or 0:8.1f} rps  p50 {result["p50_ms"]} ms  '
+                f'p95 {result["p95_ms"]} ms  p99 {result["p99_ms"]} ms  '
+                f'{result["queries_per_request"]} queries  errors {result["errors"]}')
+
+    def run(self, routes, signer, options):
+        started = time.perf_counter()
+        dataset = Dataset(
+            random.Random(options['seed']), signer, options['users'],
+            options['events_per_user'], options['guests_per_event'],
+            options['expenditures_per_event'])
+        seeded = time.perf_counter() - started
+
+        results = [
+            self.drive(dataset, name, method, options['concurrency'], options['requests'])
+            for name, method in routes
+        ]
+        return {
+            'commit': current_commit(),
+            'database': connection.vendor,
+            'concurrency': options['concurrency'],
+            'dataset': dataset.counts,
+            'seed_s': round(seeded, 3),
+            'routes': results,
+        }
+
+    def drive(self, dataset, name, method, concurrency, count):
+        requests = iter(dataset.requests(name, method, count))
+        lock = threading.Lock()
+        latencies = []
+        errors = {}
+
+        def worker():
+            client = Client(raise_request_exception=False)
+            try:
+                while True:
+                    with lock:
+                        request = next(requests, None)
+                    if request is None:
+                        return
+                    user, path, body = request
+                    headers = {'HTTP_AUTHORIZATION': f'Token {dataset.tokens[user]}'} if user else {}
+                    started = time.perf_counter()
+                    response = client.generic(
+                        method, path, json.dumps(body) if body is not None else '',
+                        'application/json', **headers)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        if response.status_code < 400:
+                            latencies.append(elapsed)
+                        else:
+                            errors[response.status_code] = errors.get(response.status_code, 0) + 1
+            finally:
+                connections.close_all()
+
+        metrics.registry.reset()
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        queries, recorded = metrics.db_queries.value((name, method))
+        return {
+            'route': name,
+            'method': method,
+            'requests': count,
+            'succeeded': len(latencies),
+            'errors': {str(key): value for key, value in errors.items()},
+            **summarize(latencies, elapsed),
+            'queries_per_request': round(queries / recorded, 2) if recorded else None,
+        }
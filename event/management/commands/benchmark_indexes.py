@@ -0,0 +1,122 @@
+import time
+import random
+from datetime import timedelta
+from django.core.management import call_command
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.utils import timezone
+
+BEFORE = ('event', '0009_event_duration')
+AFTER = ('event', '0010_indexes_and_unique_invitation')
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a throwaway database and reports query plans and timings of the '
+        'hot lookup paths before and after the 0010 indexes migration.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--events-per-user', type=int, default=5)
+        parser.add_argument('--guests-per-event', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=False)
+        try:
+            call_command('migrate', *BEFORE, verbosity=0)
+            # The models as of BEFORE, the current ones have columns added by
+            # later migrations. 0010 only adds indexes, they fit AFTER too.
+            self.apps = MigrationExecutor(connection).loader.project_state(BEFORE).apps
+            sample = self.seed(options)
+            before = self.run_queries(sample, options['repeat'])
+            call_command('migrate', *AFTER, verbosity=0)
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            after = self.run_queries(sample, options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        self.report(before, after)
+
+    def models(self):
+        return (
+            self.apps.get_model(settings.AUTH_USER_MODEL),
+            self.apps.get_model('event', 'Event'),
+            self.apps.get_model('event', 'People'),
+        )
+
+    def seed(self, options):
+        User, Event, People = self.models()
+        users = [
+            User(uid=f'bench-{index}', username=f'bench-{index}',
+                 email=f'bench-{index}@example.com', name=f'Bench {index}')
+            for index in range(options['users'])
+        ]
+        User.objects.bulk_create(users, batch_size=1000)
+
+        now = timezone.now()
+        events = [
+            Event(name=f'Event {index}', description='', venue='Venue',
+                  time=now + timedelta(hours=random.randint(-5000, 5000)),
+                  duration=3600, creator_id=user.uid)
+            for user in users
+            for index in range(options['events_per_user'])
+        ]
+        Event.objects.bulk_create(events, batch_size=1000)
+        event_ids = list(Event.objects.values_list('id', flat=True))
+
+        invitations = []
+        for event_id in event_ids:
+            for user in random.sample(users, options['guests_per_event']):
+                invitations.append(People(
+                    user_id=user.uid, event_id=event_id,
+                    status=random.randint(0, 2)))
+        People.objects.bulk_create(invitations, batch_size=1000)
+
+        invitation = People.objects.order_by('?').first()
+        event = Event.objects.get(id=invitation.event_id)
+        return {
+            'user': invitation.user_id,
+            'creator': event.creator_id,
+            'event': event.id,
+            'email': f'{invitation.user_id}@example.com',
+        }
+
+    def queries(self, sample):
+        User, Event, People = self.models()
+        return [
+            ('Event by (id, creator)', lambda: Event.objects.filter(
+                id=sample['event'], creator_id=sample['creator'])),
+            ('Event by creator ordered by time', lambda: Event.objects.filter(
+                creator_id=sample['creator']).order_by('time')),
+            ('People by user', lambda: People.objects.filter(
+                user_id=sample['user'])),
+            ('People by (event, user)', lambda: People.objects.filter(
+                event_id=sample['event'], user_id=sample['user'])),
+            ('People by (event, status)', lambda: People.objects.filter(
+                event_id=sample['event'], status=1)),
+            ('User by email', lambda: User.objects.filter(
+                email=sample['email'])),
+        ]
+
+    def run_queries(self, sample, repeat):
+        results = {}
+        for label, build in self.queries(sample):
+            plan = build().explain().replace('\n', '; ')
+            started = time.perf_counter()
+            for _ in range(repeat):
+                list(build())
+            elapsed = (time.perf_counter() - started) / repeat
+            results[label] = (plan, elapsed * 1000)
+        return results
+
+    def report(self, before, after):
+        for label in before:
+            plan_before, ms_before = before[label]
+            plan_after, ms_after = after[label]
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(f'  before: {ms_before:.3f} ms  {plan_before}')
+            self.stdout.write(f'  after:  {ms_after:.3f} ms  {plan_after}')
@@ -0,0 +1,71 @@
+import time
+import random
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from utils.renderers import FastJSONRenderer, orjson
+from event.models import Event, Expenditure
+from event.rows import event_rows, expenditure_rows
+from event.serializers import EventSerializer, ExpenditureSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Serializes and renders the same event and expenditure lists with the '
+        'DRF serializers and with the values() row serializers, checks that '
+        'both produce identical bytes and reports the timings. Query time is '
+        'not included, rows and model instances are built in memory.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        count, repeat = options['rows'], options['repeat']
+        now = timezone.now()
+        events = [
+            Event(id=index, name=f'Event {index} ✨', description='Déjà vu ' * (index % 3),
+                  venue=f'Hall "{index % 7}"', time=now + timedelta(minutes=index, microseconds=index),
+                  fireId=f'fire-{index}', duration=random.randint(600, 7200))
+            for index in range(1, count + 1)
+        ]
+        expenditures = [
+            Expenditure(id=index, name=f'Item {index}', organization='Shop & Co',
+                        quantity=index % 10, unitPrice=random.randint(1, 10000))
+            for index in range(1, count + 1)
+        ]
+        cases = [
+            ('events', EventSerializer, events, event_rows),
+            ('expenditures', ExpenditureSerializer, expenditures, expenditure_rows),
+        ]
+        self.stdout.write(
+            f'{count} rows, best of {repeat}, orjson {"enabled" if orjson else "not installed"}')
+        for name, serializer_class, instances, rows in cases:
+            values = [
+                {column: getattr(instance, column) for column in rows.columns}
+                for instance in instances
+            ]
+
+            def drf():
+                return JSONRenderer().render(serializer_class(instances, many=True).data)
+
+            def fast():
+                return FastJSONRenderer().render(rows.many(values))
+
+            if drf() != fast():
+                raise CommandError(f'{name}: outputs differ')
+            drf_time, fast_time = self.best(drf, repeat), self.best(fast, repeat)
+            self.stdout.write(
+                f'{name}: serializer {drf_time * 1000:.1f} ms, '
+                f'rows {fast_time * 1000:.1f} ms, {drf_time / fast_time:.1f}x faster, '
+                f'identical output')
+
+    @staticmethod
+    def best(function, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
@@ -0,0 +1,90 @@
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+from django.core.management.base import BaseCommand, CommandError
+from event.management.stats import summarize
+
+DEFAULT_PATHS = [
+    '/event/fetch/',
+    '/event/fetch/invited',
+    '/event/usage/',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Sends concurrent authenticated GET requests to a running server and '
+        'reports throughput and latency percentiles. Run it against the WSGI '
+        'and the ASGI deployment with the same worker count to compare them.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--token', required=True,
+                            help='DRF token sent as "Authorization: Token <token>".')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Path to request, may be repeated. Defaults to '
+                                 'the event list, invited list and usage endpoints.')
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--json', action='store_true',
+                            help='Print the report as JSON.')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or DEFAULT_PATHS
+        report = self.run(
+            options['base_url'].rstrip('/'), options['token'], paths,
+            options['concurrency'], options['requests'], options['timeout'])
+        if options['json']:
+            self.stdout.write(json.dumps(report))
+            return
+        for key, value in report.items():
+            self.stdout.write(f'{key}: {value}')
+
+    def run(self, base_url, token, paths, concurrency, requests, timeout):
+        headers = {'Authorization': f'Token {token}'}
+        latencies = []
+        errors = {}
+        lock = threading.Lock()
+
+        def fetch(number):
+            request = Request(base_url + paths[number % len(paths)], headers=headers)
+            started = time.perf_counter()
+            try:
+                with urlopen(request, timeout=timeout) as response:
+                    response.read()
+                    outcome = response.status
+            except HTTPError as error:
+                outcome = error.code
+            except URLError as error:
+                outcome = type(error.reason).__name__
+            elapsed = time.perf_counter() - started
+            with lock:
+                if outcome == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors[outcome] = errors.get(outcome, 0) + 1
+            return outcome
+
+        outcome = fetch(0)
+        if not isinstance(outcome, int):
+            raise CommandError(f'{base_url} is not reachable ({outcome})')
+        latencies.clear()
+        errors.clear()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(fetch, range(requests)))
+        elapsed = time.perf_counter() - started
+
+        return {
+            'base_url': base_url,
+            'concurrency': concurrency,
+            'requests': requests,
+            'succeeded': len(latencies),
+            'errors': {str(key): value for key, value in errors.items()},
+            **summarize(latencies, elapsed),
+        }
@@ -0,0 +1,32 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from event.models import Change
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes sync and RSVP change log entries older than the retention '
+        'period. Clients holding an older cursor get a 410 and sync from 0.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.EVENT_SYNC_RETENTION_DAYS)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report how many entries would be deleted.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        stale = Change.objects.filter(createdAt__lt=cutoff)
+        # The newest stale entry is kept as the watermark: a cursor below it
+        # may have missed pruned entries, one at or above it has not.
+        newest = stale.order_by('-id').values_list('id', flat=True).first()
+        stale = stale.exclude(id=newest)
+        if options['dry_run']:
+            count = stale.count()
+        else:
+            count, _ = stale.delete()
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(f'{verb} {count} Change entries.')
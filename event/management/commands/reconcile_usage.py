@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from event.models import Event, People, Usage
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the per-user event.Usage counters and repairs any drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report how many users have drifted counters.')
+
+    def handle(self, *args, **options):
+        expected = {}
+        for row in Event.objects.values('creator').annotate(count=Count('id')):
+            expected.setdefault(row['creator'], [0, 0])[0] = row['count']
+        for row in People.objects.values('user').annotate(count=Count('id')):
+            expected.setdefault(row['user'], [0, 0])[1] = row['count']
+
+        with transaction.atomic():
+            stale = []
+            for usage in Usage.objects.select_for_update():
+                created, invited = expected.pop(usage.user_id, (0, 0))
+                if (usage.created, usage.invited) != (created, invited):
+                    usage.created, usage.invited = created, invited
+                    stale.append(usage)
+            missing = [
+                Usage(user_id=user_id, created=created, invited=invited)
+                for user_id, (created, invited) in expected.items()
+            ]
+            if not options['dry_run']:
+                Usage.objects.bulk_update(
+                    stale, ['created', 'invited'], batch_size=options['batch_size'])
+                Usage.objects.bulk_create(
+                    missing, batch_size=options['batch_size'], ignore_conflicts=True)
+
+        verb = 'Would repair' if options['dry_run'] else 'Repaired'
+        self.stdout.write(
+            f'{verb} {len(stale)} drifted and {len(missing)} missing usage rows.')
@@ -0,0 +1,85 @@
+import json
+import time
+import asyncio
+from django.core.management.base import BaseCommand
+from event.management.stats import summarize
+from event.pubsub import InProcessBroker
+from event.stream import EventStream, STREAM_PATH
+
+
+class Command(BaseCommand):
+    help = (
+        'Drives many concurrent in-process subscribers of the event stream '
+        'and reports delivery counts and latency percentiles.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=1000)
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--messages', type=int, default=50)
+
+    def handle(self, *args, **options):
+        report = asyncio.run(self.run(**{
+            key: options[key] for key in ('subscribers', 'users', 'messages')}))
+        for key, value in report.items():
+            self.stdout.write(f'{key}: {value}')
+
+    async def run(self, subscribers, users, messages):
+        broker = InProcessBroker()
+
+        async def authenticate(token):
+            return token
+
+        async def unused_app(scope, receive, send):
+            raise AssertionError('Only the stream endpoint is exercised')
+
+        app = EventStream(unused_app, broker=broker, authenticate=authenticate)
+        latencies = []
+        disconnect = asyncio.Event()
+
+        async def receive():
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            body = message.get('body', b'')
+            for line in body.decode('utf-8').splitlines():
+                if line.startswith('data: '):
+                    latencies.append(time.perf_counter() - json.loads(line[6:])['sentAt'])
+
+        clients = [
+            asyncio.ensure_future(app({
+                'type': 'http', 'method': 'GET', 'path': STREAM_PATH,
+                'query_string': f'token=user-{index % users}'.encode(),
+                'headers': [],
+            }, receive, send))
+            for index in range(subscribers)
+        ]
+        while broker.subscriber_count() < subscribers:
+            await asyncio.sleep(0.01)
+
+        def publish_all():
+            # Publishers run on a worker thread like the sync Django views.
+            for number in range(messages):
+                broker.publish([f'user-{number % users}'], {
+                    'type': 'event.updated', 'event': number,
+                    'sentAt': time.perf_counter()})
+
+        expected = sum(
+            subscribers // users + (1 if (number % users) < subscribers % users else 0)
+            for number in range(messages))
+        started = time.perf_counter()
+        await asyncio.get_running_loop().run_in_executor(None, publish_all)
+        while len(latencies) < expected and time.perf_counter() - started < 30:
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - started
+
+        disconnect.set()
+        await asyncio.gather(*clients)
+
+        return {
+            'subscribers': subscribers,
+            'expected_deliveries': expected,
+            'delivered': len(latencies),
+            **summarize(latencies, elapsed),
+            'subscribers_left': broker.subscriber_count(),
+        }
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from utils.db.router import REPLICA, replica_alias
+
+
+class Command(BaseCommand):
+    help = (
+        'Copies the primary SQLite database onto the SQLite file standing in '
+        'for the read replica (SQLITE_REPLICA_PATH). Run it to simulate the '
+        'replica catching up, until then reads from it return stale data.')
+
+    def handle(self, *args, **options):
+        if replica_alias() is None:
+            raise CommandError('No replica configured, set SQLITE_REPLICA_PATH.')
+        primary, replica = connections[DEFAULT_DB_ALIAS], connections[REPLICA]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError('Only SQLite primaries and replicas can be copied.')
+        primary.ensure_connection()
+        replica.ensure_connection()
+        primary.connection.backup(replica.connection)
+        self.stdout.write(
+            f'Copied {primary.settings_dict["NAME"]} to {replica.settings_dict["NAME"]}')
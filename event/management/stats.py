@@ -0,0 +1,27 @@
+import statistics
+
+
+def percentile(latencies, fraction):
+    """
+    The `fraction` percentile of the sorted `latencies` (seconds) in
+    milliseconds, None when there are none.
+    """
+    if not latencies:
+        return None
+    return round(latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000, 2)
+
+
+def summarize(latencies, elapsed):
+    """
+    Throughput, mean and p50/p95/p99 of `latencies` (seconds) collected over
+    `elapsed` seconds, as reported by the benchmark and load test commands.
+    """
+    latencies = sorted(latencies)
+    return {
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+    }
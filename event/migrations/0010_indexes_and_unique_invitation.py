@@ -0,0 +1,35 @@
+# Generated by Django 4.0.10 on 2026-10-18 11:50
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_invitations(apps, schema_editor):
+    People = apps.get_model('event', 'People')
+    keep = People.objects.values('user', 'event').annotate(
+        keep=Min('id')).values('keep')
+    People.objects.exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0009_event_duration'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_invitations, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['creator', 'time'], name='event_creator_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='people',
+            index=models.Index(fields=['event', 'status'], name='people_event_status_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='people',
+            constraint=models.UniqueConstraint(fields=('user', 'event'), name='people_unique_user_event'),
+        ),
+    ]
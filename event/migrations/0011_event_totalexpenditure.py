@@ -0,0 +1,30 @@
+# Generated by Django 4.0.10 on 2026-10-18 11:52
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum
+
+
+def backfill_total_expenditure(apps, schema_editor):
+    Event = apps.get_model('event', 'Event')
+    Expenditure = apps.get_model('event', 'Expenditure')
+    totals = Expenditure.objects.filter(event=OuterRef('pk')).order_by().values(
+        'event').annotate(total=Sum(F('quantity') * F('unitPrice'))).values('total')
+    Event.objects.filter(expenditure__isnull=False).update(
+        totalExpenditure=Subquery(totals))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0010_indexes_and_unique_invitation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='totalExpenditure',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(
+            backfill_total_expenditure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.0.10 on 2026-10-18 11:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def backfill_usage(apps, schema_editor):
+    Event = apps.get_model('event', 'Event')
+    People = apps.get_model('event', 'People')
+    Usage = apps.get_model('event', 'Usage')
+    usage = {}
+    for row in Event.objects.values('creator').annotate(count=Count('id')):
+        usage.setdefault(row['creator'], Usage(user_id=row['creator'])).created = row['count']
+    for row in People.objects.values('user').annotate(count=Count('id')):
+        usage.setdefault(row['user'], Usage(user_id=row['user'])).invited = row['count']
+    Usage.objects.bulk_create(usage.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_alter_user_uid'),
+        ('event', '0011_event_totalexpenditure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Usage',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('created', models.IntegerField(default=0)),
+                ('invited', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_usage, migrations.RunPython.noop),
+    ]
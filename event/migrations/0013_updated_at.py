@@ -0,0 +1,28 @@
+# Generated by Django 4.0.10 on 2026-10-18 11:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0012_usage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='updatedAt',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='expenditure',
+            name='updatedAt',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='people',
+            name='updatedAt',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.0.10 on 2026-10-18 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0013_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvitationChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('invitationId', models.BigIntegerField()),
+                ('eventId', models.BigIntegerField()),
+                ('userId', models.CharField(max_length=1500)),
+                ('creatorId', models.CharField(max_length=1500)),
+                ('status', models.SmallIntegerField(choices=[(0, 'Pending'), (1, 'Accepted'), (2, 'Declined')])),
+                ('createdAt', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='people',
+            name='status',
+            field=models.IntegerField(choices=[(0, 'Pending'), (1, 'Accepted'), (2, 'Declined')], default=0),
+        ),
+        migrations.AddIndex(
+            model_name='invitationchange',
+            index=models.Index(fields=['userId', 'id'], name='change_user_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invitationchange',
+            index=models.Index(fields=['creatorId', 'id'], name='change_creator_seq_idx'),
+        ),
+    ]
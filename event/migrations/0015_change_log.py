@@ -0,0 +1,38 @@
+# Generated by Django 4.0.10 on 2026-10-18 12:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0014_invitation_status_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.SmallIntegerField(choices=[(1, 'Event'), (2, 'Invitation'), (3, 'Expenditure')])),
+                ('objectId', models.BigIntegerField()),
+                ('eventId', models.BigIntegerField()),
+                ('creatorId', models.CharField(max_length=1500)),
+                ('userId', models.CharField(blank=True, default='', max_length=1500)),
+                ('deleted', models.BooleanField(default=False)),
+                ('createdAt', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['creatorId', 'id'], name='sync_creator_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['userId', 'id'], name='sync_user_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['eventId', 'id'], name='sync_event_seq_idx'),
+        ),
+    ]
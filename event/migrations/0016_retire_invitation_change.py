@@ -0,0 +1,21 @@
+# Generated by Django 4.0.10 on 2026-10-18 12:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0015_change_log'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='InvitationChange',
+        ),
+        migrations.AddField(
+            model_name='change',
+            name='status',
+            field=models.SmallIntegerField(blank=True, choices=[(0, 'Pending'), (1, 'Accepted'), (2, 'Declined')], null=True),
+        ),
+    ]
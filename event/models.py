@@ -13,26 +13,99 @@ class Event(models.Model):
     duration = models.IntegerField()
     creator = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
     fireId = models.CharField(max_length=255, default='')
+    # Running sum of quantity * unitPrice over the event's expenditures.
+    totalExpenditure = models.BigIntegerField(default=0)
+    updatedAt = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['creator', 'time'], name='event_creator_time_idx'),
+        ]
 
     def __str__(self):
         return f'{self.name}'
 
 
 class People(models.Model):
+    class Status(models.IntegerChoices):
+        PENDING = 0
+        ACCEPTED = 1
+        DECLINED = 2
+
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
-    status = models.IntegerField(default=0)
+    status = models.IntegerField(choices=Status.choices, default=Status.PENDING)
     event = models.ForeignKey(Event, on_delete=models.CASCADE)
+    updatedAt = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'event'], name='people_unique_user_event'),
+        ]
+        indexes = [
+            models.Index(fields=['event', 'status'], name='people_event_status_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user.name}'
 
 
+class Change(models.Model):
+    """
+    Append-only log of writes to events, invitations and expenditures, the
+    id is the sequence number /event/sync/ and /event/invitation/changes/
+    cursors point into. Deletes are logged as tombstones. Rows hold plain
+    ids instead of foreign keys so an append is one narrow insert and the
+    log outlives the objects.
+    """
+    class Kind(models.IntegerChoices):
+        EVENT = 1
+        INVITATION = 2
+        EXPENDITURE = 3
+
+    kind = models.SmallIntegerField(choices=Kind.choices)
+    objectId = models.BigIntegerField()
+    eventId = models.BigIntegerField()
+    creatorId = models.CharField(max_length=1500)
+    # The invitee of an invitation change, blank for the other kinds.
+    userId = models.CharField(max_length=1500, blank=True, default='')
+    # The new RSVP of an invitation status change, null for other changes.
+    status = models.SmallIntegerField(choices=People.Status.choices, null=True, blank=True)
+    deleted = models.BooleanField(default=False)
+    createdAt = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['creatorId', 'id'], name='sync_creator_seq_idx'),
+            models.Index(fields=['userId', 'id'], name='sync_user_seq_idx'),
+            models.Index(fields=['eventId', 'id'], name='sync_event_seq_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.id}'
+
+
 class Expenditure(models.Model):
     name = models.CharField(max_length=100)
     organization = models.CharField(max_length=100)
     quantity = models.IntegerField(default=0)
     unitPrice = models.IntegerField()
     event = models.ForeignKey(Event, on_delete=models.CASCADE)
+    updatedAt = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f'{self.name}'
+
+
+class Usage(models.Model):
+    """
+    Denormalized per-user counters served by UsageView, kept up to date by
+    event.signals and repaired by the reconcile_usage command.
+    """
+    user = models.OneToOneField(
+        get_user_model(), on_delete=models.CASCADE, primary_key=True)
+    created = models.IntegerField(default=0)
+    invited = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.user_id}'
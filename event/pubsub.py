@@ -0,0 +1,95 @@
+import asyncio
+import threading
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+RESYNC = {'type': 'resync'}
+
+
+class Subscription:
+    """
+    One connected client. Messages are handed over to the subscriber's event
+    loop, so publishers may run on any thread.
+    """
+
+    def __init__(self, user_id, maxsize=100):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # The client missed messages and has to refetch everything.
+            self.overflowed = True
+
+    def deliver(self, message):
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    async def get(self, timeout=None):
+        if self.overflowed and self.queue.empty():
+            self.overflowed = False
+            return RESYNC
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class InProcessBroker:
+    """
+    Fans messages out to subscribers of this process only. A shared broker
+    (e.g. Redis pub/sub) implements the same subscribe/unsubscribe/publish
+    interface and is selected with the EVENT_STREAM_BROKER setting.
+    """
+
+    def __init__(self):
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.user_id, None)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def publish(self, user_ids, message):
+        with self._lock:
+            targets = [
+                subscription
+                for user_id in set(user_ids)
+                for subscription in self._subscriptions.get(user_id, ())
+            ]
+        for subscription in targets:
+            subscription.deliver(message)
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(settings.EVENT_STREAM_BROKER)()
+    return _broker
+
+
+def publish(user_ids, type, **payload):
+    """
+    Publishes a change once the current transaction commits, subscribers
+    must never see data that may still be rolled back.
+    """
+    user_ids = list(user_ids)
+    message = dict(payload, type=type)
+    transaction.on_commit(lambda: get_broker().publish(user_ids, message))
@@ -1,7 +1,30 @@
+import io
+import csv
+from collections.abc import Mapping
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Q, Sum
 from rest_framework import serializers, status
-from .models import Event, People, Expenditure
+from .models import Change, Event, People, Expenditure
+from .access import get_event_access
+from .pagination import KeysetPagination
+from .pubsub import publish
+from .rows import (
+    RowSerializer,
+    change_rows,
+    event_rows,
+    expenditure_export_rows,
+    guest_export_rows,
+    guest_rows,
+    iso_datetime,
+    sync_expenditure_rows,
+    sync_guest_rows
+)
+from .streaming import CSVStream, NDJSONStream, RowStream, streaming_enabled
+from .signals import adjust_usage, invalidate_responses
+from .sync import append_changes, cursor_expired, record_changes, status_changes
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from datetime import datetime
 
 
@@ -22,85 +45,118 @@ class CreateEventSerializer(serializers.Serializer):
         fireId = self.validated_data.get('fireId')
         user = self.context["request"].user
 
-        event = Event.objects.create(
-            name=name, description=description,
-            venue=venue, time=time,
-            duration=duration,
-            creator=user, fireId=fireId
-        )
-        event.save()
+        # The event commits with its sync log entry, see signals.event_created.
+        with transaction.atomic():
+            event = Event.objects.create(
+                name=name, description=description,
+                venue=venue, time=time,
+                duration=duration,
+                creator=user, fireId=fireId
+            )
         return event
 
 
 class FetchEventsSerializer(serializers.Serializer):
-    def fetch(self):
+    UPCOMING = 'upcoming'
+    PAST = 'past'
+
+    scope = serializers.ChoiceField(choices=[UPCOMING, PAST], required=False)
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+
+    def get_fields(self):
+        # `fields` is the query parameter name but also a Serializer attribute.
+        fields = super().get_fields()
+        fields['fields'] = serializers.CharField(required=False)
+        return fields
+
+    def validate_fields(self, value):
+        fields = [field for field in value.split(',') if field]
+        unknown = set(fields) - set(EventSerializer.Meta.fields)
+        if not fields or unknown:
+            raise serializers.ValidationError(
+                f'Unknown fields: {", ".join(sorted(unknown))}' if unknown
+                else 'No fields requested')
+        return fields
+
+    def filter(self, events):
+        scope = self.validated_data.get('scope')
+        start = self.validated_data.get('start')
+        end = self.validated_data.get('end')
+        now = timezone.now()
+        if scope == self.UPCOMING:
+            events = events.filter(time__gte=now)
+        elif scope == self.PAST:
+            events = events.filter(time__lt=now)
+        if start is not None:
+            events = events.filter(time__gte=start)
+        if end is not None:
+            events = events.filter(time__lt=end)
+        return events
+
+    def events(self):
         user = self.context["request"].user
-        events = Event.objects.filter(creator=user)
-        events_serialized = EventSerializer(events, many=True)
-        return events_serialized
+        return self.filter(Event.objects.filter(creator=user))
 
-
-class FetchEventSerializer(serializers.Serializer):
+    def fetch(self):
+        request = self.context["request"]
+        fields = self.validated_data.get('fields')
+        rows = event_rows.only(fields) if fields else event_rows
+        # id and time are always loaded, the pagination cursor needs them.
+        events = self.events().values(*dict.fromkeys(('id', 'time', *rows.columns)))
+
+        pagination = KeysetPagination(request, ('time', 'id'))
+        if streaming_enabled(request, pagination):
+            return RowStream(events.order_by(*pagination.fields), rows.many)
+        return pagination.wrap(rows.many(pagination.paginate(events)))
+
+
+class CreatorEventSerializer(serializers.Serializer):
+    """
+    Base for endpoints restricted to the event creator. validate() loads the
+    event once through get_event_access, later steps reuse `self.event`.
+    """
     id = serializers.IntegerField()
 
     def validate(self, data):
-        id = data.get('id')
-        user = self.context["request"].user
-        event = Event.objects.filter(id=id, creator=user)
-        if not event:
+        access = get_event_access(self.context["request"], data.get('id'))
+        if not access or not access.is_creator:
             raise ValidationError(
                 "User not permitted to access this event", status.HTTP_403_FORBIDDEN)
         return data
 
+    @property
+    def event(self):
+        return get_event_access(
+            self.context["request"], self.validated_data.get("id")).event
+
+
+class FetchEventSerializer(CreatorEventSerializer):
     def fetch(self):
-        id = self.validated_data.get("id")
-        user = self.context["request"].user
-        event = Event.objects.filter(id=id, creator=user)[0]
-        event_serialized = EventSerializer(event)
+        event_serialized = EventSerializer(self.event)
         return event_serialized
 
 
-class DeleteEventSerializer(serializers.Serializer):
-    id = serializers.IntegerField()
-
-    def validate(self, data):
-        id = data.get("id")
-        user = self.context["request"].user
-        event = Event.objects.filter(id=id, creator=user)
-        if not event:
-            raise ValidationError(
-                "User not permitted to access this event", status.HTTP_403_FORBIDDEN)
-        return data
-
+class DeleteEventSerializer(CreatorEventSerializer):
     def delete_event(self):
-        id = self.validated_data.get("id")
-        user = self.context["request"].user
-        event = Event.objects.filter(id=id, creator=user)[0]
-        event.delete()
+        self.event.delete()
 
 
-class UpdateEventSerializer(serializers.Serializer):
-    id = serializers.IntegerField()
+class UpdateEventSerializer(CreatorEventSerializer):
     time = serializers.CharField()
     name = serializers.CharField(max_length=100)
     description = serializers.CharField(max_length=255, allow_blank=True)
     venue = serializers.CharField(max_length=255)
 
     def validate(self, data):
-        id = data.get("id")
-        user = self.context["request"].user
-        event = Event.objects.filter(id=id, creator=user)
-        if not event:
-            raise ValidationError(
-                "User not permitted to access this event", status.HTTP_403_FORBIDDEN)
-
-        event = event[0]
+        data = super().validate(data)
+        event = get_event_access(self.context["request"], data.get('id')).event
         currDate = int(datetime.now().strftime("%Y%m%d%H%M%S"))
         eventDate = int(event.time.strftime("%Y%m%d%H%M%S"))
         if (eventDate < currDate):
             raise ValidationError(
                 'Event cannot be modified because it is completed',
-                status=status.HTTP_400_BAD_REQUEST)
+                status.HTTP_400_BAD_REQUEST)
         return data
 
     def update_event(self):
@@ -110,15 +166,13 @@ class UpdateEventSerializer(serializers.Serializer):
         description = self.validated_data.get('description')
         venue = self.validated_data.get('venue')
 
-        id = self.validated_data.get('id')
-        user = self.context["request"].user
-        event = Event.objects.filter(id=id, creator=user)[0]
-
+        event = self.event
         event.time = time
         event.name = name
         event.description = description
         event.venue = venue
-        event.save()
+        with transaction.atomic():
+            event.save(update_fields=['time', 'name', 'description', 'venue', 'updatedAt'])
 
 
 class EventSerializer(serializers.ModelSerializer):
@@ -134,119 +188,441 @@ class InvitationSerializer(serializers.Serializer):
 
     def validate(self, data):
         User = get_user_model()
-        email = data.get('email')
-        id = data.get('id')
-        if not User.objects.filter(email=email).exists():
+        user = User.objects.filter(email=data.get('email')).first()
+        if user is None:
             raise serializers.ValidationError(
                 'User with this email does not exist',
                 status.HTTP_404_NOT_FOUND)
-        if not Event.objects.filter(id=id).exists():
+        event = Event.objects.filter(id=data.get('id')).first()
+        if event is None:
             raise serializers.ValidationError(
                 'Event with this id does not exist',
                 status.HTTP_404_NOT_FOUND)
-        if People.objects.filter(user__email=email, event__id=id).exists():
+        eventDate = int(event.time.strftime("%Y%m%d%H%M%S"))
+        currDate = int(datetime.now().strftime("%Y%m%d%H%M%S"))
+
+        if (eventDate < currDate):
+            raise serializers.ValidationError(
+                'User cannot be invited because event is completed', status.HTTP_403_FORBIDDEN)
+
+        # Reused by save instead of fetching both again.
+        data['user'] = user
+        data['event'] = event
+        return data
+
+    def save(self):
+        user = self.validated_data.get('user')
+        event = self.validated_data.get('event')
+        # Duplicates are rejected by the unique (user, event) constraint.
+        try:
+            with transaction.atomic():
+                invitation = People.objects.create(user=user, event=event)
+        except IntegrityError:
             raise serializers.ValidationError(
                 'User is already invited to this event',
                 status.HTTP_409_CONFLICT)
+        return invitation
+
+
+class BulkInvitationSerializer(serializers.Serializer):
+    CREATED = 'created'
+    ALREADY_INVITED = 'already_invited'
+    UNKNOWN_USER = 'unknown_user'
+
+    id = serializers.IntegerField()
+    emails = serializers.ListField(
+        child=serializers.EmailField(max_length=255),
+        allow_empty=False, max_length=1000)
+
+    def validate(self, data):
+        access = get_event_access(self.context['request'], data.get('id'))
+        if not access:
+            raise serializers.ValidationError(
+                'Event with this id does not exist',
+                status.HTTP_404_NOT_FOUND)
+        if not access.is_creator:
+            raise serializers.ValidationError(
+                'User not permitted to invite people to this event',
+                status.HTTP_403_FORBIDDEN)
+        event = access.event
 
-        eventDate = int(Event.objects.get(id=id).time.strftime("%Y%m%d%H%M%S"))
+        eventDate = int(event.time.strftime("%Y%m%d%H%M%S"))
         currDate = int(datetime.now().strftime("%Y%m%d%H%M%S"))
 
         if (eventDate < currDate):
             raise serializers.ValidationError(
                 'User cannot be invited because event is completed', status.HTTP_403_FORBIDDEN)
 
+        data['emails'] = list(dict.fromkeys(data.get('emails')))
+        data['creator_id'] = event.creator_id
         return data
 
     def save(self):
         User = get_user_model()
-        email = self.validated_data.get('email')
         id = self.validated_data.get('id')
-        user = User.objects.filter(email=email)[0]
-        event = Event.objects.get(id=id)
-        invitation = People.objects.create(user=user, event=event)
-        invitation.save()
-        return invitation
+        emails = self.validated_data.get('emails')
+
+        users = {
+            user['email']: user
+            for user in User.objects.filter(email__in=emails).values('pk', 'email', 'name')
+        }
+        invited = set(People.objects.filter(
+            event__id=id, user__in=[user['pk'] for user in users.values()]
+        ).values_list('user_id', flat=True))
+
+        results = []
+        invitations = []
+        for email in emails:
+            user = users.get(email)
+            if user is None:
+                results.append({'email': email, 'result': self.UNKNOWN_USER})
+            elif user['pk'] in invited:
+                results.append({'email': email, 'result': self.ALREADY_INVITED})
+            else:
+                invitations.append(People(user_id=user['pk'], event_id=id))
+                results.append({
+                    'email': email, 'result': self.CREATED, 'name': user['name']})
+
+        # A concurrent invite of the same user is not an error here.
+        with transaction.atomic():
+            People.objects.bulk_create(invitations, ignore_conflicts=True)
+            # bulk_create sends no post_save, keep the usage counters in step.
+            if invitations:
+                invitees = [invitation.user_id for invitation in invitations]
+                adjust_usage(invitees, 'invited', 1)
+                invalidate_responses(invitees)
+                creator_id = self.validated_data.get('creator_id')
+                # ignore_conflicts leaves the primary keys unset.
+                ids = dict(People.objects.filter(
+                    event__id=id, user_id__in=invitees).values_list('user_id', 'id'))
+                record_changes(Change.Kind.INVITATION, [
+                    (ids[user_id], id, creator_id, user_id) for user_id in invitees])
+                for invitation in invitations:
+                    publish(
+                        [invitation.user_id, creator_id], 'invitation.created',
+                        event=id, invitation=ids[invitation.user_id],
+                        status=invitation.status)
+        return results
 
 
 class InvitedEventSerializer(serializers.Serializer):
+    ordering = ('event__time', 'event__id')
+    fields_map = (
+        ('id', 'event__id'),
+        ('name', 'event__name'),
+        ('description', 'event__description'),
+        ('venue', 'event__venue'),
+        ('time', 'event__time'),
+        ('fireId', 'event__fireId'),
+        ('duration', 'event__duration'),
+        ('status', 'status'),
+    )
+
+    @classmethod
+    def invitations(cls, user):
+        return People.objects.filter(user=user).values(
+            *[column for _, column in cls.fields_map],
+            'event__creator__name', 'event__creator__email')
+
+    rows = RowSerializer(
+        (key, column, iso_datetime) if key == 'time' else (key, column)
+        for key, column in fields_map)
+
+    @classmethod
+    def to_dicts(cls, rows):
+        eventDicts = cls.rows.many(rows)
+        for eventDict, row in zip(eventDicts, rows):
+            eventDict['invitedBy'] = (
+                f'{row["event__creator__name"]} : {row["event__creator__email"]}')
+        return eventDicts
+
     def fetch(self):
+        request = self.context["request"]
+        pagination = KeysetPagination(request, self.ordering)
+        invitations = self.invitations(request.user)
+        if streaming_enabled(request, pagination):
+            return RowStream(invitations.order_by(*self.ordering), self.to_dicts)
+        rows = pagination.paginate(invitations)
+        return pagination.wrap(self.to_dicts(rows))
+
+    def fetch_one(self, id):
         user = self.context["request"].user
-        invitations = People.objects.filter(user=user)
-
-        if (invitations):
-            invitedEvents = []
-            for invitation in invitations:
-                eventObj = invitation.event
-                eventDict = EventSerializer(eventObj).data
-                eventDict['status'] = invitation.status
-                eventDict['invitedBy'] = f'{eventObj.creator.name} : {eventObj.creator.email}'
-                invitedEvents.append(eventDict)
-            return invitedEvents
-        return []
+        row = self.invitations(user).filter(event__id=id).first()
+        if row is None:
+            return None
+        return self.to_dicts([row])[0]
 
 
 class InvitationStatusSerializer(serializers.Serializer):
     id = serializers.IntegerField()
-    status = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=People.Status.choices)
 
     def validate(self, data):
-        id = data.get('id')
-        status = data.get('status')
         user = self.context['request'].user
-
-        if not People.objects.filter(event__id=id, user=user).exists():
+        # The event is only joined for its creator, needed by the change log
+        # and the invitation.status message.
+        self.invitation = People.objects.select_related('event').filter(
+            event__id=data.get('id'), user=user).first()
+        if self.invitation is None:
             raise ValidationError(
                 'User not permitted to modify this invitation',
                 status.HTTP_403_FORBIDDEN)
-
         return data
 
     def save(self):
-        id = self.validated_data.get('id')
-        status = self.validated_data.get('status')
+        invitation = self.invitation
+        new_status = self.validated_data.get('status')
+        # Saving the status logs an RSVP change, see invitation_created.
+        fields = ['status', 'updatedAt'] if invitation.status != new_status else ['updatedAt']
+        invitation.status = new_status
+        with transaction.atomic():
+            invitation.save(update_fields=fields)
+
+
+class StatusUpdateSerializer(serializers.Serializer):
+    event = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=People.Status.choices)
+
+
+class BatchInvitationStatusSerializer(serializers.Serializer):
+    """
+    Applies many RSVP changes of the current user at once, e.g. replayed by
+    an offline client. Updates are applied in order, the last one of an
+    event wins. Updates of events the user is not invited to are skipped.
+    """
+    UPDATED = 'updated'
+    UNCHANGED = 'unchanged'
+    NOT_INVITED = 'not_invited'
+
+    updates = serializers.ListField(
+        child=StatusUpdateSerializer(), allow_empty=False, max_length=1000)
+
+    def save(self):
         user = self.context['request'].user
+        latest = {
+            update['event']: update['status']
+            for update in self.validated_data.get('updates')
+        }
+        invitations = {
+            event_id: (invitation_id, current, creator_id)
+            for invitation_id, event_id, current, creator_id in People.objects.filter(
+                user=user, event__id__in=latest).values_list(
+                    'id', 'event_id', 'status', 'event__creator_id')
+        }
+
+        results = []
+        changes = []
+        for event_id, new_status in latest.items():
+            invitation = invitations.get(event_id)
+            if invitation is None:
+                result = self.NOT_INVITED
+            elif invitation[1] == new_status:
+                result = self.UNCHANGED
+            else:
+                result = self.UPDATED
+                changes.append(
+                    (invitation[0], event_id, user.pk, invitation[2], new_status))
+            results.append({'event': event_id, 'status': new_status, 'result': result})
+
+        if changes:
+            by_status = {}
+            for invitation_id, _, _, _, new_status in changes:
+                by_status.setdefault(new_status, []).append(invitation_id)
+            now = timezone.now()
+            with transaction.atomic():
+                # One UPDATE per status value, writing only the changed columns.
+                for new_status, ids in by_status.items():
+                    People.objects.filter(id__in=ids).update(status=new_status, updatedAt=now)
+                append_changes(status_changes(changes))
+                # update() sends no post_save, do what invitation_created would.
+                invalidate_responses([user.pk, *{change[3] for change in changes}])
+                for invitation_id, event_id, _, creator_id, new_status in changes:
+                    publish(
+                        [user.pk, creator_id], 'invitation.status', event=event_id,
+                        invitation=invitation_id, status=new_status)
+        return results
+
+
+class InvitationChangesSerializer(serializers.Serializer):
+    """
+    RSVP changes the user can see, their own and those of their events'
+    guests, after sequence number `since`. `next` is the `since` of the
+    following call.
+    """
+    since = serializers.IntegerField(min_value=0, default=0)
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=500)
+
+    def validate(self, data):
+        if cursor_expired(Change, data.get('since')):
+            raise ValidationError(
+                'Changes after this cursor were pruned', status.HTTP_410_GONE)
+        return data
+
+    def fetch(self):
+        user = self.context['request'].user
+        since = self.validated_data.get('since')
+        limit = self.validated_data.get('limit')
+        rows = list(Change.objects.filter(
+            Q(userId=user.pk) | Q(creatorId=user.pk), id__gt=since,
+            kind=Change.Kind.INVITATION, status__isnull=False,
+        ).order_by('id').values(*change_rows.columns)[:limit + 1])
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            'changes': change_rows.many(rows),
+            'next': rows[-1]['id'] if rows else since,
+            'more': more,
+        }
+
+
+class SyncSerializer(serializers.Serializer):
+    """
+    Everything that changed for the user after sequence number `since`:
+    their events, the events they are invited to, their events' guests and
+    expenditures, each as the rows' current state, plus the ids deleted
+    since. `since=0` returns all of it. `cursor` is the `since` of the
+    following call, with `more` the client calls again right away.
+
+    Only the latest change of each object counts, objects are loaded by id
+    in one query per kind whatever the number of changes.
+    """
+    since = serializers.IntegerField(min_value=0, default=0)
+    limit = serializers.IntegerField(min_value=1, max_value=5000, default=1000)
+
+    def validate(self, data):
+        if cursor_expired(Change, data.get('since')):
+            raise ValidationError(
+                'Changes after this cursor were pruned, sync again from 0',
+                status.HTTP_410_GONE)
+        return data
+
+    def invited_events(self, user):
+        return People.objects.filter(user=user).values('event_id')
+
+    def visible_changes(self, user):
+        return Change.objects.filter(
+            Q(creatorId=user.pk) | Q(userId=user.pk)
+            | Q(kind=Change.Kind.EVENT, eventId__in=self.invited_events(user)))
+
+    def snapshot(self, user):
+        # Read before the rows: whatever is written in between is sent again
+        # by the next call, which is harmless, rather than missed.
+        cursor = Change.objects.aggregate(cursor=Max('id'))['cursor'] or 0
+        return {
+            'events': event_rows.many(
+                Event.objects.filter(creator=user).order_by('id')
+                .values(*event_rows.columns)),
+            'invited': InvitedEventSerializer.to_dicts(list(
+                InvitedEventSerializer.invitations(user).order_by('event__id'))),
+            'guests': sync_guest_rows.many(
+                People.objects.filter(event__creator=user).order_by('id')
+                .values(*sync_guest_rows.columns)),
+            'expenditures': sync_expenditure_rows.many(
+                Expenditure.objects.filter(event__creator=user).order_by('id')
+                .values(*sync_expenditure_rows.columns)),
+            'deleted': {'events': [], 'invited': [], 'guests': [], 'expenditures': []},
+            'cursor': cursor,
+            'more': False,
+        }
 
-        invitation = People.objects.filter(event__id=id, user=user)[0]
-        invitation.status = status
-        invitation.save()
+    def fetch(self):
+        user = self.context['request'].user
+        since = self.validated_data.get('since')
+        limit = self.validated_data.get('limit')
+        if not since:
+            return self.snapshot(user)
+
+        changes = list(self.visible_changes(user).filter(id__gt=since).order_by('id').values_list(
+            'id', 'kind', 'objectId', 'eventId', 'creatorId', 'userId', 'deleted')[:limit + 1])
+        more = len(changes) > limit
+        changes = changes[:limit]
+
+        # Changes come oldest first, the latest of each object wins.
+        latest = {'events': {}, 'invited': {}, 'guests': {}, 'expenditures': {}}
+        for _, kind, object_id, event_id, creator_id, user_id, deleted in changes:
+            if kind == Change.Kind.EVENT:
+                if creator_id == user.pk:
+                    latest['events'][object_id] = deleted
+                elif not deleted:
+                    # Invitees learn of a deleted event from their invitation.
+                    latest['invited'][event_id] = False
+            elif kind == Change.Kind.INVITATION:
+                if user_id == user.pk:
+                    latest['invited'][event_id] = deleted
+                if creator_id == user.pk:
+                    latest['guests'][object_id] = deleted
+            elif kind == Change.Kind.EXPENDITURE:
+                latest['expenditures'][object_id] = deleted
+
+        def live(key):
+            return [id for id, deleted in latest[key].items() if not deleted]
+
+        events = event_rows.many(Event.objects.filter(
+            creator=user, id__in=live('events')).order_by('id').values(*event_rows.columns))
+        invited = InvitedEventSerializer.to_dicts(list(
+            InvitedEventSerializer.invitations(user).filter(
+                event__id__in=live('invited')).order_by('event__id')))
+        guests = sync_guest_rows.many(People.objects.filter(
+            event__creator=user, id__in=live('guests')).order_by('id')
+            .values(*sync_guest_rows.columns))
+        expenditures = sync_expenditure_rows.many(Expenditure.objects.filter(
+            event__creator=user, id__in=live('expenditures')).order_by('id')
+            .values(*sync_expenditure_rows.columns))
+
+        # Objects gone by now are tombstones too, their delete is logged
+        # after this batch.
+        found = {
+            'events': {row['id'] for row in events},
+            'invited': {row['id'] for row in invited},
+            'guests': {row['id'] for row in guests},
+            'expenditures': {row['id'] for row in expenditures},
+        }
+        return {
+            'events': events,
+            'invited': invited,
+            'guests': guests,
+            'expenditures': expenditures,
+            'deleted': {
+                key: sorted(id for id in latest[key] if id not in found[key])
+                for key in latest
+            },
+            'cursor': changes[-1][0] if changes else since,
+            'more': more,
+        }
 
 
 class GuestsSerializer(serializers.Serializer):
     id = serializers.IntegerField()
 
     def validate(self, data):
-        id = data.get('id')
-        user = self.context['request'].user
-
-        event = Event.objects.filter(id=id)
-        if not event:
+        access = get_event_access(self.context['request'], data.get('id'))
+        if not access:
             raise ValidationError(
                 'Event with this id does not exist', status.HTTP_404_NOT_FOUND)
 
-        creator = event[0].creator
-        invitation = People.objects.filter(event__id=id, user=user)
-        if creator == user:
-            return data
-        if invitation:
+        if access.role is not None:
             return data
 
         raise ValidationError(
             'User not permitted to see guest list of this event',
             status.HTTP_403_FORBIDDEN)
 
-    def fetch(self):
+    def guests(self):
         guests = People.objects.filter(event__id=self.validated_data.get('id'))
-        guestsDictList = []
-        if guests:
-            for guest in guests:
-                guestsDictList.append({
-                    'id': guest.id,
-                    'status': guest.status,
-                    'name': guest.user.name,
-                    'email': guest.user.email
-                })
-        return guestsDictList
+        guest_status = self.context['request'].query_params.get('status')
+        if guest_status is not None:
+            try:
+                guests = guests.filter(status=int(guest_status))
+            except ValueError:
+                raise serializers.ValidationError('status must be an integer')
+        return guests.values(*guest_rows.columns)
+
+    def fetch(self):
+        request = self.context['request']
+        pagination = KeysetPagination(request, ('id',))
+        if streaming_enabled(request, pagination):
+            return RowStream(self.guests().order_by('id'), guest_rows.many)
+        return pagination.wrap(guest_rows.many(pagination.paginate(self.guests())))
 
 
 class AddExpenditureSerializer(serializers.Serializer):
@@ -258,7 +634,9 @@ class AddExpenditureSerializer(serializers.Serializer):
 
     def validate(self, data):
         id = data.get('id')
-        if not Event.objects.filter(id=id).exists():
+        self.creator_id = Event.objects.filter(id=id).values_list(
+            'creator_id', flat=True).first()
+        if self.creator_id is None:
             raise ValidationError(
                 'Event with this id does not exist', status.HTTP_404_NOT_FOUND)
         return data
@@ -270,19 +648,208 @@ class AddExpenditureSerializer(serializers.Serializer):
         quantity = self.validated_data.get('quantity')
         unitPrice = self.validated_data.get('unitPrice')
 
-        event = Event.objects.get(id=id)
-
-        expenditure = Expenditure.objects.create(
-            name=name,
-            organization=organization,
-            quantity=quantity,
-            unitPrice=unitPrice,
-            event=event
-        )
-        expenditure.save()
+        with transaction.atomic():
+            expenditure = Expenditure.objects.create(
+                name=name,
+                organization=organization,
+                quantity=quantity,
+                unitPrice=unitPrice,
+                event_id=id
+            )
+            adjust_total_expenditure(id, quantity * unitPrice)
+            record_changes(Change.Kind.EXPENDITURE, [
+                (expenditure.id, id, self.creator_id, None)])
         return expenditure
 
 
+def adjust_total_expenditure(event_id, amount):
+    # Also bumps updatedAt so deletes change the event's version.
+    Event.objects.filter(id=event_id).update(
+        totalExpenditure=F('totalExpenditure') + amount,
+        updatedAt=timezone.now())
+
+
+class ExpenditureRowSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=100)
+    organization = serializers.CharField(max_length=100)
+    quantity = serializers.IntegerField(default=0)
+    unitPrice = serializers.IntegerField(default=0)
+
+
+class BatchExpenditureSerializer(serializers.Serializer):
+    """
+    Imports many expenditure rows at once from a JSON array or a CSV upload
+    with a header row. Either every row is created or none is.
+    """
+    max_rows = 1000
+
+    def __init__(self, *args, **kwargs):
+        self.event_id = kwargs.pop('event_id')
+        super().__init__(*args, **kwargs)
+
+    @classmethod
+    def parse_csv(cls, upload):
+        try:
+            text = io.TextIOWrapper(upload.file, encoding='utf-8-sig')
+            return list(csv.DictReader(text))
+        except (UnicodeDecodeError, csv.Error):
+            raise serializers.ValidationError('File is not a valid UTF-8 CSV')
+
+    def to_internal_value(self, data):
+        try:
+            return self.parse_rows(data)
+        except serializers.ValidationError as exc:
+            # is_valid() expects a dict of errors from to_internal_value.
+            raise serializers.ValidationError(serializers.as_serializer_error(exc))
+
+    def parse_rows(self, data):
+        if isinstance(data, Mapping) and 'file' in data:
+            data = self.parse_csv(data['file'])
+        if not isinstance(data, list):
+            raise serializers.ValidationError(
+                'Expected a list of expenditures or a CSV file')
+        if not data or len(data) > self.max_rows:
+            raise serializers.ValidationError(
+                f'Between 1 and {self.max_rows} expenditures are accepted')
+
+        rows = ExpenditureRowSerializer(data=data, many=True)
+        if not rows.is_valid():
+            raise serializers.ValidationError({'rows': {
+                index: errors for index, errors in enumerate(rows.errors) if errors
+            }})
+        return {'rows': rows.validated_data}
+
+    def validate(self, data):
+        access = get_event_access(self.context['request'], self.event_id)
+        if not access or not access.is_creator:
+            raise ValidationError(
+                'User not permitted to modify expenditure of this event',
+                status.HTTP_403_FORBIDDEN)
+        return data
+
+    def save(self):
+        expenditures = [
+            Expenditure(event_id=self.event_id, **row)
+            for row in self.validated_data.get('rows')
+        ]
+        # validate() only lets the creator through.
+        creator_id = self.context['request'].user.pk
+        with transaction.atomic():
+            Expenditure.objects.bulk_create(expenditures)
+            adjust_total_expenditure(self.event_id, sum(
+                expenditure.quantity * expenditure.unitPrice
+                for expenditure in expenditures))
+            record_changes(Change.Kind.EXPENDITURE, [
+                (expenditure.id, self.event_id, creator_id, None)
+                for expenditure in expenditures
+            ])
+        return expenditures
+
+
+class BatchDeleteExpenditureSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=1000)
+
+    def __init__(self, *args, **kwargs):
+        self.event_id = kwargs.pop('event_id')
+        super().__init__(*args, **kwargs)
+
+    def delete(self):
+        user = self.context['request'].user
+        expenditures = Expenditure.objects.filter(
+            event__id=self.event_id, event__creator=user,
+            id__in=self.validated_data.get('ids'))
+        with transaction.atomic():
+            rows = list(expenditures.values_list('id', 'quantity', 'unitPrice'))
+            deleted, _ = Expenditure.objects.filter(
+                id__in=[id for id, _, _ in rows]).delete()
+            adjust_total_expenditure(
+                self.event_id, -sum(quantity * unitPrice for _, quantity, unitPrice in rows))
+            record_changes(Change.Kind.EXPENDITURE, [
+                (id, self.event_id, user.pk, None) for id, _, _ in rows
+            ], deleted=True)
+        return deleted
+
+
+class ExpenditureSummarySerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    cached = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        access = get_event_access(self.context['request'], data.get('id'))
+        if not access or not access.is_creator:
+            raise ValidationError(
+                'User not permitted to view expenditure of this event',
+                status.HTTP_403_FORBIDDEN)
+        return data
+
+    def fetch(self):
+        event = get_event_access(
+            self.context['request'], self.validated_data.get('id')).event
+        if self.validated_data.get('cached'):
+            return {'total': event.totalExpenditure}
+
+        organizations = list(Expenditure.objects.filter(event=event).values(
+            'organization').annotate(
+                total=Sum(F('quantity') * F('unitPrice')),
+                items=Count('id')).order_by('organization'))
+        return {
+            'total': sum(row['total'] for row in organizations),
+            'items': sum(row['items'] for row in organizations),
+            'organizations': organizations,
+        }
+
+
+class ExportSerializer(serializers.Serializer):
+    """
+    Guest list or expenditure export of one event (`id`) or of every event
+    of the requesting user, streamed as CSV or NDJSON.
+    """
+    CSV = 'csv'
+    NDJSON = 'ndjson'
+
+    id = serializers.IntegerField(required=False)
+    format = serializers.ChoiceField(choices=[CSV, NDJSON])
+
+    def validate(self, data):
+        id = data.get('id')
+        if id is not None:
+            access = get_event_access(self.context['request'], id)
+            if not access:
+                raise ValidationError(
+                    'Event with this id does not exist', status.HTTP_404_NOT_FOUND)
+            if not access.is_creator:
+                raise ValidationError(
+                    'User not permitted to export this event', status.HTTP_403_FORBIDDEN)
+        return data
+
+    def filter(self, queryset):
+        queryset = queryset.filter(event__creator=self.context['request'].user)
+        id = self.validated_data.get('id')
+        if id is not None:
+            queryset = queryset.filter(event_id=id)
+        return queryset.order_by('event_id', 'id')
+
+    def guests(self):
+        return self.filter(People.objects.all()).values(*guest_export_rows.columns)
+
+    def expenditures(self):
+        return self.filter(Expenditure.objects.all()).annotate(
+            total=F('quantity') * F('unitPrice')).values(*expenditure_export_rows.columns)
+
+    def stream(self, export):
+        queryset, rows = {
+            'guests': (self.guests, guest_export_rows),
+            'expenditures': (self.expenditures, expenditure_export_rows),
+        }[export]
+        if self.validated_data['format'] == self.CSV:
+            return CSVStream(queryset(), rows.many, rows.keys)
+        return NDJSONStream(queryset(), rows.many)
+
+    def filename(self, export):
+        return f'{export}-{self.validated_data.get("id", "all")}.{self.validated_data["format"]}'
+
+
 class ExpenditureSerializer(serializers.ModelSerializer):
     class Meta:
         model = Expenditure
@@ -0,0 +1,133 @@
+import threading
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from .cache import invalidate_users
+from .models import Change, Event, People, Usage
+from .pubsub import publish
+from .sync import append_changes, changes_of, record_changes, status_changes
+
+# (invitation id, invitee) of events currently being deleted on this thread.
+# Their cascade deleted invitations are counted down and logged in one query
+# each by event_deleted instead of one query per invitation.
+_deleting = threading.local()
+
+
+def _deleting_events():
+    if not hasattr(_deleting, 'events'):
+        _deleting.events = {}
+    return _deleting.events
+
+
+def adjust_usage(user_ids, field, delta):
+    """
+    Adds `delta` to the `field` counter of every user in `user_ids`. Missing
+    rows are only created for increments, a decrement for a user without a
+    row (or one being deleted) is a no-op. Does nothing unless
+    EVENT_USAGE_COUNTERS is on.
+    """
+    if not settings.EVENT_USAGE_COUNTERS:
+        return
+    user_ids = list(user_ids)
+    updated = Usage.objects.filter(user_id__in=user_ids).update(
+        **{field: F(field) + delta})
+    if delta > 0 and updated < len(user_ids):
+        existing = set(Usage.objects.filter(
+            user_id__in=user_ids).values_list('user_id', flat=True))
+        Usage.objects.bulk_create([
+            Usage(user_id=user_id, **{field: delta})
+            for user_id in user_ids if user_id not in existing
+        ], ignore_conflicts=True)
+
+
+def invalidate_responses(user_ids):
+    """
+    Invalidates the users' cached responses now and again once the current
+    transaction commits, so a read racing the commit cannot re-cache stale data.
+    """
+    user_ids = list(user_ids)
+    invalidate_users(user_ids)
+    transaction.on_commit(lambda: invalidate_users(user_ids))
+
+
+def invitation_creator(invitation):
+    if People.event.is_cached(invitation):
+        return invitation.event.creator_id
+    return Event.objects.filter(
+        id=invitation.event_id).values_list('creator_id', flat=True).first()
+
+
+def publish_invitation(invitation, type, creator_id):
+    # The invitee and the event creator both see invitation changes.
+    publish(
+        [invitation.user_id, creator_id], type, event=invitation.event_id,
+        invitation=invitation.pk, status=invitation.status)
+
+
+@receiver(post_save, sender=Event)
+def event_created(sender, instance, created, **kwargs):
+    invitees = [] if created else list(People.objects.filter(
+        event_id=instance.pk).values_list('user_id', flat=True))
+    record_changes(
+        Change.Kind.EVENT, [(instance.pk, instance.pk, instance.creator_id, None)],
+        readers=invitees)
+    if created:
+        adjust_usage([instance.creator_id], 'created', 1)
+        invalidate_responses([instance.creator_id])
+    else:
+        invalidate_responses([instance.creator_id, *invitees])
+        publish([instance.creator_id, *invitees], 'event.updated', event=instance.pk)
+
+
+@receiver(pre_delete, sender=Event)
+def event_deleting(sender, instance, **kwargs):
+    _deleting_events()[instance.pk] = list(People.objects.filter(
+        event_id=instance.pk).values_list('id', 'user_id'))
+
+
+@receiver(post_delete, sender=Event)
+def event_deleted(sender, instance, **kwargs):
+    invitations = _deleting_events().pop(instance.pk, [])
+    invitees = [user_id for _, user_id in invitations]
+    # Expenditures go with the event's tombstone. Each invitation gets its
+    # own, which is how invitees learn of the delete.
+    append_changes(changes_of(
+        Change.Kind.EVENT, [(instance.pk, instance.pk, instance.creator_id, None)],
+        deleted=True) + changes_of(Change.Kind.INVITATION, [
+            (invitation_id, instance.pk, instance.creator_id, user_id)
+            for invitation_id, user_id in invitations
+        ], deleted=True))
+    if invitees:
+        adjust_usage(invitees, 'invited', -1)
+    adjust_usage([instance.creator_id], 'created', -1)
+    invalidate_responses([instance.creator_id, *invitees])
+    publish([instance.creator_id, *invitees], 'event.deleted', event=instance.pk)
+
+
+@receiver(post_save, sender=People)
+def invitation_created(sender, instance, created, update_fields=None, **kwargs):
+    creator_id = invitation_creator(instance)
+    if not created and update_fields and 'status' in update_fields:
+        append_changes(status_changes([
+            (instance.pk, instance.event_id, instance.user_id, creator_id, instance.status)]))
+    else:
+        record_changes(Change.Kind.INVITATION, [
+            (instance.pk, instance.event_id, creator_id, instance.user_id)])
+    if created:
+        adjust_usage([instance.user_id], 'invited', 1)
+    invalidate_responses([instance.user_id])
+    publish_invitation(
+        instance, 'invitation.created' if created else 'invitation.status', creator_id)
+
+
+@receiver(post_delete, sender=People)
+def invitation_deleted(sender, instance, **kwargs):
+    if instance.event_id not in _deleting_events():
+        creator_id = invitation_creator(instance)
+        record_changes(Change.Kind.INVITATION, [
+            (instance.pk, instance.event_id, creator_id, instance.user_id)], deleted=True)
+        adjust_usage([instance.user_id], 'invited', -1)
+        invalidate_responses([instance.user_id])
+        publish_invitation(instance, 'invitation.removed', creator_id)
@@ -0,0 +1,167 @@
+import re
+import json
+import asyncio
+from urllib.parse import parse_qs, urlsplit
+from asgiref.sync import sync_to_async
+from corsheaders.defaults import default_headers, default_methods
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
+from authentication.authentication import CachedTokenAuthentication
+from .pubsub import get_broker
+
+STREAM_PATH = '/event/stream/'
+KEEPALIVE_SECONDS = 15
+
+
+def get_token(scope):
+    for name, value in scope.get('headers', []):
+        if name == b'authorization':
+            keyword, _, token = value.decode('latin-1').partition(' ')
+            if keyword.lower() == 'token' and token:
+                return token
+    # EventSource cannot send headers, browsers pass the token in the URL.
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    return query.get('token', [None])[0]
+
+
+def cors_setting(name, old_name, default):
+    return getattr(settings, name, getattr(settings, old_name, default))
+
+
+def origin_allowed(origin):
+    if cors_setting('CORS_ALLOW_ALL_ORIGINS', 'CORS_ORIGIN_ALLOW_ALL', False):
+        return True
+    url = urlsplit(origin)
+    for allowed in cors_setting('CORS_ALLOWED_ORIGINS', 'CORS_ORIGIN_WHITELIST', ()):
+        allowed = urlsplit(allowed)
+        if (allowed.scheme, allowed.netloc) == (url.scheme, url.netloc):
+            return True
+    return any(re.match(pattern, origin) for pattern in cors_setting(
+        'CORS_ALLOWED_ORIGIN_REGEXES', 'CORS_ORIGIN_REGEX_WHITELIST', ()))
+
+
+def cors_headers(scope):
+    """
+    The CORS headers django-cors-headers adds to API responses, built from
+    the same CORS_* settings, since the stream is served before Django's
+    middleware runs. Returns whether the request is a preflight and the
+    headers to send.
+    """
+    headers = {name.decode('latin-1'): value.decode('latin-1')
+               for name, value in scope.get('headers', [])}
+    preflight = (scope['method'] == 'OPTIONS'
+                 and 'access-control-request-method' in headers)
+    cors = [(b'vary', b'origin')]
+    origin = headers.get('origin')
+    if not origin or not origin_allowed(origin):
+        return preflight, cors
+
+    credentials = getattr(settings, 'CORS_ALLOW_CREDENTIALS', False)
+    allow_all = cors_setting('CORS_ALLOW_ALL_ORIGINS', 'CORS_ORIGIN_ALLOW_ALL', False)
+    cors.append((b'access-control-allow-origin',
+                 b'*' if allow_all and not credentials else origin.encode('latin-1')))
+    if credentials:
+        cors.append((b'access-control-allow-credentials', b'true'))
+    expose = getattr(settings, 'CORS_EXPOSE_HEADERS', ())
+    if expose:
+        cors.append((b'access-control-expose-headers', ', '.join(expose).encode()))
+    if scope['method'] == 'OPTIONS':
+        cors.append((b'access-control-allow-headers', ', '.join(
+            getattr(settings, 'CORS_ALLOW_HEADERS', default_headers)).encode()))
+        cors.append((b'access-control-allow-methods', ', '.join(
+            getattr(settings, 'CORS_ALLOW_METHODS', default_methods)).encode()))
+        max_age = getattr(settings, 'CORS_PREFLIGHT_MAX_AGE', 86400)
+        if max_age:
+            cors.append((b'access-control-max-age', str(max_age).encode()))
+    return preflight, cors
+
+
+@sync_to_async
+def authenticate_token(token):
+    try:
+        user, _ = CachedTokenAuthentication().authenticate_credentials(token)
+    except AuthenticationFailed:
+        return None
+    return user.pk
+
+
+def format_event(message):
+    return (f'event: {message["type"]}\n'
+            f'data: {json.dumps(message, separators=(",", ":"))}\n\n').encode('utf-8')
+
+
+class EventStream:
+    """
+    ASGI middleware serving Server-Sent Events on STREAM_PATH and passing
+    every other request through to the Django application. Each connection
+    receives the invitation, RSVP and event changes published for its user.
+    """
+
+    def __init__(self, app, broker=None, authenticate=authenticate_token,
+                 keepalive=KEEPALIVE_SECONDS):
+        self.app = app
+        self.broker = broker
+        self.authenticate = authenticate
+        self.keepalive = keepalive
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == STREAM_PATH:
+            await self.stream(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+    async def respond(self, send, status, body, headers=()):
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'application/json'), *headers]})
+        await send({'type': 'http.response.body', 'body': json.dumps(body).encode()})
+
+    async def stream(self, scope, receive, send):
+        preflight, cors = cors_headers(scope)
+        if preflight:
+            await send({'type': 'http.response.start', 'status': 200,
+                        'headers': [(b'content-length', b'0'), *cors]})
+            return await send({'type': 'http.response.body', 'body': b''})
+        if scope['method'] != 'GET':
+            return await self.respond(send, 405, {'error': 'Method not allowed'}, cors)
+        token = get_token(scope)
+        user_id = await self.authenticate(token) if token else None
+        if user_id is None:
+            return await self.respond(
+                send, 401, {'error': 'Authentication credentials were not provided.'}, cors)
+
+        broker = self.broker or get_broker()
+        subscription = broker.subscribe(user_id)
+        disconnected = asyncio.ensure_future(self.wait_for_disconnect(receive))
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+                *cors,
+            ]})
+            await send({'type': 'http.response.body', 'body': b': connected\n\n',
+                        'more_body': True})
+            while not disconnected.done():
+                message = asyncio.ensure_future(subscription.get())
+                await asyncio.wait(
+                    [message, disconnected], timeout=self.keepalive,
+                    return_when=asyncio.FIRST_COMPLETED)
+                if message.done():
+                    body = format_event(message.result())
+                else:
+                    message.cancel()
+                    if disconnected.done():
+                        break
+                    body = b': keepalive\n\n'
+                await send({'type': 'http.response.body', 'body': body,
+                            'more_body': True})
+        finally:
+            broker.unsubscribe(subscription)
+            disconnected.cancel()
+
+    @staticmethod
+    async def wait_for_disconnect(receive):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
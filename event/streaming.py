@@ -0,0 +1,125 @@
+import io
+import csv
+from itertools import islice
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+from utils.renderers import FastJSONRenderer
+
+
+def can_stream(request):
+    """
+    Django 4.0's ASGI handler iterates streaming bodies on the event loop,
+    where the ORM cannot run, so only WSGI requests are streamed.
+    """
+    return 'wsgi.input' in request.META
+
+
+def streaming_enabled(request, pagination=None):
+    """
+    Unpaginated lists are streamed when EVENT_STREAMING_RESPONSES is on.
+    Paginated pages are small already.
+    """
+    return (settings.EVENT_STREAMING_RESPONSES
+            and can_stream(request)
+            and (pagination is None or not pagination.enabled))
+
+
+class RowStream:
+    """
+    A JSON list rendered while the rows are read from a server-side cursor,
+    `chunk_size` rows at a time, so memory does not grow with the list.
+    `serialize` turns a list of values() rows into response dicts. The body
+    is byte-identical to rendering the whole list at once.
+    """
+    content_type = 'application/json'
+
+    def __init__(self, queryset, serialize, chunk_size=None):
+        # Resolve the database now, the body is produced after the request's
+        # routing state is gone.
+        self.queryset = queryset.using(queryset.db)
+        self.serialize = serialize
+        self.chunk_size = chunk_size or settings.EVENT_STREAMING_CHUNK_SIZE
+
+    def chunks(self):
+        rows = self.queryset.iterator(chunk_size=self.chunk_size)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                return
+            yield self.serialize(chunk)
+
+    def __iter__(self):
+        render = FastJSONRenderer().render
+        separator = b''
+        yield b'['
+        for chunk in self.chunks():
+            yield separator + render(chunk)[1:-1]
+            separator = b','
+        yield b']'
+
+    def response(self, filename=None, buffered=False):
+        if buffered:
+            response = HttpResponse(b''.join(self), content_type=self.content_type)
+        else:
+            response = StreamingHttpResponse(self, content_type=self.content_type)
+        if filename:
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class NDJSONStream(RowStream):
+    """
+    One JSON object per line.
+    """
+    content_type = 'application/x-ndjson'
+
+    def __iter__(self):
+        render = FastJSONRenderer().render
+        for chunk in self.chunks():
+            yield b''.join(render(row) + b'\n' for row in chunk)
+
+
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def escape_formula(value):
+    """
+    Spreadsheets run text cells starting with FORMULA_PREFIXES as formulas,
+    a leading quote makes them show the text instead.
+    """
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class CSVStream(RowStream):
+    """
+    CSV with a header row made of the keys of `columns`. Text that would be
+    read as a formula is escaped.
+    """
+    content_type = 'text/csv; charset=utf-8'
+
+    def __init__(self, queryset, serialize, columns, chunk_size=None):
+        super().__init__(queryset, serialize, chunk_size)
+        self.columns = columns
+
+    def __iter__(self):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, self.columns)
+        writer.writeheader()
+        for chunk in self.chunks():
+            writer.writerows({key: escape_formula(value) for key, value in row.items()}
+                             for row in chunk)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+
+
+def list_response(data):
+    if isinstance(data, RowStream):
+        return data.response()
+    return Response(data=data, status=status.HTTP_200_OK)
@@ -0,0 +1,89 @@
+from django.db import connections, router, transaction
+from .models import Change
+
+# First key of the PostgreSQL advisory locks serializing appends to the
+# Change log, the second is derived from a user id.
+SEQUENCE_LOCK = 0x65766164
+
+
+def lock_sequence(connection, user_ids):
+    """
+    Makes the transactions appending entries that `user_ids` can see commit
+    in sequence order. PostgreSQL hands out ids at insert time, a
+    transaction holding a lower id could commit after one holding a higher
+    id, and a client syncing in between would skip the change for good.
+
+    One transaction-level advisory lock per user holds back later appenders
+    whose entries the same user sees until the current one commits, so a
+    user's cursor is safe while appends for unrelated users run side by
+    side. The locks are taken in a fixed order; a transaction appending
+    again for other users can still deadlock with another, which PostgreSQL
+    detects and rolls back. SQLite runs a single write transaction at a
+    time anyway.
+    """
+    keys = sorted({user_id for user_id in user_ids if user_id})
+    if connection.vendor == 'postgresql' and keys:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_advisory_xact_lock(%s, hashtext(keys.key)) '
+                'FROM (SELECT unnest(%s::text[]) AS key ORDER BY 1) AS keys',
+                [SEQUENCE_LOCK, keys])
+
+
+def changes_of(kind, changes, deleted=False):
+    """
+    Unsaved Change rows. `changes` are (object id, event id, creator id,
+    invitee id) tuples, the invitee id is only set for invitations.
+    """
+    return [
+        Change(kind=kind, objectId=object_id, eventId=event_id,
+               creatorId=creator_id, userId=user_id or '', deleted=deleted)
+        for object_id, event_id, creator_id, user_id in changes
+    ]
+
+
+def status_changes(changes):
+    """
+    Unsaved Change rows of RSVP changes, which /event/invitation/changes/
+    serves as well. `changes` are (invitation id, event id, invitee id,
+    creator id, status) tuples.
+    """
+    return [
+        Change(kind=Change.Kind.INVITATION, objectId=invitation_id, eventId=event_id,
+               creatorId=creator_id, userId=user_id, status=status)
+        for invitation_id, event_id, user_id, creator_id, status in changes
+    ]
+
+
+def append_changes(rows, readers=()):
+    """
+    Appends Change rows to the log in one insert. `readers` are the users
+    who see the rows besides their creator and invitee, the invitees of an
+    updated event.
+    """
+    if not rows:
+        return
+    using = router.db_for_write(Change)
+    with transaction.atomic(using=using, savepoint=False):
+        lock_sequence(connections[using], [
+            *readers, *(user_id for row in rows for user_id in (row.creatorId, row.userId))])
+        Change.objects.using(using).bulk_create(rows)
+
+
+def record_changes(kind, changes, deleted=False, readers=()):
+    """
+    Appends changes of one kind to the log, see changes_of and append_changes.
+    """
+    append_changes(changes_of(kind, changes, deleted), readers)
+
+
+def cursor_expired(model, since):
+    """
+    Whether changes after `since` may have been pruned from the log of
+    `model`. prune_changes keeps the newest of the rows it prunes, so a
+    cursor is good as long as it is not below the oldest row left.
+    """
+    if not since:
+        return False
+    oldest = model.objects.order_by('id').values_list('id', flat=True).first()
+    return oldest is not None and since < oldest
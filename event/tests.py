@@ -1,3 +1,1430 @@
-from django.test import TestCase
+import io
+import csv
+import json
+import asyncio
+import logging
+import threading
+from unittest import mock
+from datetime import timedelta
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from asgiref.sync import async_to_sync, sync_to_async
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from utils.db import database_config
+from utils.db import router as db_router
+from utils.db.pool import ConnectionPool, PoolTimeout
+from utils.db.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+from utils import metrics
+from utils.errorlog import ErrorLog, RateLimiter, error_log, records_dropped
+from utils.exception_handler import custom_exception_handler, rate_limiter
+from utils.renderers import FastJSONRenderer
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from . import async_views, views
+from . import pubsub
+from .cache import get_cache
+from .models import Change, Event, People, Expenditure, Usage
+from .pagination import encode_cursor
+from .pubsub import InProcessBroker
+from .rows import event_rows, expenditure_rows
+from .serializers import EventSerializer, ExpenditureSerializer
+from .signals import adjust_usage
+from .stream import EventStream
 
 # Create your tests here.
+
+User = get_user_model()
+
+
+# The suite requests the 4xx paths on purpose, their INFO records would
+# flood its output.
+@override_settings(METRICS_QUERY_BUDGET_ACTION='raise', ERROR_LOG_LEVEL='ERROR')
+class EventTestCase(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.creator = self.make_user('creator')
+        self.guest = self.make_user('guest')
+        self.client = APIClient()
+        self.client.force_authenticate(self.guest)
+
+    def make_user(self, uid):
+        return User.objects.create(
+            uid=uid, username=uid, email=f'{uid}@example.com', name=uid.title())
+
+    def make_event(self, creator=None, days=1, **kwargs):
+        return Event.objects.create(
+            name=kwargs.pop('name', 'Party'), description='', venue='Home',
+            time=timezone.now() + timedelta(days=days), duration=3600,
+            creator=creator or self.creator, **kwargs)
+
+    def invite(self, event, user=None, status=0):
+        return People.objects.create(
+            event=event, user=user or self.guest, status=status)
+
+
+class InvitedEventsTests(EventTestCase):
+    def test_constant_query_count(self):
+        for count in (1, 25):
+            People.objects.all().delete()
+            for day in range(count):
+                self.invite(self.make_event(days=day + 1))
+            # version aggregate + the joined listing query
+            with self.assertNumQueries(2):
+                response = self.client.get('/event/fetch/invited')
+            self.assertEqual(len(response.data), count)
+
+    def test_payload_matches_event_serializer(self):
+        event = self.make_event()
+        self.invite(event, status=1)
+        response = self.client.get('/event/fetch/invited')
+        expected = dict(EventSerializer(event).data)
+        expected['status'] = 1
+        expected['invitedBy'] = 'Creator : creator@example.com'
+        self.assertEqual(response.data, [expected])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/event/fetch/invited/{event.id}/')
+        self.assertEqual(response.data, expected)
+
+    def test_cursor_pagination(self):
+        events = [self.make_event(days=day + 1) for day in range(5)]
+        for event in events:
+            self.invite(event)
+
+        seen = []
+        response = self.client.get('/event/fetch/invited', {'limit': 2})
+        while True:
+            seen += [event['id'] for event in response.data['results']]
+            if response.data['next'] is None:
+                break
+            response = self.client.get(
+                '/event/fetch/invited',
+                {'limit': 2, 'cursor': response.data['next']})
+        self.assertEqual(seen, [event.id for event in events])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/event/fetch/invited', {'cursor': 'nope'})
+        self.assertEqual(response.status_code, 400)
+        for values in (['x', 1], ['2020-01-01T00:00:00Z', 'abc'], [None, 1]):
+            cursor = encode_cursor(values)
+            self.assertEqual(self.client.get(
+                '/event/fetch/invited', {'cursor': cursor}).status_code, 400)
+            self.assertEqual(self.client.get(
+                '/event/fetch/', {'cursor': cursor}).status_code, 400)
+
+
+class GuestListTests(EventTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = self.make_event()
+        self.invite(self.event)
+
+    def test_constant_query_count(self):
+        for count in (1, 30):
+            for index in range(count):
+                self.invite(self.event, self.make_user(f'extra-{count}-{index}'))
+            # access check, version aggregate, guest listing
+            with self.assertNumQueries(3):
+                response = self.client.get(f'/event/fetch/{self.event.id}/guests/')
+            self.assertEqual(response.status_code, 200)
+
+    def test_permissions(self):
+        outsider = APIClient()
+        outsider.force_authenticate(self.make_user('outsider'))
+        response = outsider.get(f'/event/fetch/{self.event.id}/guests/')
+        self.assertEqual(response.status_code, 403)
+        response = outsider.get('/event/fetch/999/guests/')
+        self.assertEqual(response.status_code, 404)
+
+        creator = APIClient()
+        creator.force_authenticate(self.creator)
+        response = creator.get(f'/event/fetch/{self.event.id}/guests/')
+        self.assertEqual(response.data, [{
+            'id': self.event.people_set.get().id, 'status': 0,
+            'name': 'Guest', 'email': 'guest@example.com'}])
+
+    def test_status_filter_and_pagination(self):
+        accepted = [self.invite(self.event, self.make_user(f'yes-{index}'), status=1)
+                    for index in range(3)]
+        response = self.client.get(
+            f'/event/fetch/{self.event.id}/guests/', {'status': 1, 'limit': 2})
+        self.assertEqual(
+            [guest['id'] for guest in response.data['results']],
+            [guest.id for guest in accepted[:2]])
+        response = self.client.get(
+            f'/event/fetch/{self.event.id}/guests/',
+            {'status': 1, 'limit': 2, 'cursor': response.data['next']})
+        self.assertEqual(response.data['results'][0]['id'], accepted[2].id)
+        self.assertIsNone(response.data['next'])
+
+
+class BulkInvitationTests(EventTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = self.make_event()
+        self.client.force_authenticate(self.creator)
+
+    def test_bulk_invite(self):
+        self.invite(self.event)
+        others = [self.make_user(f'other-{index}') for index in range(3)]
+        emails = ['guest@example.com', 'nobody@example.com'] + [
+            user.email for user in others] + ['other-0@example.com']
+
+        # event, users, existing invitations, then inside a savepoint the
+        # insert, the new invitation ids and their sync log entries
+        with self.assertNumQueries(8):
+            response = self.client.post(
+                f'/event/invite/{self.event.id}/bulk/', {'emails': emails},
+                format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result['result'] for result in response.data],
+            ['already_invited', 'unknown_user', 'created', 'created', 'created'])
+        self.assertEqual(self.event.people_set.count(), 4)
+
+    def test_unknown_event(self):
+        response = self.client.post(
+            '/event/invite/999/bulk/', {'emails': ['guest@example.com']},
+            format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_creator_only(self):
+        self.client.force_authenticate(self.guest)
+        response = self.client.post(
+            f'/event/invite/{self.event.id}/bulk/', {'emails': ['creator@example.com']},
+            format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(self.event.people_set.exists())
+
+
+class InvitationTests(EventTestCase):
+    def test_duplicate_invitation_is_rejected_by_database(self):
+        event = self.make_event()
+        self.client.force_authenticate(self.creator)
+        # user, event, then in a savepoint the insert and its sync log entry
+        with self.assertNumQueries(6):
+            response = self.client.post(
+                f'/event/invite/{event.id}/', {'email': 'guest@example.com'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(
+            f'/event/invite/{event.id}/', {'email': 'guest@example.com'}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(event.people_set.count(), 1)
+
+
+class InvitationStatusTests(EventTestCase):
+    def setUp(self):
+        super().setUp()
+        self.events = [self.make_event(name=f'Party {index}') for index in range(4)]
+        for event in self.events[:3]:
+            self.invite(event)
+
+    def test_single_update(self):
+        event = self.events[0]
+        url = f'/event/invitation/status/{event.id}/'
+        self.assertEqual(self.client.post(url, {'status': 1}, format='json').status_code, 200)
+        self.assertEqual(self.client.post(url, {'status': 1}, format='json').status_code, 200)
+        self.assertEqual(self.client.post(url, {'status': 7}, format='json').status_code, 400)
+        response = self.client.post(
+            f'/event/invitation/status/{self.events[3].id}/', {'status': 1}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+        self.assertEqual(People.objects.get(event=event).status, People.Status.ACCEPTED)
+        self.assertEqual(list(Change.objects.filter(status__isnull=False).values_list(
+            'eventId', 'userId', 'creatorId', 'status')),
+            [(event.id, self.guest.pk, self.creator.pk, 1)])
+
+    def test_batch_update(self):
+        first, second, third, uninvited = self.events
+        updates = [
+            {'event': first.id, 'status': 1},
+            {'event': second.id, 'status': 2},
+            {'event': first.id, 'status': 2},
+            {'event': third.id, 'status': 0},
+            {'event': uninvited.id, 'status': 1},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    '/event/invitation/status/batch/', {'updates': updates}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [
+            {'event': first.id, 'status': 2, 'result': 'updated'},
+            {'event': second.id, 'status': 2, 'result': 'updated'},
+            {'event': third.id, 'status': 0, 'result': 'unchanged'},
+            {'event': uninvited.id, 'status': 1, 'result': 'not_invited'},
+        ])
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(dict(People.objects.values_list('event_id', 'status')), {
+            first.id: 2, second.id: 2, third.id: 0})
+        # One log entry per RSVP change, shared by the sync feed.
+        self.assertEqual(Change.objects.filter(kind=Change.Kind.INVITATION).count(), 3 + 2)
+        self.assertEqual(list(Change.objects.filter(status__isnull=False).order_by(
+            'id').values_list('eventId', 'status')), [(first.id, 2), (second.id, 2)])
+
+        response = self.client.post(
+            '/event/invitation/status/batch/',
+            {'updates': [{'event': first.id, 'status': 5}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_changes_feed(self):
+        self.client.post('/event/invitation/status/batch/', {'updates': [
+            {'event': event.id, 'status': 1} for event in self.events[:3]]}, format='json')
+
+        response = self.client.get('/event/invitation/changes/', {'limit': 2})
+        self.assertEqual([change['event'] for change in response.data['changes']],
+                         [event.id for event in self.events[:2]])
+        self.assertTrue(response.data['more'])
+        response = self.client.get(
+            '/event/invitation/changes/', {'since': response.data['next']})
+        self.assertEqual(len(response.data['changes']), 1)
+        self.assertFalse(response.data['more'])
+        self.assertEqual(self.client.get(
+            '/event/invitation/changes/', {'since': response.data['next']}).data,
+            {'changes': [], 'next': response.data['next'], 'more': False})
+
+        self.client.force_authenticate(self.creator)
+        changes = self.client.get('/event/invitation/changes/').data['changes']
+        self.assertEqual(len(changes), 3)
+        self.assertEqual(changes[0]['user'], self.guest.pk)
+        self.client.force_authenticate(self.make_user('stranger'))
+        self.assertEqual(self.client.get('/event/invitation/changes/').data['changes'], [])
+
+
+class SyncTests(EventTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = self.make_event()
+        self.invitation = self.invite(self.event)
+        self.client.force_authenticate(self.creator)
+        self.client.post(f'/event/expenditure/{self.event.id}/batch/', [
+            {'name': f'Item {index}', 'organization': 'Vendor', 'unitPrice': 5}
+            for index in range(2)], format='json')
+        self.expenditures = list(self.event.expenditure_set.order_by('id'))
+
+    def sync(self, since=0, **params):
+        response = self.client.get('/event/sync/', {'since': since, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_snapshot(self):
+        data = self.sync()
+        self.assertEqual(data['cursor'], Change.objects.latest('id').id)
+        self.assertEqual(data['events'], event_rows.many(
+            Event.objects.values(*event_rows.columns)))
+        self.assertEqual([guest['id'] for guest in data['guests']], [self.invitation.id])
+        self.assertEqual(data['guests'][0]['event'], self.event.id)
+        self.assertEqual([row['id'] for row in data['expenditures']],
+                         [expenditure.id for expenditure in self.expenditures])
+        self.assertEqual(data['invited'], [])
+
+        self.client.force_authenticate(self.guest)
+        invited = self.sync()['invited']
+        self.assertEqual([event['id'] for event in invited], [self.event.id])
+        self.assertEqual(invited[0]['invitedBy'], 'Creator : creator@example.com')
+
+    def test_warm_client_gets_only_the_delta(self):
+        cursor = self.sync()['cursor']
+        with self.assertNumQueries(2):
+            data = self.sync(cursor)
+        self.assertEqual(data['cursor'], cursor)
+        self.assertEqual(data['events'] + data['guests'] + data['expenditures'], [])
+
+        self.client.put(f'/event/update/{self.event.id}/', {
+            'time': '2999-01-01T10:00:00.000Z', 'name': 'Renamed',
+            'description': '', 'venue': 'Park'}, format='json')
+        self.client.put(f'/event/update/{self.event.id}/', {
+            'time': '2999-01-01T10:00:00.000Z', 'name': 'Renamed again',
+            'description': '', 'venue': 'Park'}, format='json')
+        data = self.sync(cursor)
+        self.assertEqual([event['name'] for event in data['events']], ['Renamed again'])
+        self.assertEqual(data['guests'] + data['expenditures'], [])
+        self.assertGreater(data['cursor'], cursor)
+
+        self.client.force_authenticate(self.guest)
+        invited = self.sync(cursor)['invited']
+        self.assertEqual([event['name'] for event in invited], ['Renamed again'])
+
+    def test_tombstones(self):
+        cursor = self.sync()['cursor']
+        self.client.delete(f'/event/expenditure/{self.expenditures[0].id}/')
+        self.client.delete(f'/event/invitation/remove/{self.invitation.id}/')
+        data = self.sync(cursor)
+        self.assertEqual(data['deleted'], {
+            'events': [], 'invited': [], 'guests': [self.invitation.id],
+            'expenditures': [self.expenditures[0].id]})
+
+        self.client.force_authenticate(self.guest)
+        self.assertEqual(self.sync(cursor)['deleted']['invited'], [self.event.id])
+
+        invitation = self.invite(self.event)
+        self.client.force_authenticate(self.creator)
+        self.client.delete(f'/event/delete/{self.event.id}/')
+        data = self.sync(cursor)
+        self.assertEqual(data['deleted']['events'], [self.event.id])
+        self.assertEqual(data['deleted']['guests'], [self.invitation.id, invitation.id])
+        self.client.force_authenticate(self.guest)
+        self.assertEqual(self.sync(cursor)['deleted']['invited'], [self.event.id])
+
+    def test_limit_and_visibility(self):
+        ids = list(Change.objects.order_by('id').values_list('id', flat=True))
+        data = self.sync(ids[0], limit=1)
+        self.assertTrue(data['more'])
+        self.assertEqual(data['cursor'], ids[1])
+
+        self.client.force_authenticate(self.make_user('stranger'))
+        data = self.sync(ids[0])
+        self.assertEqual(data['events'] + data['invited'] + data['guests'], [])
+        self.assertEqual(data['deleted'], {
+            'events': [], 'invited': [], 'guests': [], 'expenditures': []})
+
+    def test_appends_lock_the_users_who_see_them(self):
+        with mock.patch('event.sync.lock_sequence') as lock:
+            self.client.put(f'/event/update/{self.event.id}/', {
+                'time': '2999-01-01T10:00:00.000Z', 'name': 'Renamed',
+                'description': '', 'venue': 'Park'}, format='json')
+            self.client.delete(f'/event/expenditure/{self.expenditures[0].id}/')
+        self.assertEqual([sorted(set(call.args[1]) - {''}) for call in lock.call_args_list], [
+            sorted([self.creator.pk, self.guest.pk]), [self.creator.pk]])
+
+    def test_pruned_cursor(self):
+        first = Change.objects.order_by('id').values_list('id', flat=True)[0]
+        cursor = self.sync()['cursor']
+        Change.objects.update(createdAt=timezone.now() - timedelta(days=31))
+        self.client.put(f'/event/update/{self.event.id}/', {
+            'time': '2999-01-01T10:00:00.000Z', 'name': 'Renamed',
+            'description': '', 'venue': 'Park'}, format='json')
+        call_command('prune_changes', stdout=io.StringIO())
+        self.assertEqual(Change.objects.count(), 2)
+        self.assertEqual(self.sync(cursor)['events'][0]['name'], 'Renamed')
+        self.assertEqual(self.client.get('/event/sync/', {'since': first}).status_code, 410)
+
+
+class FetchEventsTests(EventTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.creator)
+        self.past = self.make_event(days=-3, name='Past')
+        self.upcoming = [self.make_event(days=day, name=f'Upcoming {day}')
+                         for day in range(1, 5)]
+
+    def test_unpaginated_list(self):
+        response = self.client.get('/event/fetch/')
+        self.assertEqual(
+            [event['id'] for event in response.data],
+            [self.past.id] + [event.id for event in self.upcoming])
+        self.assertEqual(response.data[0], EventSerializer(self.past).data)
+
+    def test_scope_and_range_filters(self):
+        response = self.client.get('/event/fetch/', {'scope': 'past'})
+        self.assertEqual([event['id'] for event in response.data], [self.past.id])
+        response = self.client.get('/event/fetch/', {
+            'start': self.upcoming[1].time.isoformat(),
+            'end': self.upcoming[3].time.isoformat()})
+        self.assertEqual(
+            [event['id'] for event in response.data],
+            [event.id for event in self.upcoming[1:3]])
+
+    def test_sparse_fields_and_pagination(self):
+        response = self.client.get('/event/fetch/', {
+            'scope': 'upcoming', 'fields': 'id,name', 'limit': 3})
+        self.assertEqual(response.data['results'][0], {
+            'id': self.upcoming[0].id, 'name': 'Upcoming 1'})
+        response = self.client.get('/event/fetch/', {
+            'scope': 'upcoming', 'fields': 'id,name', 'limit': 3,
+            'cursor': response.data['next']})
+        self.assertEqual(
+            response.data, {'results': [{'id': self.upcoming[3].id,
+                                         'name': 'Upcoming 4'}], 'next': None})
+
+    def test_unknown_field(self):
+        response = self.client.get('/event/fetch/', {'fields': 'id,creator'})
+        self.assertEqual(response.status_code, 400)
+
+
+class EventAccessQueryTests(EventTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = self.make_event()
+        self.invitation = self.invite(self.event)
+        self.expenditure = Expenditure.objects.create(
+            name='Cake', organization='Bakery', quantity=2, unitPrice=10,
+            event=self.event)
+        self.client.force_authenticate(self.creator)
+
+    def test_fetch_event(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/event/fetch/{self.event.id}/')
+        self.assertEqual(response.data, EventSerializer(self.event).data)
+
+    def test_update_event(self):
+        # lookup, then in a savepoint UPDATE and sync log entry, invitee ids
+        # for cache invalidation
+        with self.assertNumQueries(6):
+            response = self.client.put(f'/event/update/{self.event.id}/', {
+                'time': '2999-01-01T10:00:00.000Z', 'name': 'Renamed',
+                'description': '', 'venue': 'Park'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Event.objects.get(id=self.event.id).name, 'Renamed')
+
+    def test_delete_event(self):
+        # lookup, invitee ids, the collector's People select, DELETEs of
+        # Expenditure, People and Event, one insert of the event's and the
+        # invitations' sync tombstones
+        with self.assertNumQueries(7):
+            response = self.client.delete(f'/event/delete/{self.event.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Event.objects.exists())
+
+    def test_non_creator_is_forbidden(self):
+        self.client.force_authenticate(self.guest)
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/event/fetch/{self.event.id}/')
+        self.assertEqual(response.status_code, 400)
+        with self.assertNumQueries(1):
+            response = self.client.delete(f'/event/delete/{self.event.id}/')
+        self.assertEqual(response.status_code, 400)
+
+    def test_remove_guest(self):
+        # lookup, then in a savepoint DELETE, sync tombstone and event bump
+        with self.assertNumQueries(6):
+            response = self.client.delete(
+                f'/event/invitation/remove/{self.invitation.id}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_expenditures(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/event/expenditure/{self.event.id}/')
+        self.assertEqual(len(response.data), 1)
+        # lookup, then DELETE, total UPDATE and sync tombstone inside a
+        # savepoint
+        with self.assertNumQueries(6):
+            response = self.client.delete(
+                f'/event/expenditure/{self.expenditure.id}/')
+        self.assertEqual(response.status_code, 200)
+
+
+class ExpenditureSummaryTests(EventTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = self.make_event()
+        self.client.force_authenticate(self.creator)
+
+    def add(self, **data):
+        return self.client.post(
+            f'/event/expenditure/{self.event.id}/', data, format='json')
+
+    def test_summary_and_cached_total(self):
+        self.add(name='Cake', organization='Bakery', quantity=2, unitPrice=10)
+        self.add(name='Bread', organization='Bakery', quantity=1, unitPrice=5)
+        response = self.add(
+            name='Chairs', organization='Rentals', quantity=10, unitPrice=3)
+
+        with self.assertNumQueries(2):
+            summary = self.client.get(
+                f'/event/expenditure/{self.event.id}/summary/').data
+        self.assertEqual(summary, {
+            'total': 55, 'items': 3, 'organizations': [
+                {'organization': 'Bakery', 'total': 25, 'items': 2},
+                {'organization': 'Rentals', 'total': 30, 'items': 1},
+            ]})
+
+        self.client.delete(f'/event/expenditure/{response.data["id"]}/')
+        with self.assertNumQueries(1):
+            cached = self.client.get(
+                f'/event/expenditure/{self.event.id}/summary/', {'cached': 'true'})
+        self.assertEqual(cached.data, {'total': 25})
+
+    def test_summary_is_creator_only(self):
+        self.client.force_authenticate(self.guest)
+        response = self.client.get(f'/event/expenditure/{self.event.id}/summary/')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(
+            response.data, {'error': 'User not permitted to view expenditure of this event'})
+
+    def test_summary_rejects_bad_params(self):
+        response = self.client.get(
+            f'/event/expenditure/{self.event.id}/summary/', {'cached': 'maybe'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cached', response.data)
+
+
+class BatchExpenditureTests(EventTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = self.make_event()
+        self.client.force_authenticate(self.creator)
+        self.url = f'/event/expenditure/{self.event.id}/batch/'
+
+    def test_json_import(self):
+        rows = [{'name': f'Item {index}', 'organization': 'Vendor',
+                 'quantity': 2, 'unitPrice': index} for index in range(50)]
+        response = self.client.post(self.url, rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 50)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.totalExpenditure, 2 * sum(range(50)))
+
+    def test_csv_import(self):
+        upload = SimpleUploadedFile('quote.csv', (
+            b'name,organization,quantity,unitPrice\n'
+            b'Tent,Rentals,1,300\nLights,Rentals,4,25\n'), content_type='text/csv')
+        response = self.client.post(self.url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.event.expenditure_set.count(), 2)
+
+    def test_invalid_rows_are_reported_and_nothing_is_created(self):
+        rows = [{'name': 'Ok', 'organization': 'Vendor', 'unitPrice': 1},
+                {'name': 'Bad', 'organization': 'Vendor', 'unitPrice': 'x'}]
+        response = self.client.post(self.url, rows, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.data['rows']), [1])
+        self.assertFalse(self.event.expenditure_set.exists())
+        for body in (5, 'file', {'name': 'Ok'}):
+            response = self.client.post(self.url, body, format='json')
+            self.assertEqual(response.status_code, 400)
+
+    def test_import_is_creator_only(self):
+        self.client.force_authenticate(self.guest)
+        response = self.client.post(self.url, [
+            {'name': 'Ok', 'organization': 'Vendor', 'unitPrice': 1}], format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_batch_delete(self):
+        expenditures = [Expenditure.objects.create(
+            name='Item', organization='Vendor', quantity=1, unitPrice=10,
+            event=self.event) for _ in range(3)]
+        Event.objects.filter(id=self.event.id).update(totalExpenditure=30)
+        other = Expenditure.objects.create(
+            name='Other', organization='Vendor', quantity=1, unitPrice=10,
+            event=self.make_event(creator=self.guest))
+
+        ids = [expenditure.id for expenditure in expenditures[:2]] + [other.id]
+        response = self.client.delete(self.url, {'ids': ids}, format='json')
+        self.assertEqual(response.data, {'deleted': 2})
+        self.assertTrue(Expenditure.objects.filter(id=other.id).exists())
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.totalExpenditure, 10)
+
+
+class UsageTests(EventTestCase):
+    def test_counters_off_by_default(self):
+        with self.assertNumQueries(0):
+            adjust_usage([self.creator.pk], 'created', 1)
+        self.invite(self.make_event())
+        self.assertFalse(Usage.objects.exists())
+
+    def test_single_query(self):
+        for day in range(3):
+            self.invite(self.make_event(days=day + 1))
+        self.make_event(creator=self.guest)
+        with self.assertNumQueries(1):
+            response = self.client.get('/event/usage/')
+        self.assertEqual(response.data, {'created': 1, 'invited': 3})
+
+        self.client.force_authenticate(self.make_user('fresh'))
+        self.assertEqual(
+            self.client.get('/event/usage/').data, {'created': 0, 'invited': 0})
+
+    @override_settings(EVENT_USAGE_COUNTERS=True)
+    def test_counters_follow_writes(self):
+        event = self.make_event()
+        self.invite(event)
+        self.assertEqual(Usage.objects.get(user=self.creator).created, 1)
+        self.assertEqual(Usage.objects.get(user=self.guest).invited, 1)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/event/usage/')
+        self.assertEqual(response.data, {'created': 0, 'invited': 1})
+
+        event.delete()
+        usage = Usage.objects.get(user=self.guest)
+        self.assertEqual((usage.invited, Usage.objects.get(user=self.creator).created), (0, 0))
+
+    @override_settings(EVENT_USAGE_COUNTERS=True)
+    def test_reconcile_repairs_drift(self):
+        self.invite(self.make_event())
+        Usage.objects.filter(user=self.guest).update(invited=42)
+        Usage.objects.filter(user=self.creator).delete()
+        out = io.StringIO()
+        call_command('reconcile_usage', stdout=out)
+        self.assertIn('Repaired 1 drifted and 1 missing', out.getvalue())
+        self.assertEqual(Usage.objects.get(user=self.guest).invited, 1)
+        self.assertEqual(Usage.objects.get(user=self.creator).created, 1)
+
+
+class ConditionalRequestTests(EventTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = self.make_event()
+        self.invitation = self.invite(self.event)
+        self.creator_client = APIClient()
+        self.creator_client.force_authenticate(self.creator)
+
+    def assertRevalidates(self, client, url, change):
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        # one version query, or none when served from the response cache
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertLessEqual(len(queries), 1)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        change()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_invited_events(self):
+        def change():
+            self.invitation.status = 1
+            self.invitation.save()
+        self.assertRevalidates(self.client, '/event/fetch/invited', change)
+
+    def test_event_list(self):
+        self.assertRevalidates(
+            self.creator_client, '/event/fetch/', lambda: self.make_event())
+
+    def test_event_detail(self):
+        def change():
+            self.event.name = 'Renamed'
+            self.event.save()
+        self.assertRevalidates(
+            self.creator_client, f'/event/fetch/{self.event.id}/', change)
+
+    def test_only_details_are_dated(self):
+        response = self.creator_client.get(f'/event/fetch/{self.event.id}/')
+        self.assertTrue(response.has_header('Last-Modified'))
+        self.assertEqual(self.creator_client.get(
+            f'/event/fetch/{self.event.id}/',
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        url = f'/event/fetch/{self.event.id}/guests/'
+        response = self.creator_client.get(url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.creator_client.delete(f'/event/invitation/remove/{self.invitation.id}/')
+        response = self.creator_client.get(
+            url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2999 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+    def test_guest_removal_changes_version(self):
+        url = f'/event/fetch/{self.event.id}/guests/'
+        etag = self.creator_client.get(url)['ETag']
+        self.creator_client.delete(f'/event/invitation/remove/{self.invitation.id}/')
+        response = self.creator_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [])
+
+    def test_expenditures(self):
+        url = f'/event/expenditure/{self.event.id}/'
+        response = self.creator_client.get(url)
+        with self.assertNumQueries(2):
+            response = self.creator_client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+class ResponseCacheTests(EventTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = self.make_event()
+        self.invitation = self.invite(self.event)
+        self.creator_client = APIClient()
+        self.creator_client.force_authenticate(self.creator)
+
+    def test_reads_are_cached_per_user(self):
+        for url in ('/event/fetch/invited', '/event/usage/'):
+            first = self.client.get(url)
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(second.data, first.data)
+
+        etag = self.client.get('/event/fetch/invited')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/event/fetch/invited', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.creator_client.get('/event/usage/').data,
+                         {'created': 1, 'invited': 0})
+
+    def test_query_string_is_part_of_the_key(self):
+        self.creator_client.get('/event/fetch/')
+        response = self.creator_client.get('/event/fetch/', {'fields': 'id'})
+        self.assertEqual(response.data, [{'id': self.event.id}])
+
+    def test_event_update_invalidates_invitees(self):
+        self.client.get('/event/fetch/invited')
+        self.creator_client.put(f'/event/update/{self.event.id}/', {
+            'time': '2999-01-01T10:00:00.000Z', 'name': 'Renamed',
+            'description': '', 'venue': 'Park'}, format='json')
+        response = self.client.get('/event/fetch/invited')
+        self.assertEqual(response.data[0]['name'], 'Renamed')
+
+    def test_rsvp_and_invite_invalidate(self):
+        self.client.get('/event/fetch/invited')
+        self.client.post(
+            f'/event/invitation/status/{self.event.id}/', {'status': 1}, format='json')
+        self.assertEqual(self.client.get('/event/fetch/invited').data[0]['status'], 1)
+
+        self.client.get('/event/usage/')
+        self.creator_client.post(
+            f'/event/invite/{self.make_event().id}/bulk/',
+            {'emails': ['guest@example.com']}, format='json')
+        self.assertEqual(self.client.get('/event/usage/').data['invited'], 2)
+
+    def test_event_delete_invalidates(self):
+        self.creator_client.get('/event/fetch/')
+        self.client.get('/event/fetch/invited')
+        self.creator_client.delete(f'/event/delete/{self.event.id}/')
+        self.assertEqual(self.creator_client.get('/event/fetch/').data, [])
+        self.assertEqual(self.client.get('/event/fetch/invited').data, [])
+
+
+class AsyncViewTests(EventTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = self.make_event()
+        self.invite(self.event)
+        self.invite(self.event, user=self.make_user('other'), status=1)
+        self.factory = APIRequestFactory()
+
+    def call(self, view, user, path, **kwargs):
+        get_cache().clear()
+        request = self.factory.get(path)
+        force_authenticate(request, user=user)
+        handler = view.as_view()
+        if asyncio.iscoroutinefunction(handler):
+            handler = async_to_sync(handler)
+        return handler(request, **kwargs).render()
+
+    def test_async_views_match_sync_views(self):
+        cases = [
+            (views.FetchEventsView, async_views.AsyncFetchEventsView,
+             self.creator, '/event/fetch/?limit=1', {}),
+            (views.FetchInvitedEventsView, async_views.AsyncFetchInvitedEventsView,
+             self.guest, '/event/fetch/invited', {}),
+            (views.FetchGuestsView, async_views.AsyncFetchGuestsView,
+             self.creator, f'/event/fetch/{self.event.id}/guests/', {'pk': self.event.id}),
+            (views.FetchGuestsView, async_views.AsyncFetchGuestsView,
+             self.guest, f'/event/fetch/{self.event.id}/guests/', {'pk': self.event.id}),
+            (views.UsageView, async_views.AsyncUsageView, self.guest, '/event/usage/', {}),
+        ]
+        for sync_view, async_view, user, path, kwargs in cases:
+            with self.subTest(path=path, user=user.uid):
+                expected = self.call(sync_view, user, path, **kwargs)
+                response = self.call(async_view, user, path, **kwargs)
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.content, expected.content)
+                self.assertEqual(response.get('ETag'), expected.get('ETag'))
+
+    def test_async_view_is_a_coroutine_function(self):
+        self.assertTrue(asyncio.iscoroutinefunction(async_views.AsyncUsageView.as_view()))
+
+    def test_unauthenticated_request_is_rejected(self):
+        request = self.factory.get('/event/usage/')
+        response = async_to_sync(async_views.AsyncUsageView.as_view())(request)
+        self.assertEqual(response.status_code, 401)
+
+    def test_async_and_sync_views_share_the_cache(self):
+        request = self.factory.get('/event/usage/')
+        force_authenticate(request, user=self.guest)
+        views.UsageView.as_view()(request)
+        request = self.factory.get('/event/usage/')
+        force_authenticate(request, user=self.guest)
+        with self.assertNumQueries(0):
+            response = async_to_sync(async_views.AsyncUsageView.as_view())(request)
+        self.assertEqual(response.data, {'created': 0, 'invited': 1})
+
+
+class DatabaseConfigTests(TestCase):
+    def test_sqlite_is_the_default(self):
+        config = database_config(settings.BASE_DIR, environ={})
+        self.assertEqual(config['ENGINE'], 'utils.db.sqlite3')
+        self.assertEqual(config['OPTIONS'], {'timeout': 20})
+        self.assertNotIn('PRAGMAS', config)
+        config = database_config(settings.BASE_DIR, environ={'SQLITE_WAL': '1'})
+        self.assertEqual(config['PRAGMAS'], {'journal_mode': 'WAL', 'synchronous': 'NORMAL'})
+
+    def test_postgresql_url(self):
+        url = 'postgres://user:secret@db:5432/evader'
+        config = database_config(settings.BASE_DIR, environ={'DATABASE_URL': url})
+        self.assertEqual(config['ENGINE'], 'django.db.backends.postgresql_psycopg2')
+        self.assertEqual(config['CONN_MAX_AGE'], 600)
+
+        config = database_config(settings.BASE_DIR, environ={
+            'DATABASE_URL': url, 'DATABASE_POOL_SIZE': '8'})
+        self.assertEqual(config['ENGINE'], 'utils.db.postgresql')
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        self.assertEqual(config['POOL'], {'MIN_SIZE': 0, 'MAX_SIZE': 8, 'TIMEOUT': 30})
+
+    def test_sqlite_pragmas(self):
+        wrapper = SQLiteDatabaseWrapper(
+            dict(connection.settings_dict, NAME=':memory:', PRAGMAS={'synchronous': 'OFF'}),
+            alias='pragmas')
+        sqlite = wrapper.get_new_connection(wrapper.get_connection_params())
+        self.addCleanup(sqlite.close)
+        self.assertEqual(sqlite.execute('PRAGMA synchronous').fetchone()[0], 0)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+
+    def test_health(self):
+        response = APIClient().get('/health/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'ok': True})
+
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(APIClient().get(
+                '/health/', HTTP_AUTHORIZATION='Bearer wrong').data, {'ok': True})
+            response = APIClient().get('/health/', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertTrue(response.data['databases']['default']['ok'])
+        self.assertEqual(response.data['databases']['default']['vendor'], 'sqlite')
+
+
+class ReplicaRoutingTests(EventTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = self.make_event()
+        self.invite(self.event)
+        self.reads = []
+        route = db_router.ReplicaRouter.db_for_read
+
+        def db_for_read(router, model, **hints):
+            alias = route(router, model, **hints)
+            self.reads.append(alias)
+            return alias
+
+        # The test database has no replica, the primary stands in for it.
+        patches = [
+            mock.patch.object(db_router, 'replica_alias', lambda: 'default'),
+            mock.patch.object(db_router.ReplicaRouter, 'db_for_read', db_for_read),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def used_replica(self, response):
+        self.assertEqual(response.status_code, 200)
+        used, self.reads = 'default' in self.reads, []
+        return used
+
+    def test_read_endpoints_use_the_replica(self):
+        self.assertTrue(self.used_replica(self.client.get('/event/fetch/invited')))
+        self.assertTrue(self.used_replica(self.client.get('/event/usage/')))
+        creator = APIClient()
+        creator.force_authenticate(self.creator)
+        self.assertTrue(self.used_replica(
+            creator.get(f'/event/fetch/{self.event.id}/guests/')))
+        self.assertTrue(self.used_replica(creator.get(f'/event/expenditure/{self.event.id}/')))
+
+    def test_writer_is_pinned_to_the_primary(self):
+        bystander = APIClient()
+        bystander.force_authenticate(self.make_user('bystander'))
+        response = self.client.post(
+            f'/event/invitation/status/{self.event.id}/', {'status': 1}, format='json')
+        self.assertFalse(self.used_replica(response))
+        self.assertTrue(db_router.is_pinned(self.guest.pk))
+
+        self.assertFalse(self.used_replica(self.client.get('/event/fetch/invited')))
+        self.assertTrue(self.used_replica(bystander.get('/event/usage/')))
+
+    def test_invalidated_users_are_pinned(self):
+        creator = APIClient()
+        creator.force_authenticate(self.creator)
+        creator.put(f'/event/update/{self.event.id}/', {
+            'time': '2999-01-01T10:00:00.000Z', 'name': 'Renamed',
+            'description': '', 'venue': 'Park'}, format='json')
+        self.assertTrue(db_router.is_pinned(self.guest.pk))
+
+    def test_async_middleware_pins_the_writer(self):
+        async def get_response(request):
+            await sync_to_async(db_router.ReplicaRouter().db_for_write)(Event)
+            return HttpResponse()
+
+        middleware = db_router.ReplicaRoutingMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        request = RequestFactory().post('/')
+        request.user = self.guest
+        async_to_sync(middleware)(request)
+        self.assertTrue(db_router.is_pinned(self.guest.pk))
+
+    def test_writes_go_to_the_primary(self):
+        self.event._state.db = 'replica'
+        router = db_router.ReplicaRouter()
+        self.assertEqual(router.db_for_write(Event, instance=self.event), 'default')
+
+
+class FakeConnection:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def test_reuses_and_bounds_connections(self):
+        pool = ConnectionPool(FakeConnection, max_size=2, timeout=0)
+        first, second = pool.getconn(), pool.getconn()
+        self.assertEqual(pool.stats()['utilization'], 1.0)
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+
+        pool.putconn(first)
+        self.assertIs(pool.getconn(), first)
+        pool.putconn(second, discard=True)
+        self.assertTrue(second.closed)
+        self.assertEqual(pool.stats(), {
+            'max_size': 2, 'size': 1, 'in_use': 1, 'idle': 0,
+            'waiting': 0, 'timeouts': 1, 'utilization': 0.5})
+
+    def test_waiting_checkout_gets_returned_connection(self):
+        pool = ConnectionPool(FakeConnection, max_size=1, timeout=5)
+        held = pool.getconn()
+        threading.Timer(0.05, pool.putconn, [held]).start()
+        self.assertIs(pool.getconn(), held)
+
+
+class RowSerializerTests(SimpleTestCase):
+    text = 'Caf\u00e9 "quoted" \\ \u2028\u2029 \x1f\t\n \U0001f389 </script>'
+
+    def assertSameBytes(self, data, fast_data):
+        self.assertEqual(FastJSONRenderer().render(fast_data), JSONRenderer().render(data))
+
+    def test_events_match_event_serializer(self):
+        now = timezone.now()
+        events = [
+            Event(id=1, name=self.text, description='', venue=self.text,
+                  time=now, fireId='f', duration=60),
+            Event(id=2, name='Plain', description='d', venue='v',
+                  time=now.replace(microsecond=0), fireId='', duration=0),
+        ]
+        rows = [{column: getattr(event, column) for column in event_rows.columns}
+                for event in events]
+        self.assertSameBytes(
+            EventSerializer(events, many=True).data, event_rows.many(rows))
+        fields = ['time', 'name']
+        self.assertSameBytes(
+            [{key: value for key, value in data.items() if key in fields}
+             for data in EventSerializer(events, many=True).data],
+            event_rows.only(fields).many(rows))
+
+    def test_expenditures_match_expenditure_serializer(self):
+        expenditures = [Expenditure(
+            id=1, name=self.text, organization='', quantity=3, unitPrice=2 ** 40)]
+        rows = [{column: getattr(expenditure, column)
+                 for column in expenditure_rows.columns}
+                for expenditure in expenditures]
+        self.assertSameBytes(
+            ExpenditureSerializer(expenditures, many=True).data,
+            expenditure_rows.many(rows))
+
+    def test_renderer_falls_back_for_unsupported_values(self):
+        data = {'time': timezone.now(), 'big': 2 ** 70, 'text': self.text}
+        self.assertSameBytes(data, data)
+
+
+class StreamingResponseTests(EventTestCase):
+    def setUp(self):
+        super().setUp()
+        self.creator_client = APIClient()
+        self.creator_client.force_authenticate(self.creator)
+        for day in range(5):
+            event = self.make_event(days=day + 1, name=f'Party \u2028 {day}')
+            self.invite(event)
+        self.event = event
+        for index in range(5):
+            self.invite(event, user=self.make_user(f'guest{index}'))
+            Expenditure.objects.create(
+                event=event, name=f'Item {index}', organization='Shop',
+                quantity=index, unitPrice=10)
+
+    def test_streamed_lists_match_buffered_lists(self):
+        urls = [
+            (self.creator_client, '/event/fetch/'),
+            (self.client, '/event/fetch/invited'),
+            (self.creator_client, f'/event/fetch/{self.event.id}/guests/'),
+            (self.creator_client, f'/event/expenditure/{self.event.id}/'),
+        ]
+        for client, url in urls:
+            with self.subTest(url=url):
+                get_cache().clear()
+                buffered = client.get(url)
+                get_cache().clear()
+                with self.settings(EVENT_STREAMING_RESPONSES=True,
+                                   EVENT_STREAMING_CHUNK_SIZE=2):
+                    streamed = client.get(url)
+                self.assertTrue(streamed.streaming)
+                self.assertEqual(b''.join(streamed.streaming_content), buffered.content)
+                self.assertEqual(streamed['ETag'], buffered['ETag'])
+
+    def test_pages_and_empty_lists(self):
+        with self.settings(EVENT_STREAMING_RESPONSES=True):
+            response = self.creator_client.get('/event/fetch/', {'limit': 2})
+            self.assertFalse(response.streaming)
+            self.assertEqual(len(response.data['results']), 2)
+
+            self.client.force_authenticate(self.make_user('loner'))
+            response = self.client.get('/event/fetch/')
+            self.assertEqual(b''.join(response.streaming_content), b'[]')
+
+    def test_streamed_responses_are_not_cached(self):
+        with self.settings(EVENT_STREAMING_RESPONSES=True):
+            self.client.get('/event/fetch/invited')
+            with self.assertNumQueries(2):
+                response = self.client.get('/event/fetch/invited')
+                body = b''.join(response.streaming_content)
+            self.assertEqual(len(json.loads(body)), 5)
+
+
+class ExportTests(EventTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.creator)
+        self.event = self.make_event(name='Party, "big"')
+        self.other = self.make_event(days=2, name='Dinner')
+        self.invite(self.event, status=1)
+        self.invite(self.other, user=self.make_user('friend'))
+        self.expenditure = Expenditure.objects.create(
+            event=self.event, name='Cake', organization='Bakery', quantity=2, unitPrice=15)
+        self.invite(self.make_event(creator=self.guest, name='Not mine'), user=self.creator)
+
+    def body(self, response):
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_csv_of_one_event(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                f'/event/export/{self.event.id}/guests.csv', HTTP_ACCEPT='text/csv')
+            body = self.body(response)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn(f'guests-{self.event.id}.csv', response['Content-Disposition'])
+        lines = body.splitlines()
+        self.assertEqual(lines[0], 'event,eventName,eventTime,id,name,email,status')
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith(f'{self.event.id},"Party, ""big""",'))
+        self.assertTrue(lines[1].endswith(',Guest,guest@example.com,1'))
+
+    def test_ndjson_of_all_events(self):
+        with self.settings(EVENT_STREAMING_CHUNK_SIZE=1), self.assertNumQueries(1):
+            body = self.body(self.client.get('/event/export/guests.ndjson'))
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['email'] for row in rows],
+                         ['guest@example.com', 'friend@example.com'])
+
+        body = self.body(self.client.get('/event/export/expenditures.ndjson'))
+        self.assertEqual(json.loads(body), {
+            'event': self.event.id, 'eventName': 'Party, "big"', 'id': self.expenditure.id,
+            'name': 'Cake', 'organization': 'Bakery', 'quantity': 2,
+            'unitPrice': 15, 'total': 30})
+
+    def test_empty_export_has_header(self):
+        response = self.client.get(f'/event/export/{self.other.id}/expenditures.csv')
+        self.assertEqual(self.body(response),
+                         'event,eventName,id,name,organization,quantity,unitPrice,total\r\n')
+
+    def test_csv_escapes_formulas(self):
+        Expenditure.objects.create(
+            event=self.other, name='=HYPERLINK("http://x")', organization='@SUM(A1)',
+            quantity=-1, unitPrice=5)
+        response = self.client.get(f'/event/export/{self.other.id}/expenditures.csv')
+        row = self.body(response).splitlines()[1]
+        self.assertIn(',"\'=HYPERLINK(""http://x"")",\'@SUM(A1),-1,5,-5', row)
+
+        response = self.client.get(f'/event/export/{self.other.id}/expenditures.ndjson')
+        self.assertEqual(json.loads(self.body(response))['name'], '=HYPERLINK("http://x")')
+
+        Expenditure.objects.create(
+            event=self.other, name='\t=1+1', organization='\r@SUM(A1)',
+            quantity=1, unitPrice=1)
+        response = self.client.get(f'/event/export/{self.other.id}/expenditures.csv')
+        row = list(csv.reader(io.StringIO(self.body(response))))[2]
+        self.assertEqual(row[3:5], ["'\t=1+1", "'\r@SUM(A1)"])
+
+    def test_errors(self):
+        self.assertEqual(self.client.get('/event/export/guests.xml').status_code, 400)
+        self.assertEqual(self.client.get('/event/export/999/guests.csv').status_code, 404)
+        self.client.force_authenticate(self.guest)
+        self.assertEqual(
+            self.client.get(f'/event/export/{self.event.id}/guests.csv').status_code, 403)
+
+
+class MetricsTests(EventTestCase):
+    labels = ('event:fetch-invited-events', 'GET')
+
+    def setUp(self):
+        super().setUp()
+        metrics.registry.reset()
+        for day in range(3):
+            self.invite(self.make_event(days=day + 1))
+
+    def test_records_request(self):
+        response = self.client.get('/event/fetch/invited')
+        self.assertEqual(metrics.requests_total.value(self.labels + ('200',)), 1)
+        self.assertEqual(metrics.db_queries.value(self.labels), (2, 1))
+        self.assertEqual(metrics.response_size.value(self.labels), (len(response.content), 1))
+        seconds, count = metrics.serializer_duration.value(self.labels)
+        self.assertEqual(count, 1)
+        self.assertGreater(seconds, 0)
+
+        body = self.client.get('/metrics/').content.decode()
+        self.assertIn('http_requests_total{endpoint="event:fetch-invited-events",'
+                      'method="GET",status="200"} 1\n', body)
+        self.assertIn('db_queries_per_request_bucket{endpoint="event:fetch-invited-events",'
+                      'method="GET",le="2"} 1\n', body)
+        self.assertNotIn('endpoint="metrics"', body)
+
+    def test_records_async_request(self):
+        async def get_response(request):
+            return HttpResponse()
+        self.assertTrue(asyncio.iscoroutinefunction(metrics.MetricsMiddleware(get_response)))
+
+        token = Token.objects.create(user=self.guest)
+
+        async def fetch():
+            return await AsyncClient().get(
+                '/event/fetch/invited', authorization=f'Token {token.key}')
+        response = async_to_sync(fetch)()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(metrics.requests_total.value(self.labels + ('200',)), 1)
+        queries, count = metrics.db_queries.value(self.labels)
+        self.assertEqual(count, 1)
+        self.assertGreaterEqual(queries, 2)
+
+    def test_streamed_response_recorded_after_body(self):
+        with self.settings(EVENT_STREAMING_RESPONSES=True):
+            response = self.client.get('/event/fetch/invited')
+            self.assertEqual(metrics.requests_total.value(self.labels + ('200',)), 0)
+            body = b''.join(response.streaming_content)
+        self.assertEqual(metrics.requests_total.value(self.labels + ('200',)), 1)
+        self.assertEqual(metrics.db_queries.value(self.labels), (2, 1))
+        self.assertEqual(metrics.response_size.value(self.labels), (len(body), 1))
+
+    def test_query_budget(self):
+        budgets = {'event:fetch-invited-events': 1}
+        with self.settings(METRICS_QUERY_BUDGETS=budgets):
+            with self.assertRaises(metrics.QueryBudgetExceeded):
+                self.client.get('/event/fetch/invited')
+            get_cache().clear()
+            with self.settings(METRICS_QUERY_BUDGET_ACTION='log'), \
+                    self.assertLogs('utils.metrics', 'WARNING'):
+                response = self.client.get('/event/fetch/invited')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(metrics.budget_exceeded.value(('event:fetch-invited-events',)), 2)
+
+    def test_metrics_token(self):
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics/').status_code, 401)
+            response = self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+
+@override_settings(ERROR_LOG_LEVEL='INFO')
+class ErrorLogTests(EventTestCase):
+    def setUp(self):
+        super().setUp()
+        rate_limiter.reset()
+
+    def test_rate_limiter(self):
+        now = [0]
+        limiter = RateLimiter(limit=2, window=10, sample=3, clock=lambda: now[0])
+        allowed = [limiter.allow('key') for _ in range(8)]
+        self.assertEqual(allowed, [
+            (True, 0), (True, 0), (False, 0), (False, 0),
+            (True, 2), (False, 0), (False, 0), (True, 2)])
+        self.assertEqual(limiter.allow('other'), (True, 0))
+        limiter.allow('key')
+        now[0] = 10
+        self.assertEqual(limiter.allow('key'), (True, 1))
+
+    def test_logs_handled_error(self):
+        with self.assertLogs('evader.errors', 'INFO') as logs:
+            response = self.client.get(
+                '/event/fetch/', {'fields': 'id,creator'}, HTTP_X_REQUEST_ID='abc-123')
+            error_log.flush()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['X-Request-ID'], 'abc-123')
+        fields = logs.records[0].fields
+        self.assertEqual(fields['request_id'], 'abc-123')
+        self.assertEqual(fields['endpoint'], 'event:fetch-events')
+        self.assertEqual(fields['user_id'], self.guest.pk)
+        self.assertEqual(fields['status'], 400)
+        self.assertEqual(fields['error'], 'ValidationError')
+        self.assertIn('duration_ms', fields)
+
+    def test_duplicate_errors_are_rate_limited(self):
+        with self.assertLogs('evader.errors', 'INFO') as logs:
+            for _ in range(rate_limiter.limit + 5):
+                self.client.get('/event/fetch/', {'fields': 'id,creator'})
+            error_log.flush()
+        self.assertEqual(len(logs.records), rate_limiter.limit)
+
+    def test_unhandled_exception(self):
+        request = Request(APIRequestFactory().get('/event/fetch/'))
+        with self.assertLogs('evader.errors', 'ERROR') as logs:
+            response = custom_exception_handler(KeyError('boom'), {'request': request})
+            error_log.flush()
+        self.assertIsNone(response)
+        self.assertEqual(logs.records[0].fields['status'], 500)
+        self.assertIn("KeyError: 'boom'", logs.output[0])
+
+    def test_unhandled_exception_is_logged_once(self):
+        handler = RecordingHandler()
+        logger = logging.getLogger('django.request')
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        client = APIClient(raise_request_exception=False)
+        client.force_authenticate(self.guest)
+        with mock.patch.object(views.UsageView, 'counts', side_effect=KeyError('boom')):
+            with self.assertLogs('evader.errors', 'ERROR') as logs:
+                response = client.get('/event/usage/')
+                error_log.flush()
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(handler.records, [])
+
+    def test_full_queue_drops_records(self):
+        log = ErrorLog(maxsize=1)
+        # No listener thread, nothing drains the queue.
+        log.listener = mock.Mock()
+        dropped = records_dropped.value()
+        for _ in range(3):
+            log.log(logging.ERROR, 'boom', {})
+        self.assertEqual(log.queue.qsize(), 1)
+        self.assertEqual(records_dropped.value() - dropped, 2)
+
+    @override_settings(ERROR_LOG_LEVEL='ERROR')
+    def test_level_setting(self):
+        with self.assertLogs('evader.errors', 'INFO') as logs:
+            self.client.get('/event/fetch/', {'fields': 'id,creator'})
+            error_log.log(logging.ERROR, 'boom', {})
+            error_log.flush()
+        self.assertEqual([record.getMessage() for record in logs.records], ['boom'])
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class RecordingBroker:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, user_ids, message):
+        self.published.append((sorted(user_ids), message['type']))
+
+
+class EventStreamTests(SimpleTestCase):
+    async def open_stream(self, broker, token='user-1', method='GET', headers=()):
+        async def authenticate(token):
+            return token if token.startswith('user-') else None
+
+        app = EventStream(None, broker=broker, authenticate=authenticate, keepalive=5)
+        self.sent = []
+        self.disconnect = asyncio.Event()
+
+        async def receive():
+            await self.disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            self.sent.append(message)
+
+        return asyncio.ensure_future(app({
+            'type': 'http', 'method': method, 'path': '/event/stream/',
+            'query_string': f'token={token}'.encode(), 'headers': list(headers),
+        }, receive, send))
+
+    async def test_delivers_messages_for_the_user(self):
+        broker = InProcessBroker()
+        client = await self.open_stream(broker)
+        while not broker.subscriber_count():
+            await asyncio.sleep(0)
+        broker.publish(['user-2'], {'type': 'event.updated', 'event': 2})
+        broker.publish(['user-1'], {'type': 'event.updated', 'event': 1})
+        while len(self.sent) < 3:
+            await asyncio.sleep(0.01)
+        self.disconnect.set()
+        await client
+
+        self.assertEqual(self.sent[0]['status'], 200)
+        self.assertEqual(
+            self.sent[2]['body'],
+            b'event: event.updated\ndata: {"type":"event.updated","event":1}\n\n')
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    async def test_rejects_unknown_token(self):
+        await (await self.open_stream(InProcessBroker(), token='bad'))
+        self.assertEqual(self.sent[0]['status'], 401)
+
+    async def test_sends_cors_headers(self):
+        origin = (b'origin', b'https://app.example.com')
+        await (await self.open_stream(InProcessBroker(), token='bad', headers=[origin]))
+        self.assertIn((b'access-control-allow-origin', b'*'), self.sent[0]['headers'])
+
+        broker = InProcessBroker()
+        client = await self.open_stream(broker, headers=[origin])
+        while not self.sent:
+            await asyncio.sleep(0.01)
+        self.disconnect.set()
+        await client
+        self.assertEqual(self.sent[0]['status'], 200)
+        self.assertIn((b'access-control-allow-origin', b'*'), self.sent[0]['headers'])
+
+        await (await self.open_stream(broker, method='OPTIONS', headers=[
+            origin, (b'access-control-request-method', b'GET')]))
+        headers = dict(self.sent[0]['headers'])
+        self.assertEqual(self.sent[0]['status'], 200)
+        self.assertIn(b'authorization', headers[b'access-control-allow-headers'])
+        self.assertIn(b'GET', headers[b'access-control-allow-methods'])
+
+        with self.settings(CORS_ORIGIN_ALLOW_ALL=False,
+                           CORS_ALLOWED_ORIGINS=['https://app.example.com']):
+            await (await self.open_stream(broker, token='bad', headers=[origin]))
+            self.assertIn((b'access-control-allow-origin', b'https://app.example.com'),
+                          self.sent[0]['headers'])
+            await (await self.open_stream(broker, token='bad', headers=[
+                (b'origin', b'https://evil.example.com')]))
+            self.assertEqual(self.sent[0]['headers'][1:], [(b'vary', b'origin')])
+
+
+class PublishTests(EventTestCase):
+    def setUp(self):
+        super().setUp()
+        self.broker = pubsub._broker = RecordingBroker()
+        self.addCleanup(setattr, pubsub, '_broker', None)
+
+    def test_changes_are_published_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            event = self.make_event()
+            invitation = self.invite(event)
+        self.assertEqual(self.broker.published, [
+            (['creator', 'guest'], 'invitation.created')])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invitation.status = 1
+            invitation.save()
+            event.name = 'Renamed'
+            event.save()
+            event.delete()
+        self.assertEqual(self.broker.published[1:], [
+            (['creator', 'guest'], 'invitation.status'),
+            (['creator', 'guest'], 'event.updated'),
+            (['creator', 'guest'], 'event.deleted'),
+        ])
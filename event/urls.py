@@ -1,32 +1,60 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
+    BatchExpenditureView,
+    BatchInvitationStatusView,
+    BulkInvitePeopleView,
     CreateEventView,
     DeleteEventView,
     FetchEventsView,
     FetchEventView,
     GuestView,
+    InvitationChangesView,
     InvitePeopleView,
+    SyncView,
     FetchInvitedEventsView,
     FetchInvitedEventView,
     SetInvitationStatusView,
     FetchGuestsView,
     ExpenditureView,
+    ExpenditureSummaryView,
+    ExportView,
     UpdateEventView,
     UsageView,
 )
 
+if settings.EVENT_ASYNC_VIEWS:
+    from .async_views import (  # noqa: F811
+        AsyncFetchEventsView as FetchEventsView,
+        AsyncFetchGuestsView as FetchGuestsView,
+        AsyncFetchInvitedEventsView as FetchInvitedEventsView,
+        AsyncUsageView as UsageView,
+    )
+
+app_name = 'event'
+
 urlpatterns = [
-    path('create/', CreateEventView.as_view()),
-    path('fetch/', FetchEventsView.as_view()),
-    path('fetch/invited', FetchInvitedEventsView.as_view()),
-    path('fetch/<int:pk>/', FetchEventView.as_view()),
-    path('delete/<int:pk>/', DeleteEventView.as_view()),
-    path('update/<int:pk>/', UpdateEventView.as_view()),
-    path('fetch/<int:pk>/guests/', FetchGuestsView.as_view()),
-    path('fetch/invited/<int:pk>/', FetchInvitedEventView.as_view()),
-    path('invite/<int:pk>/', InvitePeopleView.as_view()),
-    path('invitation/status/<int:pk>/', SetInvitationStatusView.as_view()),
-    path('invitation/remove/<int:pk>/', GuestView.as_view()),
-    path('expenditure/<int:pk>/', ExpenditureView.as_view()),
-    path('usage/', UsageView.as_view())
+    path('create/', CreateEventView.as_view(), name='create'),
+    path('fetch/', FetchEventsView.as_view(), name='fetch-events'),
+    path('fetch/invited', FetchInvitedEventsView.as_view(), name='fetch-invited-events'),
+    path('fetch/<int:pk>/', FetchEventView.as_view(), name='fetch-event'),
+    path('delete/<int:pk>/', DeleteEventView.as_view(), name='delete-event'),
+    path('update/<int:pk>/', UpdateEventView.as_view(), name='update-event'),
+    path('fetch/<int:pk>/guests/', FetchGuestsView.as_view(), name='guests'),
+    path('fetch/invited/<int:pk>/', FetchInvitedEventView.as_view(), name='fetch-invited-event'),
+    path('invite/<int:pk>/', InvitePeopleView.as_view(), name='invite'),
+    path('invite/<int:pk>/bulk/', BulkInvitePeopleView.as_view(), name='invite-bulk'),
+    path('invitation/status/<int:pk>/', SetInvitationStatusView.as_view(), name='invitation-status'),
+    path('invitation/status/batch/', BatchInvitationStatusView.as_view(), name='invitation-status-batch'),
+    path('invitation/changes/', InvitationChangesView.as_view(), name='invitation-changes'),
+    path('invitation/remove/<int:pk>/', GuestView.as_view(), name='invitation-remove'),
+    path('expenditure/<int:pk>/', ExpenditureView.as_view(), name='expenditure'),
+    path('expenditure/<int:pk>/batch/', BatchExpenditureView.as_view(), name='expenditure-batch'),
+    path('expenditure/<int:pk>/summary/', ExpenditureSummaryView.as_view(), name='expenditure-summary'),
+    path('export/guests.<str:fmt>', ExportView.as_view(export='guests'), name='export-guests'),
+    path('export/<int:pk>/guests.<str:fmt>', ExportView.as_view(export='guests'), name='export-event-guests'),
+    path('export/expenditures.<str:fmt>', ExportView.as_view(export='expenditures'), name='export-expenditures'),
+    path('export/<int:pk>/expenditures.<str:fmt>', ExportView.as_view(export='expenditures'), name='export-event-expenditures'),
+    path('sync/', SyncView.as_view(), name='sync'),
+    path('usage/', UsageView.as_view(), name='usage')
 ]
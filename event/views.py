@@ -1,29 +1,56 @@
-from rest_framework import status
+from rest_framework import serializers, status
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from rest_framework.generics import GenericAPIView, RetrieveAPIView
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework import permissions
 from django.contrib.auth import get_user_model
-from .models import Event, Expenditure, People
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Func, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from utils.db.router import ReplicaReadsMixin
+from utils.renderers import FastJSONRenderer
+from .access import get_event_access
+from .cache import cache_response
+from .conditional import Version
+from .models import Change, Event, Expenditure, People, Usage
+from .rows import expenditure_rows
+from .streaming import RowStream, can_stream, list_response, streaming_enabled
+from .sync import record_changes
 from .serializers import (
     AddExpenditureSerializer,
+    BatchDeleteExpenditureSerializer,
+    BatchExpenditureSerializer,
+    BatchInvitationStatusSerializer,
+    BulkInvitationSerializer,
     CreateEventSerializer,
     DeleteEventSerializer,
     EventSerializer,
     ExpenditureSerializer,
+    ExpenditureSummarySerializer,
+    ExportSerializer,
     FetchEventSerializer,
     FetchEventsSerializer,
     GuestsSerializer,
+    InvitationChangesSerializer,
     InvitationSerializer,
     InvitedEventSerializer,
     InvitationStatusSerializer,
-    UpdateEventSerializer
+    SyncSerializer,
+    UpdateEventSerializer,
+    adjust_total_expenditure
 )
 
 from datetime import datetime
 
 # Create your views here.
 
+# Read endpoints whose payloads are built from values() rows, rendered
+# with orjson when available.
+fast_renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
 
 class CreateEventView(GenericAPIView):
     """
@@ -46,18 +73,25 @@ class CreateEventView(GenericAPIView):
         return Response(data=event_dict.data, status=status.HTTP_201_CREATED)
 
 
-class FetchEventsView(RetrieveAPIView):
+class FetchEventsView(ReplicaReadsMixin, RetrieveAPIView):
+    renderer_classes = fast_renderer_classes
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = FetchEventsSerializer
     queryset = Event.objects.all()
 
+    @cache_response('fetch')
     def get(self, request, *args, **kwargs):
-        serializer = self.get_serializer()
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        version = Version.of(request, serializer.events())
+        not_modified = version.not_modified()
+        if not_modified:
+            return not_modified
         events = serializer.fetch()
-        return Response(data=events.data, status=status.HTTP_200_OK)
+        return version.apply(list_response(events))
 
 
-class FetchEventView(RetrieveAPIView):
+class FetchEventView(ReplicaReadsMixin, RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = FetchEventSerializer
     queryset = Event.objects.all()
@@ -66,8 +100,12 @@ class FetchEventView(RetrieveAPIView):
         request.data['id'] = pk
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        version = Version(request, serializer.event.updatedAt)
+        not_modified = version.not_modified()
+        if not_modified:
+            return not_modified
         event = serializer.fetch()
-        return Response(data=event.data, status=status.HTTP_200_OK)
+        return version.apply(Response(data=event.data, status=status.HTTP_200_OK))
 
 
 class DeleteEventView(GenericAPIView):
@@ -107,7 +145,10 @@ class InvitePeopleView(GenericAPIView):
         if not serializer.is_valid():
             error = serializer.errors.get('non_field_errors')[0]
             return Response(data={'error': error}, status=status.HTTP_404_NOT_FOUND)
-        invitation = serializer.save()
+        try:
+            invitation = serializer.save()
+        except serializers.ValidationError as error:
+            return Response(data={'error': error.detail[0]}, status=status.HTTP_409_CONFLICT)
         invitationDict = {
             'id': invitation.id,
             'status': invitation.status,
@@ -117,31 +158,53 @@ class InvitePeopleView(GenericAPIView):
         return Response(data=invitationDict, status=status.HTTP_200_OK)
 
 
-class FetchInvitedEventsView(GenericAPIView):
+class BulkInvitePeopleView(GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    queryset = People.objects.all()
+    serializer_class = BulkInvitationSerializer
+
+    def post(self, request, *args, **kwargs):
+        request.data['id'] = kwargs.get('pk')
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            errors = serializer.errors
+            if 'non_field_errors' in errors:
+                error = errors['non_field_errors'][0]
+                return Response(data={'error': error}, status=int(error.code))
+            return Response(data=errors, status=status.HTTP_400_BAD_REQUEST)
+        results = serializer.save()
+        return Response(data=results, status=status.HTTP_200_OK)
+
+
+class FetchInvitedEventsView(ReplicaReadsMixin, GenericAPIView):
+    renderer_classes = fast_renderer_classes
     permission_classes = [permissions.IsAuthenticated]
     queryset = Event.objects.all()
     serializer_class = InvitedEventSerializer
 
+    @cache_response('fetch-invited')
     def get(self, request, *args, **kwargs):
+        version = Version.of(
+            request, People.objects.filter(user=request.user),
+            field=Greatest('updatedAt', 'event__updatedAt'))
+        not_modified = version.not_modified()
+        if not_modified:
+            return not_modified
         serializer = self.get_serializer()
         invitations = serializer.fetch()
-        return Response(data=invitations, status=status.HTTP_200_OK)
+        return version.apply(list_response(invitations))
 
 
-class FetchInvitedEventView(GenericAPIView):
+class FetchInvitedEventView(ReplicaReadsMixin, GenericAPIView):
+    renderer_classes = fast_renderer_classes
     permission_classes = [permissions.IsAuthenticated]
-    serializer_class = EventSerializer
+    serializer_class = InvitedEventSerializer
     queryset = People.objects.all()
 
     def get(self, request, *args, **kwargs):
-        invitation = People.objects.filter(
-            event__id=kwargs.get('pk'), user=request.user)
-        if invitation:
-            invitation = invitation[0]
-            event = self.get_serializer(invitation.event).data
-            event['status'] = invitation.status
-            event['invitedBy'] = (
-                f'{invitation.event.creator.name} : {invitation.event.creator.email}')
+        serializer = self.get_serializer()
+        event = serializer.fetch_one(kwargs.get('pk'))
+        if event is not None:
             return Response(data=event, status=status.HTTP_200_OK)
         return Response(
             data={'error': 'User is not permitted to view this event'},
@@ -159,12 +222,78 @@ class SetInvitationStatusView(GenericAPIView):
         if serializer.is_valid():
             serializer.save()
             return Response(data={}, status=status.HTTP_200_OK)
+        if 'non_field_errors' not in serializer.errors:
+            return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         return Response(
             data={'error': 'User not permitted to modify this invitation'},
             status=status.HTTP_403_FORBIDDEN)
 
 
-class FetchGuestsView(RetrieveAPIView):
+class BatchInvitationStatusView(GenericAPIView):
+    """
+    post:
+        Sets the user's RSVP status on many events, `updates` is a list of
+        {event, status}. Returns the result of each event: updated,
+        unchanged or not_invited.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = BatchInvitationStatusSerializer
+    queryset = People.objects.all()
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = serializer.save()
+        return Response(data=results, status=status.HTTP_200_OK)
+
+
+class InvitationChangesView(ReplicaReadsMixin, GenericAPIView):
+    """
+    get:
+        RSVP changes of the user's invitations and of their events' guests
+        with a sequence number above `since`, oldest first, at most `limit`.
+        Returns a 410 gone when the changes after `since` were pruned.
+    """
+    renderer_classes = fast_renderer_classes
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = InvitationChangesSerializer
+    queryset = People.objects.all()
+
+    def get(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.query_params)
+        if serializer.is_valid():
+            return Response(data=serializer.fetch(), status=status.HTTP_200_OK)
+        errors = serializer.errors
+        if errors.get('non_field_errors') and errors['non_field_errors'][0].code == 410:
+            return Response(data=errors, status=status.HTTP_410_GONE)
+        return Response(data=errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class SyncView(ReplicaReadsMixin, GenericAPIView):
+    """
+    get:
+        The user's events, invitations, guests and expenditures changed
+        after the cursor `since`, with the ids deleted since. `since=0`
+        returns everything. Returns a 410 gone when the changes after
+        `since` were pruned, the client then syncs again from 0.
+    """
+    renderer_classes = fast_renderer_classes
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = SyncSerializer
+    queryset = Event.objects.all()
+
+    def get(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.query_params)
+        if serializer.is_valid():
+            return Response(data=serializer.fetch(), status=status.HTTP_200_OK)
+        errors = serializer.errors
+        if errors.get('non_field_errors') and errors['non_field_errors'][0].code == 410:
+            return Response(data=errors, status=status.HTTP_410_GONE)
+        return Response(data=errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class FetchGuestsView(ReplicaReadsMixin, RetrieveAPIView):
+    renderer_classes = fast_renderer_classes
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = GuestsSerializer
     queryset = People.objects.all()
@@ -174,8 +303,14 @@ class FetchGuestsView(RetrieveAPIView):
         request.data['id'] = id
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
+            version = Version.of(
+                request, serializer.guests(),
+                since=get_event_access(request, id).event.updatedAt)
+            not_modified = version.not_modified()
+            if not_modified:
+                return not_modified
             guestsDictList = serializer.fetch()
-            return Response(data=guestsDictList, status=status.HTTP_200_OK)
+            return version.apply(list_response(guestsDictList))
         errors = serializer.errors
         code = status.HTTP_400_BAD_REQUEST
         if errors['non_field_errors']:
@@ -194,10 +329,13 @@ class GuestView(GenericAPIView):
 
     def delete(self, request, *args, **kwargs):
         id = kwargs.get('pk')
-        if People.objects.filter(id=id).exists():
-            invitation = People.objects.filter(id=id)[0]
-            if invitation.event.creator == request.user:
-                invitation.delete()
+        invitation = People.objects.select_related('event').filter(id=id).first()
+        if invitation:
+            if invitation.event.creator_id == request.user.pk:
+                with transaction.atomic():
+                    invitation.delete()
+                    Event.objects.filter(id=invitation.event_id).update(
+                        updatedAt=timezone.now())
                 return Response(data={}, status=status.HTTP_200_OK)
             return Response(
                 data={'error': 'User is not permitted to delete this invitation'},
@@ -208,21 +346,25 @@ class GuestView(GenericAPIView):
             status=status.HTTP_404_NOT_FOUND)
 
 
-class ExpenditureView(GenericAPIView):
+class ExpenditureView(ReplicaReadsMixin, GenericAPIView):
+    renderer_classes = fast_renderer_classes
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = AddExpenditureSerializer
     queryset = Expenditure.objects.all()
 
     def get(self, request, *args, **kwargs):
-        id = kwargs.get('pk')
-        event = Event.objects.filter(id=id, creator=request.user)
-        if event:
-            event = event[0]
-            expenditures = Expenditure.objects.filter(event=event)
-            if expenditures:
-                serializer = ExpenditureSerializer(expenditures, many=True)
-                return Response(data=serializer.data, status=status.HTTP_200_OK)
-            return Response(data=[], status=status.HTTP_200_OK)
+        access = get_event_access(request, kwargs.get('pk'))
+        if access and access.is_creator:
+            expenditures = Expenditure.objects.filter(event=access.event)
+            version = Version.of(request, expenditures, since=access.event.updatedAt)
+            not_modified = version.not_modified()
+            if not_modified:
+                return not_modified
+            rows = expenditures.values(*expenditure_rows.columns)
+            if streaming_enabled(request):
+                return version.apply(RowStream(rows, expenditure_rows.many).response())
+            data = expenditure_rows.many(rows)
+            return version.apply(Response(data=data, status=status.HTTP_200_OK))
         return Response(
             data={'error': 'User not permitted to view expenditure of this event'},
             status=status.HTTP_403_FORBIDDEN)
@@ -243,11 +385,18 @@ class ExpenditureView(GenericAPIView):
 
     def delete(self, request, *args, **kwargs):
         id = kwargs.get('pk')
-        expenditure = Expenditure.objects.filter(id=id)
+        expenditure = Expenditure.objects.select_related('event').filter(id=id).first()
         if expenditure:
-            expenditure = expenditure[0]
-            if expenditure.event.creator == request.user:
-                expenditure.delete()
+            if expenditure.event.creator_id == request.user.pk:
+                with transaction.atomic():
+                    expenditure.delete()
+                    adjust_total_expenditure(
+                        expenditure.event_id,
+                        -expenditure.quantity * expenditure.unitPrice)
+                    # delete() unset the primary key.
+                    record_changes(Change.Kind.EXPENDITURE, [(
+                        id, expenditure.event_id,
+                        expenditure.event.creator_id, None)], deleted=True)
                 return Response(data={}, status=status.HTTP_200_OK)
             return Response(
                 data={'error': 'User is not permitted to delete this expenditure'},
@@ -258,19 +407,114 @@ class ExpenditureView(GenericAPIView):
         )
 
 
-class UsageView(GenericAPIView):
+class BatchExpenditureView(GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = BatchExpenditureSerializer
+    queryset = Expenditure.objects.all()
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(
+            data=request.data, event_id=kwargs.get('pk'))
+        if serializer.is_valid():
+            expenditures = serializer.save()
+            data = ExpenditureSerializer(expenditures, many=True).data
+            return Response(data=data, status=status.HTTP_201_CREATED)
+        errors = serializer.errors
+        if 'non_field_errors' in errors and errors['non_field_errors'][0].code == 403:
+            return Response(
+                data={'error': errors['non_field_errors'][0]},
+                status=status.HTTP_403_FORBIDDEN)
+        return Response(data=errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def delete(self, request, *args, **kwargs):
+        serializer = BatchDeleteExpenditureSerializer(
+            data=request.data, event_id=kwargs.get('pk'),
+            context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        deleted = serializer.delete()
+        return Response(data={'deleted': deleted}, status=status.HTTP_200_OK)
+
+
+class ExpenditureSummaryView(ReplicaReadsMixin, GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = ExpenditureSummarySerializer
+    queryset = Expenditure.objects.all()
+
+    def get(self, request, *args, **kwargs):
+        data = request.query_params.dict()
+        data['id'] = kwargs.get('pk')
+        serializer = self.get_serializer(data=data)
+        if serializer.is_valid():
+            return Response(data=serializer.fetch(), status=status.HTTP_200_OK)
+        errors = serializer.errors
+        if 'non_field_errors' in errors:
+            error = errors['non_field_errors'][0]
+            return Response(data={'error': error}, status=int(error.code))
+        return Response(data=errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ExportView(ReplicaReadsMixin, GenericAPIView):
+    """
+    get:
+        Streams the guests or expenditures of one event, or of all events the
+        user created, as CSV or NDJSON.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = ExportSerializer
+    queryset = Event.objects.all()
+    export = None
+
+    def perform_content_negotiation(self, request, force=False):
+        # The body is CSV or NDJSON whatever the client accepts.
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, *args, **kwargs):
+        data = {'format': kwargs.get('fmt')}
+        if kwargs.get('pk') is not None:
+            data['id'] = kwargs.get('pk')
+        serializer = self.get_serializer(data=data)
+        if not serializer.is_valid():
+            errors = serializer.errors
+            if 'non_field_errors' in errors:
+                error = errors['non_field_errors'][0]
+                return Response(data={'error': error}, status=int(error.code))
+            return Response(data=errors, status=status.HTTP_400_BAD_REQUEST)
+        return serializer.stream(self.export).response(
+            filename=serializer.filename(self.export), buffered=not can_stream(request))
+
+
+def count_subquery(queryset):
+    counts = queryset.order_by().annotate(
+        count=Func(F('pk'), function='COUNT')).values('count')
+    return Coalesce(Subquery(counts), 0)
+
+
+class UsageView(ReplicaReadsMixin, GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = EventSerializer
     queryset = Event.objects.all()
 
+    @staticmethod
+    def counters(user):
+        return Usage.objects.filter(user=user).values('created', 'invited')
+
+    @staticmethod
+    def counts(user):
+        return get_user_model().objects.filter(pk=user.pk).annotate(
+            created=count_subquery(Event.objects.filter(creator=OuterRef('pk'))),
+            invited=count_subquery(People.objects.filter(user=OuterRef('pk'))),
+        ).values('created', 'invited')
+
+    @cache_response('usage')
     def get(self, request, *args, **kwargs):
-        created = 0
-        invited = 0
-        if Event.objects.filter(creator=request.user).exists():
-            created = Event.objects.filter(creator=request.user).count()
-        if People.objects.filter(user=request.user).exists():
-            invited = People.objects.filter(user=request.user).count()
+        if settings.EVENT_USAGE_COUNTERS:
+            usage = self.counters(request.user).first()
+            if usage is not None:
+                return Response(data=usage, status=status.HTTP_200_OK)
+
+        # None when a lagging replica does not have the user yet.
+        usage = self.counts(request.user).first() or {'created': 0, 'invited': 0}
 
         return Response(
-            data={'created': created, 'invited': invited},
+            data={'created': usage['created'], 'invited': usage['invited']},
             status=status.HTTP_200_OK)
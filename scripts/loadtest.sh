@@ -0,0 +1,22 @@
+# Compares the WSGI and the ASGI deployment at the same worker count.
+# Usage: TOKEN=<drf token> WORKERS=4 CONCURRENCY=50 REQUESTS=2000 sh scripts/loadtest.sh
+WORKERS=${WORKERS:-4}
+CONCURRENCY=${CONCURRENCY:-50}
+REQUESTS=${REQUESTS:-2000}
+PORT=${PORT:-8765}
+
+run() {
+    name=$1
+    shift
+    "$@" --workers "$WORKERS" --bind "127.0.0.1:$PORT" &
+    server=$!
+    sleep 3
+    echo "== $name ($WORKERS workers) =="
+    python manage.py loadtest --base-url "http://127.0.0.1:$PORT" --token "$TOKEN" \
+        --concurrency "$CONCURRENCY" --requests "$REQUESTS"
+    kill $server
+    wait $server 2>/dev/null
+}
+
+run wsgi gunicorn core.wsgi
+EVENT_ASYNC_VIEWS=1 run asgi gunicorn core.asgi:application -k uvicorn.workers.UvicornWorker
@@ -0,0 +1 @@
+EVENT_ASYNC_VIEWS=1 gunicorn core.asgi:application -k uvicorn.workers.UvicornWorker --workers ${WEB_CONCURRENCY:-2}
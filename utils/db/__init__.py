@@ -0,0 +1,75 @@
+import os
+import dj_database_url
+
+POSTGRESQL_ENGINES = (
+    'django.db.backends.postgresql',
+    'django.db.backends.postgresql_psycopg2',
+)
+
+
+def env_int(environ, name, default):
+    value = environ.get(name)
+    return default if value in (None, '') else int(value)
+
+
+def replica_config(environ=os.environ):
+    """
+    Builds the read replica entry from DATABASE_REPLICA_URL, or
+    SQLITE_REPLICA_PATH for a local SQLite file standing in for a replica,
+    None when no replica is configured. Leave both unset when running the
+    test suite, ReplicaRoutingTests stand the primary in for the replica.
+    """
+    if environ.get('DATABASE_REPLICA_URL'):
+        return database_config(None, dict(
+            environ, DATABASE_URL=environ['DATABASE_REPLICA_URL']))
+    if environ.get('SQLITE_REPLICA_PATH'):
+        return database_config(None, dict(
+            environ, DATABASE_URL='', SQLITE_PATH=environ['SQLITE_REPLICA_PATH']))
+    return None
+
+
+def database_config(base_dir, environ=os.environ):
+    """
+    Builds the default DATABASES entry from the environment.
+
+    Without DATABASE_URL the project runs on a local SQLite file tuned for
+    concurrent requests (see utils.db.sqlite3). SQLITE_WAL switches it to a
+    WAL journal, which lets readers proceed while a write is in progress,
+    with synchronous=NORMAL, which only syncs on WAL checkpoints. It is off
+    by default: WAL rewrites the file header and leaves -wal and -shm files
+    next to the database. With a PostgreSQL
+    DATABASE_URL connections are kept open for DATABASE_CONN_MAX_AGE
+    seconds, or, when DATABASE_POOL_SIZE is set, shared between the threads
+    of a process through a bounded pool (see utils.db.postgresql).
+    """
+    url = environ.get('DATABASE_URL')
+    if not url:
+        config = {
+            'ENGINE': 'utils.db.sqlite3',
+            'NAME': environ.get('SQLITE_PATH') or base_dir / 'db.sqlite3',
+            'CONN_MAX_AGE': env_int(environ, 'DATABASE_CONN_MAX_AGE', 600),
+            'OPTIONS': {
+                # Seconds a writer waits for the file lock (busy_timeout).
+                'timeout': env_int(environ, 'SQLITE_BUSY_TIMEOUT', 20),
+            },
+        }
+        if environ.get('SQLITE_WAL', '').lower() in ('1', 'true', 'yes'):
+            config['PRAGMAS'] = {'journal_mode': 'WAL', 'synchronous': 'NORMAL'}
+        return config
+
+    pool_size = env_int(environ, 'DATABASE_POOL_SIZE', 0)
+    config = dj_database_url.parse(
+        url,
+        # A pooled connection goes back to the pool at the end of every
+        # request instead of staying with the thread that opened it.
+        conn_max_age=env_int(environ, 'DATABASE_CONN_MAX_AGE', 0 if pool_size else 600),
+        ssl_require=environ.get('DATABASE_SSL_REQUIRE', 'DYNO' in environ) in (True, '1', 'true'),
+    )
+    if pool_size and config['ENGINE'] in POSTGRESQL_ENGINES:
+        config['ENGINE'] = 'utils.db.postgresql'
+        config['POOL'] = {
+            'MIN_SIZE': env_int(environ, 'DATABASE_POOL_MIN_SIZE', 0),
+            'MAX_SIZE': pool_size,
+            'TIMEOUT': env_int(environ, 'DATABASE_POOL_TIMEOUT', 30),
+        }
+    return config
@@ -0,0 +1,33 @@
+import time
+from django.db import connections
+from .postgresql.base import get_pool
+
+
+def database_status(alias):
+    """
+    Checks one database with a trivial query and describes how connections
+    to it are managed, including pool utilization when it is pooled.
+    """
+    connection = connections[alias]
+    status = {
+        'vendor': connection.vendor,
+        'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+    }
+    started = time.perf_counter()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+            if connection.vendor == 'sqlite':
+                cursor.execute('PRAGMA journal_mode')
+                status['journal_mode'] = cursor.fetchone()[0]
+    except Exception as error:
+        status.update(ok=False, error=str(error))
+    else:
+        status['ok'] = True
+    status['latency_ms'] = round((time.perf_counter() - started) * 1000, 2)
+
+    pool = get_pool(alias)
+    if pool is not None:
+        status['pool'] = pool.stats()
+    return status
@@ -0,0 +1,87 @@
+import time
+import threading
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe bounded pool of DB-API connections. Checkouts beyond
+    `max_size` wait up to `timeout` seconds for a connection to be returned.
+    """
+
+    def __init__(self, connect, max_size=10, min_size=0, timeout=30,
+                 clock=time.monotonic):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.clock = clock
+        self._idle = []
+        self._size = 0
+        self._waiting = 0
+        self._timeouts = 0
+        self._condition = threading.Condition()
+        for _ in range(min_size):
+            self._idle.append(self.connect())
+            self._size += 1
+
+    def getconn(self):
+        with self._condition:
+            deadline = self.clock() + self.timeout
+            while not self._idle and self._size >= self.max_size:
+                remaining = deadline - self.clock()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f'No connection available within {self.timeout}s '
+                        f'({self.max_size} in use)')
+                self._waiting += 1
+                try:
+                    self._condition.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            if self._idle:
+                return self._idle.pop()
+            self._size += 1
+        try:
+            return self.connect()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+    def putconn(self, connection, discard=False):
+        with self._condition:
+            if discard:
+                self._size -= 1
+            else:
+                self._idle.append(connection)
+            self._condition.notify()
+        if discard:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def closeall(self):
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for connection in idle:
+            connection.close()
+
+    def stats(self):
+        with self._condition:
+            in_use = self._size - len(self._idle)
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'in_use': in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'timeouts': self._timeouts,
+                'utilization': round(in_use / self.max_size, 3) if self.max_size else None,
+            }
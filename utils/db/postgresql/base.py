@@ -0,0 +1,70 @@
+import threading
+import psycopg2.extras
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+from ..pool import ConnectionPool
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias):
+    entry = _pools.get(alias)
+    return entry[1] if entry else None
+
+
+def connect(conn_params, isolation_level=None):
+    connection = base.Database.connect(**conn_params)
+    if isolation_level is not None and isolation_level != connection.isolation_level:
+        connection.set_session(isolation_level=isolation_level)
+    # Same as Django: JSONField values are decoded by the field itself.
+    psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+    return connection
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL backend drawing connections from a per-process pool sized by
+    the POOL key of the database entry. Closing a connection, which Django
+    does at the end of every request with CONN_MAX_AGE = 0, returns it to the
+    pool instead of disconnecting.
+    """
+
+    def get_pool(self, conn_params):
+        key = repr(sorted(conn_params.items()))
+        with _pools_lock:
+            entry = _pools.get(self.alias)
+            if entry is not None and entry[0] == key:
+                return entry[1]
+            if entry is not None:
+                # The connection parameters changed, e.g. the test runner
+                # switched NAME to the test database.
+                entry[1].closeall()
+            options = self.settings_dict.get('POOL', {})
+            isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+            pool = ConnectionPool(
+                lambda: connect(conn_params, isolation_level),
+                max_size=options.get('MAX_SIZE', 10),
+                min_size=options.get('MIN_SIZE', 0),
+                timeout=options.get('TIMEOUT', 30))
+            _pools[self.alias] = (key, pool)
+            return pool
+
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        connection = self.pool.getconn()
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        connection = self.connection
+        broken = (
+            connection.closed
+            or connection.get_transaction_status() == extensions.TRANSACTION_STATUS_UNKNOWN)
+        if not broken and connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            with self.wrap_database_errors:
+                connection.rollback()
+        self.pool.putconn(connection, discard=broken)
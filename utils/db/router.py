@@ -0,0 +1,130 @@
+import asyncio
+from contextvars import ContextVar
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework.permissions import SAFE_METHODS
+
+REPLICA = 'replica'
+
+_routing = ContextVar('database_routing', default=None)
+
+
+class RoutingState:
+    def __init__(self):
+        self.use_replica = False
+        self.wrote = False
+
+
+def replica_alias():
+    return REPLICA if REPLICA in settings.DATABASES else None
+
+
+def pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+def pin_users(user_ids):
+    """
+    Sends the reads of the given users to the primary for
+    DATABASE_REPLICA_PIN_SECONDS, long enough for the replica to catch up
+    with a write they made or that changed what they see.
+    """
+    if replica_alias() is None:
+        return
+    caches[settings.DATABASE_REPLICA_PIN_CACHE].set_many(
+        {pin_key(user_id): True for user_id in set(user_ids)},
+        settings.DATABASE_REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user_id):
+    return caches[settings.DATABASE_REPLICA_PIN_CACHE].get(pin_key(user_id), False)
+
+
+class ReplicaRouter:
+    """
+    Sends reads to the replica only inside requests served by a
+    ReplicaReadsMixin view, every other query and all writes go to the
+    primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is not None and state.use_replica:
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+        # Instances loaded from the replica would otherwise be saved there.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, REPLICA}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+def pin_writer(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        pin_users([user.pk])
+
+
+@sync_and_async_middleware
+class ReplicaRoutingMiddleware:
+    """
+    Tracks the database routing of one request and pins the user to the
+    primary after a request that wrote. Under ASGI the state lives in the
+    request's context, which sync_to_async carries to the threads running
+    its queries.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Makes Django treat the instance as a coroutine function.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token = _routing.set(RoutingState())
+        try:
+            response = self.get_response(request)
+            if _routing.get().wrote:
+                pin_writer(request)
+            return response
+        finally:
+            _routing.reset(token)
+
+    async def __acall__(self, request):
+        token = _routing.set(RoutingState())
+        try:
+            response = await self.get_response(request)
+            if _routing.get().wrote:
+                # The user may be lazily loaded and the pin cache may be
+                # database backed.
+                await sync_to_async(pin_writer)(request)
+            return response
+        finally:
+            _routing.reset(token)
+
+
+class ReplicaReadsMixin:
+    """
+    Marks a read-only view whose queries may be served by the replica. Users
+    pinned after a recent write keep reading from the primary.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        state = _routing.get()
+        if (state is not None and request.method in SAFE_METHODS
+                and replica_alias() is not None and not is_pinned(request.user.pk)):
+            state.use_replica = True
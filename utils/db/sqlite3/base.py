@@ -0,0 +1,24 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend tuned for concurrent requests. Runs the pragmas in the
+    PRAGMAS key of the database entry on every new connection, e.g. the
+    WAL journal database_config sets up when SQLITE_WAL is on. The busy
+    timeout comes from OPTIONS['timeout'].
+
+    Transactions are started with BEGIN IMMEDIATE. A deferred transaction
+    that reads and then writes cannot wait for a concurrent writer, SQLite
+    fails it with "database is locked" at once; taking the write lock up
+    front makes it wait for the busy timeout instead.
+    """
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict.get('PRAGMAS', {}).items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
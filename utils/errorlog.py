@@ -0,0 +1,139 @@
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueListener
+from django.conf import settings
+from .metrics import registry
+
+ERROR_LOGGER = 'evader.errors'
+
+records_dropped = registry.counter(
+    'error_log_dropped_total',
+    'Error log records dropped because the queue was full.')
+
+
+class RateLimiter:
+    """
+    Lets the first `limit` records of each key through per `window` seconds,
+    then one in `sample`. `allow` returns whether a record may be logged and
+    how many records of its key were dropped since the last one logged.
+    """
+
+    def __init__(self, limit=10, window=60, sample=100, clock=time.monotonic):
+        self.limit = limit
+        self.window = window
+        self.sample = sample
+        self.clock = clock
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        now = self.clock()
+        with self._lock:
+            state = self._state.get(key)
+            if state is None or now - state[0] >= self.window:
+                dropped = state[2] if state else 0
+                self._state[key] = [now, 1, 0]
+                return True, dropped
+            state[1] += 1
+            if state[1] <= self.limit or (
+                    self.sample and (state[1] - self.limit) % self.sample == 0):
+                dropped, state[2] = state[2], 0
+                return True, dropped
+            state[2] += 1
+            return False, 0
+
+    def reset(self):
+        with self._lock:
+            self._state.clear()
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    One JSON object per record: time, level, logger, message, the record's
+    `fields` and the formatted exception if there is one.
+    """
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        data.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class AlreadyLogged(logging.Filter):
+    """
+    Drops django.request records of requests whose error ErrorLog already
+    logged, so an unhandled exception is not logged twice.
+    """
+
+    def filter(self, record):
+        request = getattr(record, 'request', None)
+        return not getattr(request, 'error_logged', False)
+
+
+class ErrorLog:
+    """
+    Logs to `name` from a background thread. `log` only builds the record
+    and puts it on a queue of at most `maxsize` records, dropping it when
+    the queue is full; formatting, including the traceback, and the
+    handlers' I/O happen on the listener thread, which hands records to
+    the logger so its handlers can be configured through LOGGING as usual.
+    Records below ERROR_LOG_LEVEL are skipped.
+    """
+
+    def __init__(self, name=ERROR_LOGGER, maxsize=0):
+        self.logger = logging.getLogger(name)
+        self.queue = queue.Queue(maxsize)
+        self.listener = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.listener is None:
+                # A logger has the handle() and level a listener expects of
+                # its handlers.
+                self.listener = QueueListener(
+                    self.queue, self.logger, respect_handler_level=True)
+                self.listener.start()
+                atexit.register(self.stop)
+
+    def stop(self):
+        with self._lock:
+            if self.listener is not None:
+                self.listener.stop()
+                self.listener = None
+
+    def flush(self):
+        """
+        Waits until every queued record has been handled.
+        """
+        self.queue.join()
+
+    def log(self, level, message, fields, exc_info=None):
+        if level < logging.getLevelName(settings.ERROR_LOG_LEVEL):
+            return
+        if not self.logger.isEnabledFor(level):
+            return
+        self.start()
+        record = self.logger.makeRecord(
+            self.logger.name, level, __file__, 0, message, (), exc_info,
+            extra={'fields': fields})
+        # Enqueued as is, formatting it here (as QueueHandler.prepare does)
+        # would render the traceback on this thread.
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            records_dropped.inc()
+
+
+error_log = ErrorLog(maxsize=settings.ERROR_LOG_QUEUE_SIZE)
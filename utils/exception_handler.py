@@ -1,7 +1,79 @@
+import uuid
+import time
+import logging
+from django.conf import settings
 from rest_framework.views import exception_handler
+from .errorlog import RateLimiter, error_log
+from .metrics import current as current_metrics
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+rate_limiter = RateLimiter(
+    limit=settings.ERROR_LOG_RATE_LIMIT,
+    window=settings.ERROR_LOG_RATE_WINDOW,
+    sample=settings.ERROR_LOG_SAMPLE_RATE)
+
+
+def request_id(request):
+    """
+    The client's X-Request-ID if it sent a usable one, a new id otherwise.
+    """
+    request_id = getattr(request, 'request_id', None)
+    if request_id is None:
+        request_id = request.headers.get(REQUEST_ID_HEADER, '')
+        if not request_id or len(request_id) > 64 or not request_id.isprintable():
+            request_id = uuid.uuid4().hex
+        request.request_id = request_id
+    return request_id
 
 
 def custom_exception_handler(exc, context):
+    """
+    DRF's exception handler, plus a structured record of the error on the
+    error log. Exceptions DRF does not handle are logged with their
+    traceback and left to Django, which answers 500.
+    """
     response = exception_handler(exc, context)
-    print(response.data)
+    request = context.get('request')
+    if request is None:
+        return response
+    http_request = request._request
+    status_code = response.status_code if response is not None else 500
+    match = http_request.resolver_match
+    endpoint = match.view_name if match else None
+
+    if response is None:
+        # Logged here with the request's fields, Django's own django.request
+        # record of the 500 is dropped by errorlog.AlreadyLogged.
+        http_request.error_logged = True
+    allowed, dropped = rate_limiter.allow((endpoint, status_code, type(exc).__name__))
+    if allowed:
+        user = getattr(http_request, 'user', None)
+        fields = {
+            'request_id': request_id(http_request),
+            'endpoint': endpoint,
+            'method': http_request.method,
+            'path': http_request.path,
+            'status': status_code,
+            'error': type(exc).__name__,
+            'user_id': user.pk if user is not None and user.is_authenticated else None,
+        }
+        if response is not None:
+            fields['detail'] = response.data
+        metrics = current_metrics()
+        if metrics is not None:
+            fields['duration_ms'] = round((time.perf_counter() - metrics.started) * 1000, 2)
+            fields['queries'] = metrics.queries
+            fields['query_ms'] = round(metrics.query_time * 1000, 2)
+        if dropped:
+            fields['dropped'] = dropped
+        if response is None:
+            error_log.log(logging.ERROR, f'Unhandled {type(exc).__name__}', fields,
+                          exc_info=(type(exc), exc, exc.__traceback__))
+        else:
+            error_log.log(logging.ERROR if status_code >= 500 else logging.INFO,
+                          f'{status_code} {type(exc).__name__}', fields)
+
+    if response is not None:
+        response[REQUEST_ID_HEADER] = request_id(http_request)
     return response
@@ -0,0 +1,308 @@
+import time
+import bisect
+import asyncio
+import logging
+import threading
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f'{self.name}{format_labels(self.labels, labels)} {format_value(value)}'
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(Counter):
+    type = 'histogram'
+
+    def __init__(self, name, help, buckets, labels=()):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * len(self.buckets), 0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def value(self, labels=()):
+        """
+        (sum, count) of the observations with the given labels.
+        """
+        state = self._values.get(labels)
+        return (state[1], state[2]) if state else (0, 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(
+                (labels, (list(counts), total, count))
+                for labels, (counts, total, count) in self._values.items())
+        for labels, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                yield (f'{self.name}_bucket'
+                       f'{format_labels(self.labels, labels, [("le", format_value(bound))])}'
+                       f' {cumulative}')
+            yield (f'{self.name}_bucket{format_labels(self.labels, labels, [("le", "+Inf")])}'
+                   f' {count}')
+            yield f'{self.name}_sum{format_labels(self.labels, labels)} {format_value(total)}'
+            yield f'{self.name}_count{format_labels(self.labels, labels)} {count}'
+
+
+class Registry:
+    """
+    Metrics of this process. Every worker keeps its own registry, a
+    multi-worker deployment has to scrape or aggregate each of them.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help, labels=()):
+        metric = Counter(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, buckets, labels=()):
+        metric = Histogram(name, help, buckets, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        for metric in self.metrics:
+            metric.reset()
+
+
+registry = Registry()
+LABELS = ('endpoint', 'method')
+
+requests_total = registry.counter(
+    'http_requests_total', 'Requests served.', ('endpoint', 'method', 'status'))
+request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Wall time of a request.', TIME_BUCKETS, LABELS)
+db_queries = registry.histogram(
+    'db_queries_per_request', 'Database queries run by a request.', COUNT_BUCKETS, LABELS)
+db_duration = registry.histogram(
+    'db_query_duration_seconds', 'Time a request spent in database queries.',
+    TIME_BUCKETS, LABELS)
+serializer_duration = registry.histogram(
+    'serializer_duration_seconds',
+    'Time a request spent serializing and rendering its response.', TIME_BUCKETS, LABELS)
+response_size = registry.histogram(
+    'http_response_size_bytes', 'Size of the response body.', SIZE_BUCKETS, LABELS)
+budget_exceeded = registry.counter(
+    'db_query_budget_exceeded_total',
+    'Requests that ran more queries than METRICS_QUERY_BUDGETS allows.', ('endpoint',))
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+_current = ContextVar('request_metrics', default=None)
+
+
+def current():
+    """
+    Metrics of the request being served, None outside of one.
+    """
+    return _current.get()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_time = 0.0
+        self.serializer_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_time += time.perf_counter() - started
+
+    def count_queries(self):
+        """
+        Counts the queries of every database connection of this thread until
+        the returned stack is closed.
+        """
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+    @contextmanager
+    def active(self):
+        """
+        Makes these the current request's metrics and counts the queries of
+        every database connection of this thread.
+        """
+        token = _current.set(self)
+        try:
+            with self.count_queries():
+                yield self
+        finally:
+            try:
+                _current.reset(token)
+            except ValueError:
+                # A streamed body closed from another context, e.g. by the
+                # garbage collector.
+                pass
+
+
+@contextmanager
+def serializer_timer():
+    """
+    Adds the time spent in the block to the current request's serializer
+    time, a no-op outside of a request.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializer_time += time.perf_counter() - started
+
+
+@sync_and_async_middleware
+class MetricsMiddleware:
+    """
+    Records wall time, query count and time, serializer time and response
+    size of every request to a route of METRICS_NAMESPACES, labelled with
+    the URL name, and checks METRICS_QUERY_BUDGETS. Streamed responses are
+    recorded once their body has been sent.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Makes Django treat the instance as a coroutine function.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        with metrics.active():
+            response = self.get_response(request)
+        return self.finish(request, metrics, response)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            # An async request's queries run on the thread sync_to_async
+            # keeps for it, the connections to count are that thread's.
+            counting = await sync_to_async(metrics.count_queries)()
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(counting.close)()
+        finally:
+            _current.reset(token)
+        return self.finish(request, metrics, response)
+
+    def finish(self, request, metrics, response):
+        match = getattr(request, 'resolver_match', None)
+        if match is None or match.namespace not in settings.METRICS_NAMESPACES:
+            return response
+        labels = (match.view_name, request.method)
+
+        if response.streaming:
+            response.streaming_content = self.stream(
+                metrics, labels, response.status_code, response.streaming_content)
+        else:
+            self.record(metrics, labels, response.status_code, len(response.content))
+        return response
+
+    def stream(self, metrics, labels, status_code, content):
+        size = 0
+        with metrics.active():
+            for chunk in content:
+                size += len(chunk)
+                yield chunk
+        self.record(metrics, labels, status_code, size)
+
+    def record(self, metrics, labels, status_code, size):
+        endpoint, method = labels
+        requests_total.inc((endpoint, method, str(status_code)))
+        request_duration.observe(labels, time.perf_counter() - metrics.started)
+        db_queries.observe(labels, metrics.queries)
+        db_duration.observe(labels, metrics.query_time)
+        serializer_duration.observe(labels, metrics.serializer_time)
+        response_size.observe(labels, size)
+
+        budget = settings.METRICS_QUERY_BUDGETS.get(endpoint)
+        if budget is not None and metrics.queries > budget:
+            budget_exceeded.inc((endpoint,))
+            message = f'{method} {endpoint} ran {metrics.queries} queries, budget is {budget}'
+            if settings.METRICS_QUERY_BUDGET_ACTION == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)